@@ -0,0 +1,149 @@
+"""单词发音缓存
+
+发音音频来自有道词典的 dictvoice 接口（type=1 英音，type=2 美音）。首次播放时
+经上游调度器抓取，以内容的 SHA-256 命名保存在 ~/.wordbook/audio/ 下（相同的音频
+只保存一份，多用户模式下各用户共享），audio_clips 表记录 (单词, 口音) 对应的文件。
+之后直接从本地文件返回，支持 Range 和以内容哈希作为 ETag 的条件请求。
+
+预先抓取一本词书的发音时，单词以 audio-uk / audio-us 平台进入翻译预热的
+warm_jobs 队列，由同一个后台线程以低优先级执行（见 warmup.py）。
+"""
+
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from db import get_db_connection
+from lemma import fold
+from scheduler import INTERACTIVE, scheduler
+from tenants import DATA_DIR
+
+# 发音接口地址，可通过环境变量替换为本地的替身服务
+AUDIO_URL = os.environ.get("WORDBOOK_AUDIO_URL", "https://dict.youdao.com/dictvoice")
+AUDIO_DIR = DATA_DIR / "audio"
+# 上游调度器中的平台名，与词典页面分开限速
+AUDIO_PROVIDER = "youdao-audio"
+# 口音对应的 dictvoice type 参数
+ACCENTS = {"uk": 1, "us": 2}
+# 预热队列中的平台名 -> 口音
+AUDIO_PLATFORMS = {f"audio-{accent}": accent for accent in ACCENTS}
+# 单个音频的大小上限（字节），超过时视为上游异常
+MAX_AUDIO_BYTES = 2 * 1024 * 1024
+
+
+class AudioUnavailable(Exception):
+    """上游没有返回可用的音频"""
+
+
+def init_audio_tables(conn):
+    """创建发音缓存表"""
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS audio_clips (
+            word TEXT NOT NULL,
+            accent TEXT NOT NULL,
+            sha256 TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            content_type TEXT NOT NULL,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (word, accent)
+        );
+        """
+    )
+    conn.commit()
+
+
+def audio_path(sha256: str) -> Path:
+    """按内容哈希存放的音频文件路径，前两位作为子目录"""
+    return AUDIO_DIR / sha256[:2] / sha256
+
+
+def get_cached_audio(conn, word: str, accent: str) -> Optional[Dict]:
+    """已缓存且文件存在的音频，word 为 fold 后的单词"""
+    row = conn.execute(
+        """
+        SELECT sha256, size, content_type FROM audio_clips
+        WHERE word = ? AND accent = ?
+        """,
+        (word, accent),
+    ).fetchone()
+    if row is None or not audio_path(row["sha256"]).exists():
+        return None
+    return {
+        "sha256": row["sha256"],
+        "size": row["size"],
+        "content_type": row["content_type"],
+        "path": audio_path(row["sha256"]),
+    }
+
+
+def download_audio(word: str, accent: str, priority: int = INTERACTIVE) -> Dict:
+    """从上游抓取音频并按内容哈希保存"""
+    url = f"{AUDIO_URL}?audio={quote(word)}&type={ACCENTS[accent]}"
+    head = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "}
+    # 排队和抓取耗时由调度器记录
+    response = scheduler.get(
+        AUDIO_PROVIDER, url, priority=priority, headers=head, timeout=10
+    )
+
+    content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+    if response.status_code != 200:
+        raise AudioUnavailable(f"上游返回 {response.status_code}")
+    if not content_type.startswith("audio/"):
+        raise AudioUnavailable(f"上游返回的不是音频: {content_type or '未知类型'}")
+    content = response.content
+    if not content or len(content) > MAX_AUDIO_BYTES:
+        raise AudioUnavailable(f"音频大小异常: {len(content)} 字节")
+
+    sha256 = hashlib.sha256(content).hexdigest()
+    path = audio_path(sha256)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f".{sha256}.{uuid.uuid4().hex}.part")
+        partial.write_bytes(content)
+        os.replace(partial, path)
+    return {
+        "sha256": sha256,
+        "size": len(content),
+        "content_type": content_type,
+        "path": path,
+    }
+
+
+def fetch_audio(word: str, accent: str, priority: int = INTERACTIVE) -> Dict:
+    """取得单词的发音，优先使用本地缓存，未命中时抓取上游并写入缓存
+
+    Args:
+        word: 单词（大小写不敏感）
+        accent: 口音，uk 或 us
+        priority: 抓取上游时的优先级
+
+    Returns:
+        sha256、size、content_type 和本地文件路径 path
+
+    Raises:
+        AudioUnavailable: 上游没有返回可用的音频
+    """
+    word = fold(word)
+    conn = get_db_connection()
+    try:
+        cached = get_cached_audio(conn, word, accent)
+        if cached is not None:
+            return cached
+
+        clip = download_audio(word, accent, priority)
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO audio_clips
+                (word, accent, sha256, size, content_type)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (word, accent, clip["sha256"], clip["size"], clip["content_type"]),
+        )
+        conn.commit()
+        return clip
+    finally:
+        conn.close()
@@ -0,0 +1,170 @@
+"""间隔重复复习队列的模拟基准
+
+在合成数据库上模拟每天按到期顺序取出单词并作答，记录取队列和作答的耗时，
+并与不走索引的扫描排序做对比::
+
+    python -m bench.review --size 1m --days 60 --daily 20000
+
+取队列走 (notebook_id, due_at) / (due_at) 索引，耗时应与复习状态和
+复习记录的规模基本无关。
+"""
+
+import argparse
+import json
+import math
+import random
+import sqlite3
+import statistics
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bench.seed import SIZES, generate
+from review import grade_word, init_review_tables, next_due
+
+SIM_START = datetime(2025, 1, 1, 8)
+BATCH_SIZE = 20
+
+# 一元加号阻止 SQLite 使用 notebook_id、due_at 上的索引
+SCAN_QUERY = """
+    SELECT w.word, r.due_at
+    FROM review_state r
+    JOIN words w ON w.id = r.word_id
+    WHERE +r.notebook_id = ? AND +r.due_at <= ?
+    ORDER BY +r.due_at
+    LIMIT ?
+"""
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    samples = sorted(samples)
+
+    def pick(q):
+        return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 3)
+
+    return {
+        "count": len(samples),
+        "p50_ms": pick(0.5),
+        "p99_ms": pick(0.99),
+        "max_ms": round(samples[-1] * 1000, 3),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+    }
+
+
+def recall_grade(rng: random.Random, interval: float, ease: float) -> int:
+    """简单的遗忘曲线：间隔越长、ease 越低越容易忘"""
+    stability = max(1.0, interval) * ease / 2.5
+    if rng.random() < math.exp(-interval / (stability * 10)) * 0.95:
+        return rng.choice([3, 4, 4, 5])
+    return rng.choice([0, 1, 2])
+
+
+def simulate(conn, days: int, daily: int, notebooks: int, seed: int):
+    rng = random.Random(seed)
+    fetch, fetch_notebook, grade = [], [], []
+    reviews = 0
+
+    for day in range(days):
+        now = SIM_START + timedelta(days=day)
+        done = 0
+        batches = 0
+        while done < daily:
+            # 交替从所有词书和单个词书中取队列
+            batches += 1
+            notebook_id = rng.randint(1, notebooks) if batches % 2 else None
+            start = time.perf_counter()
+            cards = next_due(conn, notebook_id, BATCH_SIZE, now)
+            elapsed = time.perf_counter() - start
+            (fetch if notebook_id is None else fetch_notebook).append(elapsed)
+            if not cards:
+                if notebook_id is None:
+                    break
+                done += 1
+                continue
+
+            for card in cards:
+                word_id = conn.execute(
+                    "SELECT id FROM words WHERE word = ?", (card["word"],)
+                ).fetchone()[0]
+                g = recall_grade(rng, card["interval"], 2.5)
+                start = time.perf_counter()
+                grade_word(conn, word_id, card["notebook_id"], g, now)
+                grade.append(time.perf_counter() - start)
+                done += 1
+                reviews += 1
+                now += timedelta(seconds=5)
+            conn.commit()
+
+    return {
+        "reviews": reviews,
+        "next_due(all)": percentiles(fetch),
+        "next_due(notebook)": percentiles(fetch_notebook),
+        "grade": percentiles(grade),
+    }
+
+
+def scan_baseline(conn, notebooks: int, samples: int, seed: int):
+    """不走索引、全表扫描后排序的对照"""
+    rng = random.Random(seed)
+    now = (SIM_START + timedelta(days=365)).strftime("%Y-%m-%d %H:%M:%S")
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        conn.execute(
+            SCAN_QUERY, (rng.randint(1, notebooks), now, BATCH_SIZE)
+        ).fetchall()
+        timings.append(time.perf_counter() - start)
+    return percentiles(timings)
+
+
+def query_plan(conn):
+    rows = conn.execute(
+        """
+        EXPLAIN QUERY PLAN
+        SELECT word_id FROM review_state
+        WHERE notebook_id = 1 AND due_at <= '2025-01-01 00:00:00'
+        ORDER BY due_at LIMIT 20
+        """
+    ).fetchall()
+    return [row[-1] for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="间隔重复复习队列的模拟基准")
+    parser.add_argument("--size", choices=SIZES, default="100k", help="预设规模")
+    parser.add_argument("--days", type=int, default=30, help="模拟天数")
+    parser.add_argument("--daily", type=int, default=2000, help="每天作答次数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--db", default=None, help="数据库路径，默认 /tmp/wordbook-review-<size>.db"
+    )
+    args = parser.parse_args()
+
+    words, notebooks = SIZES[args.size]
+    path = Path(args.db or f"/tmp/wordbook-review-{args.size}.db")
+    start = time.perf_counter()
+    generate(path, words, notebooks, args.seed)
+    conn = sqlite3.connect(str(path))
+    init_review_tables(conn)
+    setup = time.perf_counter() - start
+
+    results = simulate(conn, args.days, args.daily, notebooks, args.seed)
+    conn.execute("ANALYZE")
+    results["scan_and_sort(notebook)"] = scan_baseline(conn, notebooks, 20, args.seed)
+    results["query_plan"] = query_plan(conn)
+    results["review_state_rows"] = conn.execute(
+        "SELECT COUNT(*) FROM review_state"
+    ).fetchone()[0]
+    results["review_log_rows"] = conn.execute(
+        "SELECT COUNT(*) FROM review_log"
+    ).fetchone()[0]
+    results["setup_seconds"] = round(setup, 1)
+    conn.close()
+
+    print(json.dumps({"size": args.size, **results}, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
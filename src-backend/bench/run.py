@@ -0,0 +1,368 @@
+"""端到端 HTTP 负载基准测试
+
+生成（或复用）合成数据库，启动指向本地上游替身服务的后端进程，依次对每个
+接口单独施压，最后运行混合负载，输出每个接口的 p50/p99 延迟、吞吐量和
+服务进程的内存占用（RSS）::
+
+    python -m bench.run --size 100k --duration 10 --output result-100k.json
+
+输出为 JSON，可直接对比不同版本的结果。
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from bench.seed import SIZES, generate, word_for
+from bench.upstream_stub import UpstreamStub
+
+BACKEND_DIR = Path(__file__).parent.parent
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "wordbook-bench"
+
+# 混合负载中各接口的权重
+MIX = {
+    "get_words": 50,
+    "search": 15,
+    "translate": 10,
+    "add": 10,
+    "move": 5,
+    "copy": 5,
+    "export": 5,
+}
+
+
+class Workload:
+    """根据种子数据生成各接口的请求"""
+
+    def __init__(self, base_url: str, db_path: Path, seed: int):
+        self.base_url = base_url
+        self._new_words = itertools.count()
+        self._seed = seed
+
+        conn = sqlite3.connect(str(db_path))
+        self.words = conn.execute("SELECT COUNT(*) FROM words").fetchone()[0]
+        self.notebooks = [
+            row[0] for row in conn.execute("SELECT id FROM notebooks ORDER BY id")
+        ]
+        self.entries_per_notebook = max(
+            1,
+            conn.execute("SELECT COUNT(*) FROM word_entries").fetchone()[0]
+            // len(self.notebooks),
+        )
+        # 预先取样 (单词, 所在词书)，供移动操作使用
+        rng = random.Random(seed)
+        max_entry = conn.execute("SELECT MAX(id) FROM word_entries").fetchone()[0]
+        sample = [rng.randint(1, max_entry) for _ in range(2000)]
+        self.entries = conn.execute(
+            f"""
+            SELECT w.word, we.notebook_id
+            FROM word_entries we JOIN words w ON w.id = we.word_id
+            WHERE we.id IN ({",".join("?" * len(sample))})
+            """,
+            sample,
+        ).fetchall()
+        conn.close()
+
+    def rng(self, worker: int) -> random.Random:
+        return random.Random(self._seed * 1000 + worker)
+
+    def _word(self, rng: random.Random) -> str:
+        return word_for(rng.randrange(self.words))
+
+    def get_words(self, session, rng):
+        notebook = rng.choice(self.notebooks)
+        offset = rng.randrange(self.entries_per_notebook)
+        return session.get(
+            f"{self.base_url}/api/notebooks/{notebook}/words",
+            params={"limit": 50, "offset": offset},
+        )
+
+    def search(self, session, rng):
+        keyword = self._word(rng)[:4]
+        return session.get(
+            f"{self.base_url}/api/words/search", params={"keyword": keyword}
+        )
+
+    def translate(self, session, rng):
+        return session.get(
+            f"{self.base_url}/api/translate", params={"word": self._word(rng)}
+        )
+
+    def add(self, session, rng):
+        word = word_for(self.words + next(self._new_words))
+        return session.post(
+            f"{self.base_url}/api/notebooks/{rng.choice(self.notebooks)}/words",
+            json={"word": word, "definition": "n. 基准测试", "note": ""},
+        )
+
+    def move(self, session, rng):
+        word, source = rng.choice(self.entries)
+        target = rng.choice(self.notebooks)
+        return session.post(
+            f"{self.base_url}/api/notebooks/{target}/words/move",
+            json={"sourceNotebookId": source, "word": word},
+        )
+
+    def copy(self, session, rng):
+        return session.post(
+            f"{self.base_url}/api/notebooks/{rng.choice(self.notebooks)}/words/copy",
+            json={"word": self._word(rng)},
+        )
+
+    def export(self, session, rng):
+        return session.get(
+            f"{self.base_url}/api/notebooks/{rng.choice(self.notebooks)}/export"
+        )
+
+
+def read_rss_kb(pid: int) -> int:
+    """读取进程当前的常驻内存（KB），仅支持 Linux"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed: float) -> dict:
+    """按接口汇总 (接口, 延迟秒数, 是否成功) 样本"""
+    result = {}
+    for op in sorted({op for op, _, _ in samples}):
+        latencies = sorted(latency for o, latency, _ in samples if o == op)
+        errors = sum(1 for o, _, ok in samples if o == op and not ok)
+        result[op] = {
+            "requests": len(latencies),
+            "errors": errors,
+            "throughput_rps": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p90_ms": round(percentile(latencies, 90) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3),
+        }
+    return result
+
+
+def run_phase(workload, ops, duration: float, concurrency: int, pid: int) -> dict:
+    """并发执行一组接口 duration 秒，返回每个接口的统计和进程内存峰值"""
+    names = list(ops)
+    weights = [ops[name] for name in names]
+    samples = []
+    samples_lock = threading.Lock()
+    stop = threading.Event()
+    rss_peak = [read_rss_kb(pid)]
+
+    def worker(index: int):
+        rng = workload.rng(index)
+        session = requests.Session()
+        local = []
+        while not stop.is_set():
+            op = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = getattr(workload, op)(session, rng)
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            local.append((op, time.perf_counter() - start, ok))
+        with samples_lock:
+            samples.extend(local)
+
+    def sample_rss():
+        while not stop.wait(0.2):
+            rss_peak[0] = max(rss_peak[0], read_rss_kb(pid))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    threads.append(threading.Thread(target=sample_rss))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "endpoints": summarize(samples, elapsed),
+        "rss_peak_kb": rss_peak[0],
+        "rss_end_kb": read_rss_kb(pid),
+    }
+
+
+def seeded_database(cache_dir: Path, words: int, notebooks: int, seed: int) -> Path:
+    """返回缓存的种子数据库，不存在时生成"""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"wordbook-{words}-{notebooks}-{seed}.db"
+    if not path.exists():
+        print(f"生成种子数据库 {path} ...", file=sys.stderr)
+        generate(path.with_suffix(".tmp"), words, notebooks, seed)
+        path.with_suffix(".tmp").rename(path)
+    return path
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: Path, env: dict, port: int) -> subprocess.Popen:
+    """以独立进程启动后端，工作目录中放置空的前端构建产物"""
+    (workdir / "dist" / "assets").mkdir(parents=True, exist_ok=True)
+    (workdir / "dist" / "index.html").write_text("<html></html>")
+
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--app-dir",
+            str(BACKEND_DIR),
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=workdir,
+        env=env,
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("后端进程启动失败")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/api/notebooks", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("等待后端启动超时")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端 HTTP 负载基准测试")
+    parser.add_argument("--size", choices=SIZES, default="1k", help="预设规模")
+    parser.add_argument("--words", type=int, help="单词数，覆盖 --size")
+    parser.add_argument("--notebooks", type=int, help="词书数，覆盖 --size")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--duration", type=float, default=5, help="每个阶段的秒数")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--endpoints",
+        default=",".join(MIX),
+        help="单独施压的接口，逗号分隔",
+    )
+    parser.add_argument("--no-mix", action="store_true", help="跳过混合负载阶段")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR)
+    parser.add_argument(
+        "--output", type=Path, help="结果 JSON 文件，默认输出到标准输出"
+    )
+    args = parser.parse_args()
+
+    words, notebooks = SIZES[args.size]
+    words = args.words or words
+    notebooks = args.notebooks or notebooks
+    seed_db = seeded_database(args.cache_dir, words, notebooks, args.seed)
+
+    stub = UpstreamStub().start()
+    workdir = Path(tempfile.mkdtemp(prefix="wordbook-bench-"))
+    home = workdir / "home"
+    (home / ".wordbook").mkdir(parents=True)
+    db_path = home / ".wordbook" / "wordbook.db"
+    shutil.copy2(seed_db, db_path)
+
+    env = dict(os.environ)
+    env.update(stub.env())
+    env.update(
+        {
+            "HOME": str(home),
+            # 基准测试测量的是后端本身，放开上游限速
+            "WORDBOOK_UPSTREAM_RATE": "100000",
+            "WORDBOOK_UPSTREAM_BURST": "100000",
+            "WORDBOOK_UPSTREAM_MAX_QUEUE": "100000",
+        }
+    )
+
+    port = free_port()
+    process = start_server(workdir, env, port)
+    try:
+        workload = Workload(f"http://127.0.0.1:{port}", db_path, args.seed)
+        phases = {}
+        for op in args.endpoints.split(","):
+            print(f"阶段 {op} ...", file=sys.stderr)
+            phases[op] = run_phase(
+                workload, {op: 1}, args.duration, args.concurrency, process.pid
+            )
+        if not args.no_mix:
+            print("阶段 mix ...", file=sys.stderr)
+            phases["mix"] = run_phase(
+                workload, MIX, args.duration, args.concurrency, process.pid
+            )
+    finally:
+        process.terminate()
+        process.wait()
+        stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "words": words,
+            "notebooks": notebooks,
+            "seed": args.seed,
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "upstream_hits": stub.hits,
+        },
+        "phases": phases,
+    }
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""生成用于基准测试的合成 wordbook.db
+
+相同的参数和随机种子总是生成相同的数据库::
+
+    python -m bench.seed /tmp/wordbook-100k.db --words 100000
+"""
+
+import argparse
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+SCHEMA_PATH = Path(__file__).parent.parent / "schema.sql"
+
+# 预设规模：单词数 -> 词书数
+SIZES = {
+    "1k": (1_000, 10),
+    "100k": (100_000, 100),
+    "1m": (1_000_000, 200),
+}
+
+SYLLABLES = [
+    "ab", "ac", "ad", "al", "am", "an", "ar", "as", "at", "ba",
+    "be", "bi", "bo", "ca", "ce", "ci", "co", "da", "de", "di",
+    "do", "el", "en", "er", "es", "fa", "fi", "fo", "ga", "ge",
+    "go", "ha", "he", "hi", "in", "is", "la", "le", "li", "lo",
+    "ma", "me", "mi", "mo", "na", "ne", "ni", "no", "or", "ra",
+]  # fmt: skip
+
+PARTS_OF_SPEECH = ["n.", "v.", "adj.", "adv.", "prep."]
+MEANINGS = [
+    "坚持", "放弃", "理解", "学习", "记忆", "重要的", "迅速地", "问题", "方法",
+    "结果", "影响", "发展", "经验", "环境", "社会", "能力", "机会", "目标",
+]  # fmt: skip
+
+BATCH_SIZE = 10_000
+START_TIME = datetime(2024, 1, 1)
+
+
+def word_for(index: int) -> str:
+    """第 index 个单词（从 0 开始），不同的 index 得到不同的单词"""
+    parts = []
+    index += len(SYLLABLES)  # 保证至少两个音节
+    while index:
+        index, digit = divmod(index, len(SYLLABLES))
+        parts.append(SYLLABLES[digit])
+    return "".join(parts)
+
+
+def _definition(rng: random.Random) -> str:
+    senses = []
+    for _ in range(rng.randint(1, 3)):
+        pos = rng.choice(PARTS_OF_SPEECH)
+        senses.append(f"{pos} {'；'.join(rng.sample(MEANINGS, rng.randint(1, 3)))}")
+    return "\n".join(senses)
+
+
+def generate(path: Path, words: int, notebooks: int, seed: int = 42) -> Path:
+    """生成数据库文件，已存在的文件会被覆盖
+
+    Args:
+        path: 数据库文件路径
+        words: 单词数
+        notebooks: 词书数，单词随机分布在各词书中，约 20% 的单词同时在两个词书中
+        seed: 随机种子
+
+    Returns:
+        数据库文件路径
+    """
+    path = Path(path)
+    path.unlink(missing_ok=True)
+    rng = random.Random(seed)
+
+    conn = sqlite3.connect(str(path))
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.executescript(SCHEMA_PATH.read_text(encoding="utf-8"))
+
+    conn.executemany(
+        "INSERT INTO notebooks (id, name, created_at) VALUES (?, ?, ?)",
+        (
+            (i, f"notebook-{i}", START_TIME.strftime("%Y-%m-%d %H:%M:%S"))
+            for i in range(1, notebooks + 1)
+        ),
+    )
+
+    for start in range(0, words, BATCH_SIZE):
+        end = min(start + BATCH_SIZE, words)
+        word_rows = []
+        entry_rows = []
+        for i in range(start, end):
+            word_id = i + 1
+            note = f"note {i}" if rng.random() < 0.3 else ""
+            word_rows.append((word_id, word_for(i), _definition(rng), note))
+
+            add_time = START_TIME + timedelta(seconds=rng.randrange(365 * 86400))
+            add_time = add_time.strftime("%Y-%m-%d %H:%M:%S")
+            first = rng.randint(1, notebooks)
+            entry_rows.append((word_id, first, add_time))
+            if notebooks > 1 and rng.random() < 0.2:
+                second = rng.randint(1, notebooks - 1)
+                second += second >= first
+                entry_rows.append((word_id, second, add_time))
+
+        conn.executemany(
+            "INSERT INTO words (id, word, definition, note) VALUES (?, ?, ?, ?)",
+            word_rows,
+        )
+        conn.executemany(
+            "INSERT INTO word_entries (word_id, notebook_id, add_time) VALUES (?, ?, ?)",
+            entry_rows,
+        )
+        conn.commit()
+
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成基准测试用的合成数据库")
+    parser.add_argument("path", help="输出的数据库文件路径")
+    parser.add_argument("--size", choices=SIZES, default="1k", help="预设规模")
+    parser.add_argument("--words", type=int, help="单词数，覆盖 --size")
+    parser.add_argument("--notebooks", type=int, help="词书数，覆盖 --size")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    words, notebooks = SIZES[args.size]
+    words = args.words or words
+    notebooks = args.notebooks or notebooks
+
+    start = time.perf_counter()
+    generate(Path(args.path), words, notebooks, args.seed)
+    print(
+        f"已生成 {args.path}: {words} 个单词, {notebooks} 个词书, "
+        f"耗时 {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
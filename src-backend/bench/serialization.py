@@ -0,0 +1,103 @@
+"""单词列表响应的序列化开销微基准
+
+对比 10k 行单词列表的几种编码方式：FastAPI 默认的 jsonable_encoder + json、
+dict + orjson、SQLite json_object 直接拼接字节，以及 gzip 压缩的耗时和体积::
+
+    python -m bench.serialization --rows 10000
+"""
+
+import argparse
+import gzip
+import json
+import sqlite3
+import time
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from bench.seed import generate
+
+QUERY_COLUMNS = """
+    SELECT w.word, w.definition, w.note, datetime(we.add_time, '+8 hours') AS add_time
+    FROM words w JOIN word_entries we ON w.id = we.word_id
+    WHERE we.notebook_id = 1
+    ORDER BY we.add_time DESC
+"""
+
+QUERY_JSON = """
+    SELECT json_object(
+        'word', w.word,
+        'definition', w.definition,
+        'note', w.note,
+        'add_time', datetime(we.add_time, '+8 hours')
+    )
+    FROM words w JOIN word_entries we ON w.id = we.word_id
+    WHERE we.notebook_id = 1
+    ORDER BY we.add_time DESC
+"""
+
+
+def default_path(conn) -> bytes:
+    """原实现：dict(row) 后经 jsonable_encoder 和标准库 json 序列化"""
+    conn.row_factory = sqlite3.Row
+    words = [dict(row) for row in conn.execute(QUERY_COLUMNS)]
+    content = jsonable_encoder({"words": words, "total": len(words)})
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def orjson_path(conn) -> bytes:
+    conn.row_factory = sqlite3.Row
+    words = [dict(row) for row in conn.execute(QUERY_COLUMNS)]
+    return orjson.dumps({"words": words, "total": len(words)})
+
+
+def sqlite_json_path(conn) -> bytes:
+    """当前实现：SQLite json_object 逐行编码后直接拼接字节"""
+    conn.row_factory = None
+    rows = [row[0].encode() for row in conn.execute(QUERY_JSON)]
+    return b'{"words":[%s],"total":%d}' % (b",".join(rows), len(rows))
+
+
+def measure(fn, conn, repeat: int):
+    best = float("inf")
+    body = b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(conn)
+        best = min(best, time.perf_counter() - start)
+    return best, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="单词列表序列化开销微基准")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--db", default="/tmp/wordbook-serialization-bench.db")
+    args = parser.parse_args()
+
+    # 所有单词放在同一个词书中
+    generate(args.db, args.rows, 1)
+    conn = sqlite3.connect(args.db)
+
+    results = {}
+    for name, fn in [
+        ("jsonable_encoder+json", default_path),
+        ("dict+orjson", orjson_path),
+        ("sqlite_json_object", sqlite_json_path),
+    ]:
+        seconds, body = measure(fn, conn, args.repeat)
+        results[name] = {"ms": round(seconds * 1000, 3), "bytes": len(body)}
+
+    start = time.perf_counter()
+    compressed = gzip.compress(body, compresslevel=6)
+    results["gzip(level=6)"] = {
+        "ms": round((time.perf_counter() - start) * 1000, 3),
+        "bytes": len(compressed),
+    }
+    conn.close()
+
+    print(json.dumps({"rows": args.rows, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""多用户模式的基准
+
+在临时目录中准备大量用户（每个用户一个小数据库），在进程内按 Zipf 分布
+随机选择用户发起请求，记录请求延迟、打开的文件描述符数和常驻内存::
+
+    python -m bench.tenants --tenants 5000 --requests 50000 --cache-size 128
+
+打开的文件描述符和内存应随 --cache-size 增长，而与 --tenants 无关。
+仅支持 Linux（读取 /proc/self）。
+"""
+
+import argparse
+import bisect
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+WORDS = [
+    "apple",
+    "banana",
+    "cherry",
+    "orange",
+    "grape",
+    "lemon",
+    "melon",
+    "peach",
+    "plum",
+    "mango",
+]
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    samples = sorted(samples)
+
+    def pick(q):
+        return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 3)
+
+    return {
+        "count": len(samples),
+        "p50_ms": pick(0.5),
+        "p99_ms": pick(0.99),
+        "max_ms": round(samples[-1] * 1000, 3),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+    }
+
+
+def open_fds() -> int:
+    return len(os.listdir("/proc/self/fd"))
+
+
+def read_rss_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def build_template(path: Path, words: int):
+    """建立一个已迁移、包含一本词书的模板数据库，复制给每个用户"""
+    from migrations import migrate
+    from reverse_index import sync_reverse_index
+
+    conn = sqlite3.connect(str(path))
+    migrate(conn)
+    conn.execute("INSERT INTO notebooks (name) VALUES ('默认词书')")
+    for i in range(words):
+        word = f"{WORDS[i % len(WORDS)]}{i // len(WORDS) or ''}"
+        cursor = conn.execute(
+            "INSERT INTO words (word, definition) VALUES (?, ?)", (word, f"释义 {i}")
+        )
+        conn.execute(
+            "INSERT INTO word_entries (word_id, notebook_id) VALUES (?, 1)",
+            (cursor.lastrowid,),
+        )
+    conn.commit()
+    sync_reverse_index(conn)
+    conn.close()
+
+
+def zipf_weights(n: int, s: float):
+    weights = [1 / (rank**s) for rank in range(1, n + 1)]
+    total = sum(weights)
+    cumulative, acc = [], 0.0
+    for weight in weights:
+        acc += weight / total
+        cumulative.append(acc)
+    return cumulative
+
+
+def run(args) -> dict:
+    # 以下模块在导入时读取 HOME 和 WORDBOOK_* 环境变量
+    from fastapi.testclient import TestClient
+
+    import main
+    from tenants import TENANTS_DIR, tenant_cache
+
+    template = Path(args.home) / "template.db"
+    build_template(template, args.words)
+    started = time.perf_counter()
+    for i in range(args.tenants):
+        root = TENANTS_DIR / f"user{i}"
+        (root / "covers").mkdir(parents=True)
+        shutil.copyfile(template, root / "wordbook.db")
+    prepare_seconds = time.perf_counter() - started
+
+    tenant_ids = [f"user{i}" for i in range(args.tenants)]
+    rng = random.Random(args.seed)
+    rng.shuffle(tenant_ids)
+    cumulative = zipf_weights(args.tenants, args.zipf)
+
+    client = TestClient(main.app)
+    client.__enter__()
+    baseline = {"fds": open_fds(), "rss_kb": read_rss_kb()}
+
+    latencies = {"words": [], "search": [], "suggest": []}
+    peak = {"fds": baseline["fds"], "rss_kb": baseline["rss_kb"]}
+    lock = threading.Lock()
+    stop = threading.Event()
+    per_thread = args.requests // args.concurrency
+
+    def worker(index: int):
+        local_rng = random.Random(args.seed + index)
+        local = {name: [] for name in latencies}
+        for _ in range(per_thread):
+            rank = bisect.bisect_left(cumulative, local_rng.random())
+            tenant_id = tenant_ids[min(args.tenants - 1, rank)]
+            headers = {"X-Wordbook-User": tenant_id}
+            kind = local_rng.choice(("words", "words", "search", "suggest"))
+            word = local_rng.choice(WORDS)
+            if kind == "words":
+                url = "/api/notebooks/1/words?limit=20"
+            elif kind == "search":
+                url = f"/api/words/search?keyword={word[:3]}"
+            else:
+                url = f"/api/words/suggest?word={word}x"
+            begin = time.perf_counter()
+            response = client.get(url, headers=headers)
+            local[kind].append(time.perf_counter() - begin)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} {response.status_code} {response.text}")
+        with lock:
+            for name, samples in local.items():
+                latencies[name].extend(samples)
+
+    def sample():
+        while not stop.wait(0.1):
+            peak["fds"] = max(peak["fds"], open_fds())
+            peak["rss_kb"] = max(peak["rss_kb"], read_rss_kb())
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    threads = [
+        threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+
+    stats = tenant_cache.stats()
+    client.__exit__(None, None, None)
+    tenant_cache.stop()
+    all_samples = [s for samples in latencies.values() for s in samples]
+    return {
+        "tenants": args.tenants,
+        "cache_size": tenant_cache.capacity,
+        "requests": len(all_samples),
+        "prepare_seconds": round(prepare_seconds, 2),
+        "throughput_rps": round(len(all_samples) / elapsed, 1),
+        "latency": {
+            "all": percentiles(all_samples),
+            **{name: percentiles(samples) for name, samples in latencies.items()},
+        },
+        "baseline": baseline,
+        "peak": peak,
+        "fds_after_stop": open_fds(),
+        "tenant_cache": stats,
+        "hit_ratio": round(1 - stats["opened_total"] / max(1, len(all_samples)), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多用户模式的基准")
+    parser.add_argument("--tenants", type=int, default=5000, help="用户数")
+    parser.add_argument("--requests", type=int, default=50000, help="总请求数")
+    parser.add_argument("--cache-size", type=int, default=128, help="打开用户数上限")
+    parser.add_argument("--words", type=int, default=50, help="每个用户的单词数")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf 分布参数")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发线程数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果 JSON 的输出路径")
+    args = parser.parse_args()
+
+    home = tempfile.mkdtemp(prefix="wordbook-tenants-")
+    args.home = home
+    os.environ["HOME"] = home
+    # main 从工作目录下的 dist 提供前端页面
+    (Path(home) / "dist" / "assets").mkdir(parents=True)
+    (Path(home) / "dist" / "index.html").write_text("<html></html>")
+    os.chdir(home)
+    os.environ["WORDBOOK_MULTI_TENANT"] = "1"
+    os.environ["WORDBOOK_TENANT_CACHE_SIZE"] = str(args.cache_size)
+    # 不访问上游翻译服务
+    os.environ["WORDBOOK_WARM_PLATFORMS"] = ""
+    os.environ["WORDBOOK_MAINTENANCE"] = "0"
+    try:
+        result = run(args)
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""有道/必应词典的本地替身服务
+
+返回结构与真实页面一致的最小 HTML，以及有道 dictvoice 格式的发音音频
+（内容由单词和口音确定的伪 MP3 数据），供基准测试和本地调试使用，
+避免访问真实上游。单独运行::
+
+    python -m bench.upstream_stub --port 8001
+"""
+
+import argparse
+import html
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+YOUDAO_TEMPLATE = """<html><body>
+<div class="title">{word}<span class="phonetic"></span></div>
+<ul>
+<li class="word-exp">n. {word} 的释义</li>
+<li class="word-exp">v. {word} 的另一个释义</li>
+</ul>
+<div class="per-phone"><span>英</span><span class="phonetic">/{word}/</span></div>
+<div class="per-phone"><span>美</span><span class="phonetic">/{word}/</span></div>
+</body></html>"""
+
+BING_TEMPLATE = """<html><body>
+<div class="hd_div"><h1>{word}</h1></div>
+<div class="hd_prUS b_primtxt">美 [{word}]</div>
+<div class="hd_pr b_primtxt">英 [{word}]</div>
+<div class="qdef"><ul>
+<li>n. {word} 的释义</li>
+<li>v. {word} 的另一个释义</li>
+</ul></div>
+</body></html>"""
+
+# 伪音频的大小（字节）
+AUDIO_BYTES = 8 * 1024
+
+
+def fake_audio(word: str, accent_type: str) -> bytes:
+    """由单词和口音确定的伪 MP3 数据，相同参数返回相同内容"""
+    seed = f"{word}:{accent_type}".encode("utf-8")
+    body = (seed * (AUDIO_BYTES // max(1, len(seed)) + 1))[: AUDIO_BYTES - 3]
+    return b"ID3" + body
+
+
+class UpstreamStub:
+    """在后台线程中运行的替身服务，记录收到的请求数
+
+    status 不为 200 时所有请求都以该状态码失败，用于模拟上游故障。
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.latency = latency
+        self.status = 200
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.hits += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if stub.status != 200:
+                    self.send_error(stub.status)
+                    return
+
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == "/dictvoice":
+                    body = fake_audio(
+                        query.get("audio", [""])[0], query.get("type", ["2"])[0]
+                    )
+                    self.send_response(200)
+                    self.send_header("Content-Type", "audio/mpeg")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                if url.path == "/result":
+                    template, key = YOUDAO_TEMPLATE, "word"
+                elif url.path == "/dict/search":
+                    template, key = BING_TEMPLATE, "q"
+                else:
+                    self.send_error(404)
+                    return
+
+                word = query.get(key, [""])[0]
+                body = template.format(word=html.escape(word)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def env(self) -> dict:
+        """让后端使用该替身服务所需的环境变量"""
+        return {
+            "WORDBOOK_YOUDAO_URL": f"{self.base_url}/result",
+            "WORDBOOK_BING_URL": f"{self.base_url}/dict/search",
+            "WORDBOOK_AUDIO_URL": f"{self.base_url}/dictvoice",
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="有道/必应词典的本地替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="每个请求的延迟（秒）"
+    )
+    args = parser.parse_args()
+
+    stub = UpstreamStub(args.host, args.port, args.latency)
+    for key, value in stub.env().items():
+        print(f"{key}={value}")
+    stub._server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,825 @@
+"""批量导入导出与离线维护操作
+
+命令行工具（wordbook.py）和词书导入接口共用：
+
+- read_rows: 流式读取 CSV / XLSX / NDJSON，列名为导出文件的
+  单词、释义、笔记、添加时间（或 word、definition、note、add_time）
+- import_rows: 分批事务写入词书，按词头合并大小写和屈折形式，统计新增、
+  已存在和文件内重复的行，记录出错的行
+- write_csv / write_xlsx / write_ndjson: 导出词书
+- combine_notebooks: 词书的并集、交集、差集，整个运算是一条 INSERT ... SELECT
+- copy_notebook、merge_notebooks、rebuild_indexes、check_database: 离线维护
+"""
+
+import codecs
+import csv
+import json
+import posixpath
+import zipfile
+from datetime import date, datetime
+from pathlib import Path
+from typing import (
+    IO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from xml.etree import ElementTree
+from xml.etree.ElementTree import ParseError, iterparse
+
+from db import absorb_inflections
+from lemma import record_form, resolve_headword
+from listing import LISTING_COLUMNS, LISTING_VALUES
+from migrations import LATEST_VERSION, schema_version
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.cell import column_index_from_string
+from openpyxl.utils.datetime import MAC_EPOCH, WINDOWS_EPOCH, from_excel
+from reverse_index import index_word, sync_reverse_index
+
+# 工作表 XML（SpreadsheetML）和关系的命名空间
+_XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_XLSX_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+# 导出文件的列名，与导出 Excel 一致
+NOTEBOOK_COLUMNS = ["单词", "释义", "笔记", "添加时间"]
+# 列名 -> 字段名
+COLUMN_ALIASES = {
+    "单词": "word",
+    "word": "word",
+    "释义": "definition",
+    "definition": "definition",
+    "笔记": "note",
+    "note": "note",
+    "添加时间": "add_time",
+    "add_time": "add_time",
+}
+FORMATS = {".csv": "csv", ".xlsx": "xlsx", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+# 每个事务写入的行数
+BATCH_SIZE = 1000
+# 报告中最多列出的出错行数
+MAX_REPORTED_ERRORS = 100
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+TIME_INPUT_FORMATS = [
+    TIME_FORMAT,
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d %H:%M",
+    "%Y/%m/%d",
+]
+
+Source = Union[str, Path, IO[bytes]]
+
+
+def detect_format(filename: str) -> Optional[str]:
+    """按扩展名判断文件格式，无法识别时返回 None"""
+    return FORMATS.get(Path(filename).suffix.lower())
+
+
+def _field_names(header: Iterable) -> List[Optional[str]]:
+    fields = [COLUMN_ALIASES.get(str(name or "").strip().lower()) for name in header]
+    if "word" not in fields:
+        raise ValueError("缺少“单词”列")
+    return fields
+
+
+def _open_text(source: Source) -> IO[str]:
+    # utf-8-sig 兼容 Excel 另存的带 BOM 的 CSV
+    if isinstance(source, (str, Path)):
+        return open(source, encoding="utf-8-sig", newline="")
+    # 上传文件（SpooledTemporaryFile）在 Python 3.9 上不能用 TextIOWrapper 包装
+    return codecs.getreader("utf-8-sig")(source)
+
+
+def read_rows(source: Source, fmt: str) -> Iterator[Tuple[int, Dict]]:
+    """流式读取导入文件
+
+    Args:
+        source: 文件路径或二进制文件对象
+        fmt: csv、xlsx 或 ndjson
+
+    Yields:
+        (行号, 字段字典)，行号与表格软件中显示的一致（表头为第 1 行）
+
+    Raises:
+        ValueError: 格式不支持、文件无法解析、不是 UTF-8 编码或缺少“单词”列
+    """
+    try:
+        yield from _read_rows(source, fmt)
+    except UnicodeDecodeError:
+        raise ValueError("文件不是 UTF-8 编码")
+
+
+def _read_rows(source: Source, fmt: str) -> Iterator[Tuple[int, Dict]]:
+    if fmt == "csv":
+        with _open_text(source) as f:
+            reader = csv.reader(f)
+            fields = _field_names(next(reader, []))
+            # 按记录计数，单元格内的换行不影响行号
+            for number, values in enumerate(reader, start=2):
+                if any(values):
+                    yield number, _zip_fields(fields, values)
+    elif fmt == "xlsx":
+        try:
+            archive = zipfile.ZipFile(source)
+        except zipfile.BadZipFile:
+            raise ValueError("无法读取 Excel 文件")
+        try:
+            rows = _xlsx_rows(archive)
+            fields = _field_names(next(rows, (0, ()))[1])
+            for number, values in rows:
+                if any(value is not None for value in values):
+                    yield number, _zip_fields(fields, values)
+        except (KeyError, IndexError, ParseError):
+            raise ValueError("无法读取 Excel 文件")
+        finally:
+            archive.close()
+    elif fmt == "ndjson":
+        with _open_text(source) as f:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    yield number, {"error": "不是有效的 JSON"}
+                    continue
+                if not isinstance(item, dict):
+                    yield number, {"error": "每行应为一个 JSON 对象"}
+                    continue
+                yield number, {
+                    COLUMN_ALIASES[key]: value
+                    for key, value in item.items()
+                    if key in COLUMN_ALIASES
+                }
+    else:
+        raise ValueError(f"不支持的文件格式: {fmt}")
+
+
+def _xlsx_rows(archive: zipfile.ZipFile) -> Iterator[Tuple[int, List]]:
+    """逐行读取第一个工作表的单元格值，返回 (行号, 值列表)
+
+    直接用 iterparse 解析工作表 XML，每读完一行就清空 sheetData，内存占用与
+    行数无关（openpyxl 只读模式的 iter_rows 会把解析过的行留在 sheetData 下，
+    50 万行约多占 40 MiB）。单元格取缓存的计算结果，共享字符串、日期格式和
+    1904 日期系统按 workbook.xml、styles.xml 处理。
+    """
+    book_path = _xlsx_target(archive, "", "_rels/.rels", "/officeDocument")
+    book_dir = posixpath.dirname(book_path)
+    rels_path = posixpath.join(book_dir, "_rels", posixpath.basename(book_path))
+    book = ElementTree.fromstring(archive.read(book_path))
+    sheet = book.find(f"{_XLSX_NS}sheets/{_XLSX_NS}sheet")
+    properties = book.find(f"{_XLSX_NS}workbookPr")
+    epoch = WINDOWS_EPOCH
+    if properties is not None and properties.get("date1904") in ("1", "true"):
+        epoch = MAC_EPOCH
+    sheet_path = _xlsx_target(
+        archive, book_dir, f"{rels_path}.rels", sheet.get(f"{_XLSX_REL_NS}id")
+    )
+    strings = _xlsx_shared_strings(archive, book_dir)
+    date_styles = _xlsx_date_styles(archive, book_dir)
+
+    with archive.open(sheet_path) as f:
+        sheet_data = None
+        number = 0
+        for event, element in iterparse(f, events=("start", "end")):
+            if event == "start":
+                if element.tag == f"{_XLSX_NS}sheetData":
+                    sheet_data = element
+                continue
+            if element.tag != f"{_XLSX_NS}row":
+                continue
+            number = int(element.get("r") or number + 1)
+            values = []
+            for cell in element.iter(f"{_XLSX_NS}c"):
+                reference = cell.get("r")
+                if reference:
+                    column = column_index_from_string(reference.rstrip("0123456789"))
+                else:
+                    column = len(values) + 1
+                values.extend([None] * (column - len(values)))
+                values[column - 1] = _xlsx_value(cell, strings, date_styles, epoch)
+            if sheet_data is not None:
+                sheet_data.clear()
+            yield number, values
+
+
+def _xlsx_target(archive: zipfile.ZipFile, base: str, rels_path: str, key: str) -> str:
+    """按关系文件找到 Id 为 key（或类型以 key 结尾）的部件在压缩包中的路径"""
+    for rel in ElementTree.fromstring(archive.read(rels_path)):
+        if rel.get("Id") == key or rel.get("Type", "").endswith(key):
+            target = rel.get("Target")
+            if target.startswith("/"):
+                return target[1:]
+            return posixpath.normpath(posixpath.join(base, target))
+    raise KeyError(key)
+
+
+def _xlsx_text(element) -> str:
+    """纯文本或富文本各段的文字，不含注音"""
+    if element is None:
+        return ""
+    parts = element.findall(f"{_XLSX_NS}t") + element.findall(
+        f"{_XLSX_NS}r/{_XLSX_NS}t"
+    )
+    return "".join(t.text or "" for t in parts)
+
+
+def _xlsx_shared_strings(archive: zipfile.ZipFile, book_dir: str) -> List[str]:
+    try:
+        f = archive.open(posixpath.join(book_dir, "sharedStrings.xml"))
+    except KeyError:
+        return []
+    strings = []
+    with f:
+        for _, element in iterparse(f):
+            if element.tag == f"{_XLSX_NS}si":
+                strings.append(_xlsx_text(element))
+                element.clear()
+    return strings
+
+
+def _xlsx_date_styles(archive: zipfile.ZipFile, book_dir: str) -> Set[int]:
+    """数字格式为日期的单元格样式序号"""
+    try:
+        styles = ElementTree.fromstring(
+            archive.read(posixpath.join(book_dir, "styles.xml"))
+        )
+    except KeyError:
+        return set()
+    formats = dict(BUILTIN_FORMATS)
+    for fmt in styles.iter(f"{_XLSX_NS}numFmt"):
+        formats[int(fmt.get("numFmtId"))] = fmt.get("formatCode", "")
+    cell_styles = styles.find(f"{_XLSX_NS}cellXfs")
+    if cell_styles is None:
+        return set()
+    return {
+        index
+        for index, style in enumerate(cell_styles)
+        if is_date_format(formats.get(int(style.get("numFmtId", 0)), ""))
+    }
+
+
+def _xlsx_value(cell, strings: List[str], date_styles: Set[int], epoch: datetime):
+    kind = cell.get("t", "n")
+    if kind == "inlineStr":
+        return _xlsx_text(cell.find(f"{_XLSX_NS}is"))
+    value = cell.findtext(f"{_XLSX_NS}v")
+    if not value:
+        return None
+    if kind == "s":
+        return strings[int(value)]
+    if kind == "b":
+        return value == "1"
+    if kind != "n":
+        # str（公式结果）、e（错误）、d（ISO 日期文本）
+        return value
+    try:
+        number = int(value)
+    except ValueError:
+        number = float(value)
+    if int(cell.get("s", 0)) in date_styles:
+        return from_excel(number, epoch)
+    return number
+
+
+def _zip_fields(fields: List[Optional[str]], values: Iterable) -> Dict:
+    return {field: value for field, value in zip(fields, values) if field}
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _parse_time(value) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.strftime(TIME_FORMAT)
+    if isinstance(value, date):
+        return value.strftime(TIME_FORMAT)
+    text = str(value).strip()
+    for fmt in TIME_INPUT_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime(TIME_FORMAT)
+        except ValueError:
+            continue
+    raise ValueError(f"无法识别的添加时间: {text}")
+
+
+def _clean_row(row: Dict) -> Tuple[str, str, str, Optional[str]]:
+    if "error" in row:
+        raise ValueError(row["error"])
+    word = _text(row.get("word"))
+    if not word:
+        raise ValueError("单词为空")
+    return (
+        word,
+        _text(row.get("definition")),
+        _text(row.get("note")),
+        _parse_time(row.get("add_time")),
+    )
+
+
+def import_rows(
+    conn,
+    notebook_id: int,
+    rows: Iterable[Tuple[int, Dict]],
+    batch_size: int = BATCH_SIZE,
+    is_known: Optional[Callable[[str], bool]] = None,
+    on_batch: Optional[Callable[[Dict, List[str]], None]] = None,
+) -> Dict:
+    """把 read_rows 读出的行写入词书
+
+    单词按 resolve_headword 归并到词头；已有单词的释义、笔记只在导入的值
+    非空时覆盖；已在词书中的单词保留原添加时间。每 batch_size 行提交一次，
+    出错的行跳过并记录，不影响其他行。文件读到一半无法继续解析时（如中途
+    出现非 UTF-8 字节）停止导入，已读取的行照常提交，原因记录在 aborted 中。
+
+    内存占用与文件大小无关：文件内的重复通过条目ID判断（ID 大于导入开始时
+    最大 ID 的条目是本次导入写入的），不在内存中记录已导入的单词。
+
+    Args:
+        conn: 数据库连接
+        notebook_id: 目标词书ID
+        rows: (行号, 字段字典) 序列
+        batch_size: 每个事务写入的行数
+        is_known: 判断单词是否收录在本地词典中，见 resolve_headword
+        on_batch: 每提交一批后调用，参数为当前统计和本批新加入词书的词头
+
+    Returns:
+        统计：rows（总行数）、added（新加入词书）、existing（导入前已在词书中）、
+        duplicates（文件内重复）、error_count、errors（前若干个出错的行）和
+        aborted（中止导入的原因，读完整个文件时为 None；rows 为 0 时没有写入）
+    """
+    report = {
+        "rows": 0,
+        "added": 0,
+        "existing": 0,
+        "duplicates": 0,
+        "error_count": 0,
+        "errors": [],
+        "aborted": None,
+    }
+    first_new_id = (
+        conn.execute("SELECT COALESCE(MAX(id), 0) FROM word_entries").fetchone()[0] + 1
+    )
+    batch_words: List[str] = []
+    pending = 0
+
+    rows = iter(rows)
+    while True:
+        try:
+            number, row = next(rows)
+        except StopIteration:
+            break
+        except ValueError as e:
+            report["aborted"] = str(e)
+            break
+        report["rows"] += 1
+        try:
+            word, definition, note, add_time = _clean_row(row)
+        except ValueError as e:
+            report["error_count"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append({"row": number, "message": str(e)})
+            continue
+
+        headword = resolve_headword(conn, word, is_known)
+        record_form(conn, word, headword)
+
+        existing = conn.execute(
+            "SELECT id, definition, note FROM words WHERE word = ?", (headword,)
+        ).fetchone()
+        if existing is None:
+            word_id = conn.execute(
+                "INSERT INTO words (word, definition, note) VALUES (?, ?, ?)",
+                (headword, definition, note),
+            ).lastrowid
+            index_word(conn, word_id, definition, note)
+            absorb_inflections(conn, word_id, headword)
+        else:
+            word_id = existing[0]
+            definition = definition or existing[1]
+            note = note or existing[2]
+            if (definition, note) != (existing[1], existing[2]):
+                conn.execute(
+                    "UPDATE words SET definition = ?, note = ? WHERE id = ?",
+                    (definition, note, word_id),
+                )
+                index_word(conn, word_id, definition, note)
+
+        # 排序和筛选用的冗余列在插入时一并写入，省去触发器的二次更新
+        inserted = conn.execute(
+            f"""
+            INSERT OR IGNORE INTO word_entries
+                (word_id, notebook_id, add_time, {LISTING_COLUMNS})
+            SELECT id, ?, COALESCE(?, CURRENT_TIMESTAMP), {LISTING_VALUES}
+            FROM words WHERE id = ?
+            """,
+            (notebook_id, add_time, word_id),
+        ).rowcount
+        if inserted:
+            report["added"] += 1
+            batch_words.append(headword)
+        else:
+            entry_id = conn.execute(
+                "SELECT id FROM word_entries WHERE word_id = ? AND notebook_id = ?",
+                (word_id, notebook_id),
+            ).fetchone()[0]
+            if entry_id >= first_new_id:
+                report["duplicates"] += 1
+            else:
+                report["existing"] += 1
+
+        pending += 1
+        if pending >= batch_size:
+            conn.commit()
+            if on_batch:
+                on_batch(report, batch_words)
+            pending = 0
+            batch_words = []
+
+    conn.commit()
+    if on_batch:
+        on_batch(report, batch_words)
+    return report
+
+
+def notebook_rows(conn, notebook_id: int) -> Iterator[Tuple]:
+    """按添加时间倒序逐批读取词书中的单词、释义、笔记和添加时间"""
+    cursor = conn.execute(
+        """
+        SELECT w.word, w.definition, w.note, we.add_time
+        FROM words w
+        JOIN word_entries we ON w.id = we.word_id
+        WHERE we.notebook_id = ?
+        ORDER BY we.add_time DESC
+        """,
+        (notebook_id,),
+    )
+    while True:
+        batch = cursor.fetchmany(BATCH_SIZE)
+        if not batch:
+            break
+        for row in batch:
+            yield tuple(row)
+
+
+def write_xlsx(
+    rows: Iterable[Tuple], path: Path, on_row: Optional[Callable[[], None]] = None
+) -> int:
+    """以只写模式流式写入 Excel，表头加粗
+
+    Returns:
+        写入的行数
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+    header = []
+    for title in NOTEBOOK_COLUMNS:
+        cell = WriteOnlyCell(sheet, value=title)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    sheet.append(header)
+    count = 0
+    for row in rows:
+        sheet.append(row)
+        count += 1
+        if on_row:
+            on_row()
+    workbook.save(str(path))
+    return count
+
+
+def write_csv(
+    rows: Iterable[Tuple], path: Path, on_row: Optional[Callable[[], None]] = None
+) -> int:
+    """写入带 BOM 的 UTF-8 CSV，Excel 可以直接打开"""
+    count = 0
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(NOTEBOOK_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+            if on_row:
+                on_row()
+    return count
+
+
+def write_ndjson(
+    rows: Iterable[Tuple], path: Path, on_row: Optional[Callable[[], None]] = None
+) -> int:
+    """每行一个单词对象，字段与 get_words 的流式响应一致"""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for word, definition, note, add_time in rows:
+            item = {
+                "word": word,
+                "definition": definition,
+                "note": note,
+                "add_time": add_time,
+            }
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            count += 1
+            if on_row:
+                on_row()
+    return count
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx, "ndjson": write_ndjson}
+
+
+def copy_notebook(conn, notebook_id: int, name: Optional[str] = None) -> int:
+    """复制词书（单词关联以新的添加时间加入副本），与复制接口一致
+
+    Returns:
+        新词书ID
+    """
+    notebook = conn.execute(
+        "SELECT name FROM notebooks WHERE id = ?", (notebook_id,)
+    ).fetchone()
+    if notebook is None:
+        raise ValueError(f"词书 {notebook_id} 不存在")
+    new_id = conn.execute(
+        "INSERT INTO notebooks (name) VALUES (?)",
+        (name or f"{notebook[0]} (副本)",),
+    ).lastrowid
+    conn.execute(
+        f"""
+        INSERT INTO word_entries (word_id, notebook_id, {LISTING_COLUMNS})
+        SELECT word_id, ?, {LISTING_COLUMNS} FROM word_entries WHERE notebook_id = ?
+        """,
+        (new_id, notebook_id),
+    )
+    conn.commit()
+    return new_id
+
+
+def merge_notebooks(
+    conn, source_id: int, target_id: int, delete_source: bool = False
+) -> Dict:
+    """把 source 中的单词合并到 target，在一个事务中完成
+
+    delete_source 为 True 时移动条目（保留添加时间和复习进度）并删除 source，
+    否则复制条目；target 中已有的单词保持不变。
+
+    Returns:
+        added（新加入 target 的单词数）和 skipped（target 中已有的单词数）
+    """
+    for notebook_id in (source_id, target_id):
+        if not conn.execute(
+            "SELECT 1 FROM notebooks WHERE id = ?", (notebook_id,)
+        ).fetchone():
+            raise ValueError(f"词书 {notebook_id} 不存在")
+    if source_id == target_id:
+        raise ValueError("不能把词书合并到自身")
+
+    total = conn.execute(
+        "SELECT COUNT(*) FROM word_entries WHERE notebook_id = ?", (source_id,)
+    ).fetchone()[0]
+    if delete_source:
+        # 更新 notebook_id 时复习状态由触发器随条目移动
+        added = conn.execute(
+            """
+            UPDATE OR IGNORE word_entries SET notebook_id = ?
+            WHERE notebook_id = ?
+            """,
+            (target_id, source_id),
+        ).rowcount
+        conn.execute("DELETE FROM word_entries WHERE notebook_id = ?", (source_id,))
+        conn.execute("DELETE FROM notebooks WHERE id = ?", (source_id,))
+    else:
+        added = conn.execute(
+            f"""
+            INSERT OR IGNORE INTO word_entries
+                (word_id, notebook_id, add_time, {LISTING_COLUMNS})
+            SELECT word_id, ?, add_time, {LISTING_COLUMNS}
+            FROM word_entries WHERE notebook_id = ?
+            """,
+            (target_id, source_id),
+        ).rowcount
+    conn.commit()
+    return {"added": added, "skipped": total - added}
+
+
+# 集合运算 -> 默认名称中的运算符
+SET_OPERATIONS = {"union": " ∪ ", "intersection": " ∩ ", "difference": " − "}
+
+
+def missing_notebooks(conn, notebook_ids: Iterable[int]) -> List[int]:
+    """notebook_ids 中不存在的词书ID"""
+    ids = list(dict.fromkeys(notebook_ids))
+    placeholders = ",".join("?" * len(ids))
+    found = {
+        row[0]
+        for row in conn.execute(
+            f"SELECT id FROM notebooks WHERE id IN ({placeholders})", ids
+        )
+    }
+    return [notebook_id for notebook_id in ids if notebook_id not in found]
+
+
+def _set_query(operation: str, sources: List[int]) -> Tuple[str, List[int]]:
+    """集合运算结果 (word_id, add_time, 冗余列) 的查询，add_time 取源词书中最早的添加时间
+
+    - union: 出现在任一源词书中的单词
+    - intersection: 出现在所有源词书中的单词（(word_id, notebook_id) 唯一，
+      按单词分组后计数等于词书数即可）
+    - difference: 在第一本中、不在其余任何一本中的单词
+    """
+    if operation not in SET_OPERATIONS:
+        raise ValueError(f"不支持的集合运算: {operation}")
+    if len(sources) < 2:
+        raise ValueError("至少需要两本不同的词书")
+
+    # 冗余列对同一个单词都相同
+    columns = LISTING_COLUMNS.split(", ")
+    listed = ", ".join(f"e.{column}" for column in columns)
+    grouped = ", ".join(f"MIN({column}) AS {column}" for column in columns)
+    if operation == "difference":
+        placeholders = ",".join("?" * (len(sources) - 1))
+        query = f"""
+            SELECT e.word_id, e.add_time, {listed} FROM word_entries e
+            WHERE e.notebook_id = ? AND NOT EXISTS (
+                SELECT 1 FROM word_entries o
+                WHERE o.word_id = e.word_id AND o.notebook_id IN ({placeholders})
+            )
+            """
+        return query, list(sources)
+
+    placeholders = ",".join("?" * len(sources))
+    query = f"""
+        SELECT word_id, MIN(add_time) AS add_time, {grouped} FROM word_entries
+        WHERE notebook_id IN ({placeholders})
+        GROUP BY word_id
+        """
+    params = list(sources)
+    if operation == "intersection":
+        query += "HAVING COUNT(*) = ?"
+        params.append(len(sources))
+    return query, params
+
+
+def combine_notebooks(
+    conn,
+    operation: str,
+    sources: List[int],
+    target_id: Optional[int] = None,
+    name: Optional[str] = None,
+    preview: bool = False,
+) -> Dict:
+    """对词书做集合运算，结果写入新词书或已有的 target
+
+    运算和写入都是一条 INSERT ... SELECT，在数据库内完成，不把单词读到 Python 中；
+    新建词书和写入在同一个事务中提交。target 中已有的单词保持不变。
+
+    Args:
+        conn: 数据库连接
+        operation: union、intersection 或 difference
+        sources: 源词书ID（difference 为被减的词书在前），重复的ID只计一次
+        target_id: 写入的已有词书，为空时新建词书
+        name: 新词书名称，默认由源词书名称和运算符组成
+        preview: 只统计结果中的单词数和会新加入的单词数，不写入
+
+    Returns:
+        added（新加入的单词数）；预览时还有 count（运算结果的单词数），
+        写入时还有 notebook_id 和 name
+
+    Raises:
+        ValueError: 运算不支持或源词书少于两本
+    """
+    sources = list(dict.fromkeys(sources))
+    query, params = _set_query(operation, sources)
+
+    if preview:
+        count = conn.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
+        added = count
+        if target_id is not None:
+            added = conn.execute(
+                f"""
+                SELECT COUNT(*) FROM ({query}) s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM word_entries t
+                    WHERE t.word_id = s.word_id AND t.notebook_id = ?
+                )
+                """,
+                [*params, target_id],
+            ).fetchone()[0]
+        return {"count": count, "added": added}
+
+    if target_id is None:
+        if not name:
+            names = dict(
+                conn.execute(
+                    f"SELECT id, name FROM notebooks WHERE id IN "
+                    f"({','.join('?' * len(sources))})",
+                    sources,
+                ).fetchall()
+            )
+            name = SET_OPERATIONS[operation].join(names[i] for i in sources)
+        target_id = conn.execute(
+            "INSERT INTO notebooks (name) VALUES (?)", (name,)
+        ).lastrowid
+    else:
+        name = conn.execute(
+            "SELECT name FROM notebooks WHERE id = ?", (target_id,)
+        ).fetchone()[0]
+
+    try:
+        added = conn.execute(
+            f"""
+            INSERT OR IGNORE INTO word_entries
+                (word_id, notebook_id, add_time, {LISTING_COLUMNS})
+            SELECT word_id, ?, add_time, {LISTING_COLUMNS} FROM ({query})
+            """,
+            [target_id, *params],
+        ).rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {"notebook_id": target_id, "name": name, "added": added}
+
+
+def rebuild_indexes(conn) -> Dict:
+    """重建所有 SQLite 索引和中文反查索引"""
+    conn.execute("REINDEX")
+    conn.execute("DELETE FROM word_index")
+    conn.commit()
+    indexed = sync_reverse_index(conn)
+    conn.execute("INSERT INTO word_index (word_index) VALUES ('optimize')")
+    conn.commit()
+    return {"reverse_indexed": indexed}
+
+
+def check_database(conn) -> Dict[str, List[str]]:
+    """检查数据库
+
+    Returns:
+        errors（需要处理的问题）和 warnings（不影响使用，如孤立单词）
+    """
+    errors, warnings = [], []
+    for (message,) in conn.execute("PRAGMA integrity_check"):
+        if message != "ok":
+            errors.append(f"integrity_check: {message}")
+    for table, rowid, parent, _ in conn.execute("PRAGMA foreign_key_check"):
+        errors.append(f"{table} 第 {rowid} 行引用的 {parent} 不存在")
+
+    version = schema_version(conn)
+    if version != LATEST_VERSION:
+        errors.append(f"结构版本为 {version}，最新为 {LATEST_VERSION}，需要迁移")
+
+    checks = [
+        (
+            errors,
+            "SELECT COUNT(*) FROM words WHERE id NOT IN (SELECT rowid FROM word_index)",
+            "{} 个单词没有中文反查索引（执行 reindex）",
+        ),
+        (
+            errors,
+            "SELECT COUNT(*) FROM word_index WHERE rowid NOT IN (SELECT id FROM words)",
+            "{} 条反查索引对应的单词已不存在（执行 reindex）",
+        ),
+        (
+            errors,
+            """
+            SELECT COUNT(*) FROM word_entries we
+            WHERE NOT EXISTS (
+                SELECT 1 FROM review_state r
+                WHERE r.word_id = we.word_id AND r.notebook_id = we.notebook_id
+            )
+            """,
+            "{} 个词书条目没有复习状态",
+        ),
+        (
+            warnings,
+            """
+            SELECT COUNT(*) FROM words
+            WHERE id NOT IN (SELECT word_id FROM word_entries)
+            """,
+            "{} 个单词不在任何词书中（后台维护的 orphans 任务会清理）",
+        ),
+    ]
+    for target, query, message in checks:
+        count = conn.execute(query).fetchone()[0]
+        if count:
+            target.append(message.format(count))
+    return {"errors": errors, "warnings": warnings}
@@ -3,32 +3,156 @@ import sqlite3
 from pathlib import Path
 from typing import Dict, List, Optional
 
+from lemma import inflected_forms, record_form, resolve_headword
+from metrics import InstrumentedConnection
+from reverse_index import index_word
+from tenants import current_tenant
+
 # 在用户目录下创建应用数据文件夹
 APP_DATA_DIR = os.path.join(Path.home(), ".wordbook")
 DB_PATH = os.path.join(APP_DATA_DIR, "wordbook.db")
 
 
 def init_db():
-    """初始化数据库"""
+    """初始化数据库：创建数据目录并执行未完成的结构迁移"""
+    # migrations 依赖各功能模块，而功能模块依赖 db，因此在这里导入
+    from migrations import migrate
+
     # 确保应用数据目录存在
     if not os.path.exists(APP_DATA_DIR):
         os.makedirs(APP_DATA_DIR)
 
-    # 连接数据库并创建表
     conn = get_db_connection()
-    with open(Path(__file__).parent.parent / "schema.sql", encoding="utf-8") as f:
-        s = f.read()
-        conn.executescript(s)
-    conn.close()
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
 
 
 def get_db_connection():
-    """获取数据库连接"""
-    conn = sqlite3.connect(DB_PATH)
+    """获取数据库连接，多用户模式下为当前用户的数据库"""
+    tenant = current_tenant()
+    if tenant is not None:
+        return tenant.connect()
+
+    conn = sqlite3.connect(DB_PATH, factory=InstrumentedConnection)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+# 数据版本随这些表的任何写入递增
+VERSIONED_TABLES = ("notebooks", "words", "word_entries")
+
+
+def init_data_version(conn):
+    """创建数据版本计数器
+
+    notebooks、words、word_entries 的任何写入都会通过触发器使 db_meta 中的
+    data_version 加一，依赖这些表的缓存比较版本号即可判断是否失效。
+    """
+    statements = [
+        """
+        CREATE TABLE IF NOT EXISTS db_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO db_meta (key, value) VALUES ('data_version', 0);
+        """
+    ]
+    for table in VERSIONED_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            statements.append(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_version_{table}_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE db_meta SET value = value + 1 WHERE key = 'data_version';
+                END;
+                """
+            )
+    conn.executescript("".join(statements))
+    conn.commit()
+
+
+def get_data_version(conn) -> int:
+    """当前数据版本"""
+    row = conn.execute(
+        "SELECT value FROM db_meta WHERE key = 'data_version'"
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def bump_data_version(conn, at_least: int = 0):
+    """使数据版本递增且大于 at_least，如导入数据库后使所有缓存失效"""
+    conn.execute(
+        "UPDATE db_meta SET value = MAX(value, ?) + 1 WHERE key = 'data_version'",
+        (at_least,),
+    )
+    conn.commit()
+
+
+def absorb_inflections(conn, word_id: int, headword: str) -> List[str]:
+    """把已保存的 headword 的屈折形式并入新保存的词头，由调用方提交事务
+
+    原形晚于词形保存时（先加“Running”“runs”，再加“run”），之前的词形各自
+    成了词头。这里把它们的词书条目（复习状态由触发器随条目移动）、复习记录
+    和词形映射改到新词头上，词头已在同一词书中时保留词头的条目；新词头没有
+    释义时沿用旧单词的释义，笔记依次合并，然后删除旧单词。
+
+    Returns:
+        并入的单词
+    """
+    forms = inflected_forms(headword)
+    if not forms:
+        return []
+    rows = conn.execute(
+        f"""
+        SELECT id, word, definition, note FROM words
+        WHERE word COLLATE NOCASE IN ({",".join("?" * len(forms))}) AND id != ?
+        ORDER BY id
+        """,
+        (*forms, word_id),
+    ).fetchall()
+    if not rows:
+        return []
+
+    definition, note = conn.execute(
+        "SELECT definition, note FROM words WHERE id = ?", (word_id,)
+    ).fetchone()
+    old_notes: List[str] = []
+    for old_id, old_word, old_definition, old_note in rows:
+        conn.execute(
+            "UPDATE OR IGNORE word_entries SET word_id = ? WHERE word_id = ?",
+            (word_id, old_id),
+        )
+        conn.execute("DELETE FROM word_entries WHERE word_id = ?", (old_id,))
+        conn.execute("DELETE FROM review_state WHERE word_id = ?", (old_id,))
+        conn.execute(
+            "UPDATE review_log SET word_id = ? WHERE word_id = ?", (word_id, old_id)
+        )
+        conn.execute(
+            "UPDATE word_forms SET headword = ? WHERE headword = ?",
+            (headword, old_word),
+        )
+        record_form(conn, old_word, headword)
+        conn.execute("DELETE FROM words WHERE id = ?", (old_id,))
+        conn.execute("DELETE FROM word_index WHERE rowid = ?", (old_id,))
+        definition = definition or old_definition
+        if old_note and old_note not in old_notes:
+            old_notes.append(old_note)
+
+    if old_notes:
+        # 旧单词的笔记在前（较早添加），每条以换行结尾
+        merged = [n for n in old_notes + [note] if n]
+        note = "".join(n if n.endswith("\n") else n + "\n" for n in merged)
+    conn.execute(
+        "UPDATE words SET definition = ?, note = ? WHERE id = ?",
+        (definition, note, word_id),
+    )
+    index_word(conn, word_id, definition, note)
+    return [row[1] for row in rows]
+
+
 def create_notebook(name: str) -> int:
     """创建新的单词本
 
@@ -66,6 +190,11 @@ def add_word_to_notebook(
         conn = get_db_connection()
         cursor = conn.cursor()
 
+        # 大小写和屈折形式归并到已保存的词头
+        surface = word
+        word = resolve_headword(conn, surface)
+        record_form(conn, surface, word)
+
         # 使用 INSERT OR REPLACE 来插入或更新单词
         cursor.execute(
             """
@@ -94,6 +223,9 @@ def add_word_to_notebook(
             )
             print(f"添加词本关联: word_id={word_id}, notebook_id={notebook_id}")
 
+        index_word(conn, word_id, definition, note)
+        absorb_inflections(conn, word_id, word)
+
         conn.commit()
         conn.close()
         return True
@@ -0,0 +1,351 @@
+"""异步导出任务
+
+导出词书（Excel）和整个数据库（zip）在后台线程池中执行，请求只负责提交任务：
+
+- POST /api/notebooks/{id}/export、POST /api/export-db 提交任务，立即返回任务信息
+- GET /api/exports/{job_id} 查询进度（词书为已写入的行数，数据库为已压缩的字节数）
+- GET /api/exports/{job_id}/download 下载结果，支持 Range 断点续传
+
+导出结果保存在数据目录的 exports/ 下，文件名包含数据版本（db.get_data_version），
+数据没有变化时重复导出直接返回已有的文件，重启后同样有效；数据变化后生成新文件，
+旧文件在宽限时间之后删除，期间已开始的下载仍可续传。
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from bulk import notebook_rows, write_xlsx
+from db import get_data_version, get_db_connection
+from tenants import background_context, covers_dir, current_tenant_id, data_dir
+
+EXPORT_WORKERS = int(os.environ.get("WORDBOOK_EXPORT_WORKERS", "2"))
+# 数据变化后旧导出文件的保留时间（秒）
+STALE_GRACE_SECONDS = int(os.environ.get("WORDBOOK_EXPORT_GRACE_SECONDS", "3600"))
+# 旧的 GET 导出接口等待导出完成的最长时间（秒），超过后返回 202 和任务信息
+EXPORT_WAIT_SECONDS = float(os.environ.get("WORDBOOK_EXPORT_WAIT_SECONDS", "10"))
+# 内存中保留的任务记录数
+KEEP_JOBS = 200
+# 压缩数据库时每次写入的字节数
+CHUNK_BYTES = 1 << 20
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ZIP_MEDIA_TYPE = "application/zip"
+
+# 导出文件名：notebook-<词书ID>-v<数据版本>.xlsx、database-v<数据版本>-<修改时间>.zip
+ARTIFACT_NAME = re.compile(r"^(notebook-\d+|database)-v(\d+)")
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def exports_dir() -> Path:
+    """当前用户的导出文件目录"""
+    return data_dir() / "exports"
+
+
+def _beijing_time(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return (datetime.utcfromtimestamp(timestamp) + timedelta(hours=8)).strftime(
+        TIME_FORMAT
+    )
+
+
+class ExportJob:
+    """一个导出任务及其进度"""
+
+    def __init__(
+        self,
+        kind: str,
+        prefix: str,
+        version: int,
+        artifact: Path,
+        filename: str,
+        media_type: str,
+        total: int,
+        unit: str,
+        notebook_id: Optional[int] = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.tenant = current_tenant_id()
+        self.kind = kind
+        self.notebook_id = notebook_id
+        self.prefix = prefix
+        self.version = version
+        self.artifact = artifact
+        self.filename = filename
+        self.media_type = media_type
+        self.total = total
+        self.unit = unit
+        self.processed = 0
+        self.size = None
+        self.status = "queued"
+        self.cached = False
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def finish(self, error: Optional[str] = None):
+        self.status = "failed" if error else "done"
+        self.error = error
+        if not error:
+            self.size = self.artifact.stat().st_size
+        self.finished_at = time.time()
+        self.done.set()
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "notebook_id": self.notebook_id,
+            "status": self.status,
+            "processed": self.processed,
+            "total": self.total,
+            "unit": self.unit,
+            "size": self.size,
+            "filename": self.filename,
+            "cached": self.cached,
+            "error": self.error,
+            "created_at": _beijing_time(self.created_at),
+            "finished_at": _beijing_time(self.finished_at),
+            "download_url": (
+                f"/api/exports/{self.id}/download" if self.status == "done" else None
+            ),
+        }
+
+
+class ExportManager:
+    """提交、执行和查询导出任务"""
+
+    def __init__(self, workers: int = EXPORT_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._jobs: "OrderedDict[str, ExportJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start_notebook(self, notebook_id: int) -> Optional[ExportJob]:
+        """提交词书导出任务
+
+        Returns:
+            导出任务，词书不存在时为 None
+        """
+        conn = get_db_connection()
+        try:
+            notebook = conn.execute(
+                "SELECT name FROM notebooks WHERE id = ?", (notebook_id,)
+            ).fetchone()
+            if notebook is None:
+                return None
+            total = conn.execute(
+                "SELECT COUNT(*) FROM word_entries WHERE notebook_id = ?",
+                (notebook_id,),
+            ).fetchone()[0]
+            version = get_data_version(conn)
+        finally:
+            conn.close()
+
+        prefix = f"notebook-{notebook_id}"
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        job = ExportJob(
+            kind="notebook",
+            prefix=prefix,
+            version=version,
+            artifact=exports_dir() / f"{prefix}-v{version}.xlsx",
+            filename=f"{notebook['name']}_{timestamp}.xlsx",
+            media_type=XLSX_MEDIA_TYPE,
+            total=total,
+            unit="rows",
+            notebook_id=notebook_id,
+        )
+        return self._submit(job, build_notebook)
+
+    def start_database(self) -> ExportJob:
+        """提交整个数据库（含封面）的导出任务
+
+        数据库中还有翻译缓存、复习记录等不计入数据版本的表，
+        因此缓存同时以数据库文件的修改时间区分。
+        """
+        conn = get_db_connection()
+        try:
+            version = get_data_version(conn)
+            db_bytes = (
+                conn.execute("PRAGMA page_count").fetchone()[0]
+                * conn.execute("PRAGMA page_size").fetchone()[0]
+            )
+        finally:
+            conn.close()
+
+        modified = (data_dir() / "wordbook.db").stat().st_mtime_ns
+        cover_bytes = sum(f.stat().st_size for f in _cover_files())
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        job = ExportJob(
+            kind="database",
+            prefix="database",
+            version=version,
+            artifact=exports_dir() / f"database-v{version}-{modified}.zip",
+            filename=f"wordbook_backup_{timestamp}.zip",
+            media_type=ZIP_MEDIA_TYPE,
+            total=db_bytes + cover_bytes,
+            unit="bytes",
+        )
+        return self._submit(job, build_database)
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        """查询当前用户的任务"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.tenant != current_tenant_id():
+            return None
+        return job
+
+    def _submit(self, job: ExportJob, build: Callable) -> ExportJob:
+        with self._lock:
+            # 相同数据的任务正在执行或已完成时直接返回该任务
+            for existing in reversed(self._jobs.values()):
+                if existing.artifact != job.artifact or existing.status == "failed":
+                    continue
+                if existing.status != "done" or existing.artifact.exists():
+                    return existing
+            if job.artifact.exists():
+                # 重启前生成的文件
+                job.processed = job.total
+                job.cached = True
+                job.finish()
+                self._remember(job)
+                return job
+            self._remember(job)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="export"
+                )
+            executor = self._executor
+
+        # 在当前上下文中执行，多用户模式下读写当前用户的数据
+        context = background_context()
+        executor.submit(context.run, self._run, job, build)
+        return job
+
+    def _remember(self, job: ExportJob):
+        self._jobs[job.id] = job
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= KEEP_JOBS:
+                break
+            if self._jobs[job_id].done.is_set():
+                del self._jobs[job_id]
+
+    def _run(self, job: ExportJob, build: Callable):
+        job.status = "running"
+        partial = job.artifact.with_name(f".{job.artifact.name}.part")
+        try:
+            job.artifact.parent.mkdir(parents=True, exist_ok=True)
+            build(job, partial)
+            os.replace(partial, job.artifact)
+        except Exception as e:
+            partial.unlink(missing_ok=True)
+            print(f"导出任务 {job.id} 失败: {e}")
+            job.finish(str(e))
+            return
+        job.finish()
+        remove_stale_artifacts(job)
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def build_notebook(job: ExportJob, path: Path):
+    """把词书写入 Excel 文件
+
+    行一次读出后立即释放读锁，再逐行写入，不在写文件期间阻塞其他连接的写入。
+    """
+    conn = get_db_connection()
+    try:
+        rows = list(notebook_rows(conn, job.notebook_id))
+    finally:
+        conn.close()
+    job.total = len(rows)
+
+    def advance():
+        job.processed += 1
+
+    write_xlsx(rows, path, advance)
+
+
+def build_database(job: ExportJob, path: Path):
+    """把数据库快照和封面文件压缩为 zip
+
+    先用 SQLite 在线备份得到一致的快照（只在复制期间持有读锁），再分块压缩。
+    """
+    snapshot = path.with_name(path.name + ".db")
+    source = get_db_connection()
+    target = sqlite3.connect(str(snapshot))
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+    try:
+        covers = _cover_files()
+        job.total = snapshot.stat().st_size + sum(f.stat().st_size for f in covers)
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+            _write_member(zf, snapshot, "wordbook.db", job)
+            for cover in covers:
+                _write_member(zf, cover, f"covers/{cover.name}", job)
+    finally:
+        snapshot.unlink(missing_ok=True)
+
+
+def _cover_files():
+    directory = covers_dir()
+    if not directory.exists():
+        return []
+    return [f for f in directory.glob("*") if f.is_file()]
+
+
+def _write_member(zf: zipfile.ZipFile, source: Path, name: str, job: ExportJob):
+    with open(source, "rb") as f, zf.open(name, "w", force_zip64=True) as member:
+        while True:
+            chunk = f.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            member.write(chunk)
+            job.processed += len(chunk)
+
+
+def remove_stale_artifacts(job: ExportJob):
+    """删除超过宽限时间的旧导出文件和中断任务留下的临时文件
+
+    数据版本不同的文件，以及同一词书（或整库）的其他版本都视为过期。
+    """
+    cutoff = time.time() - STALE_GRACE_SECONDS
+    for file in job.artifact.parent.iterdir():
+        if file == job.artifact:
+            continue
+        try:
+            if file.stat().st_mtime > cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        match = ARTIFACT_NAME.match(file.name)
+        if match is None:
+            stale = file.name.startswith(".")
+        else:
+            stale = int(match.group(2)) != job.version or match.group(1) == job.prefix
+        if stale:
+            file.unlink(missing_ok=True)
+
+
+export_jobs = ExportManager()
@@ -0,0 +1,269 @@
+"""拼写纠错索引
+
+以二元组倒排索引已保存的单词、翻译缓存中的单词和可选的本地词典文件，
+在本地给出编辑距离 1~2 以内的“你是不是要找”候选，避免拼错的单词
+也去抓取上游。
+"""
+
+import contextvars
+import os
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from db import get_db_connection
+from lemma import lemma_candidates
+from tenants import tenant_local
+
+# 本地词典文件，每行一个单词；配置后未收录的单词视为拼写错误，不再请求上游
+DICTIONARY_PATH = os.environ.get("WORDBOOK_DICTIONARY", "")
+MAX_DISTANCE = 2
+MAX_SUGGESTIONS = 5
+
+
+class Pattern:
+    """预处理后的单词，用位并行算法（Myers/Hyyrö）计算它与其他单词的编辑距离
+
+    查询词要和大量候选词比较，只需预处理一次。
+    """
+
+    def __init__(self, word: str):
+        self.word = word
+        self.length = len(word)
+        self.last = 1 << (self.length - 1) if word else 0
+        self.mask = (1 << self.length) - 1
+        # 每个字符在单词中出现位置的位图
+        self.peq: Dict[str, int] = {}
+        for i, c in enumerate(word):
+            self.peq[c] = self.peq.get(c, 0) | (1 << i)
+
+    def distance(self, text: str) -> int:
+        """与 text 的编辑距离"""
+        if not self.length:
+            return len(text)
+
+        peq, last, mask = self.peq, self.last, self.mask
+        pv, mv, score = mask, 0, self.length
+        for c in text:
+            eq = peq.get(c, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | ~(xh | pv)
+            mh = pv & xh
+            if ph & last:
+                score += 1
+            elif mh & last:
+                score -= 1
+            ph = (ph << 1) | 1
+            mh <<= 1
+            pv = (mh | ~(xv | ph)) & mask
+            mv = ph & xv & mask
+        return score
+
+
+def levenshtein(a: str, b: str) -> int:
+    """两个字符串的编辑距离"""
+    return Pattern(a).distance(b)
+
+
+def bigrams(word: str) -> Set[str]:
+    """单词（首尾加边界符）中出现的二元组"""
+    padded = f"^{word}$"
+    return {padded[i : i + 2] for i in range(len(padded) - 1)}
+
+
+class BigramIndex:
+    """按长度分区的二元组倒排索引
+
+    编辑距离为 k 时，一次编辑最多破坏查询词的 2 个二元组，候选词至少要包含
+    查询词 len(bigrams) - 2k 个不同的二元组，且长度相差不超过 k。
+    先用倒排表计数筛出候选，再逐个计算准确的编辑距离。
+    """
+
+    def __init__(self):
+        self._words: List[str] = []
+        self._ids: Dict[str, int] = {}
+        # (长度, 二元组) -> 单词 id 列表
+        self._postings: Dict[Tuple[int, str], List[int]] = defaultdict(list)
+        # 长度 -> 单词 id 列表，查询词太短、计数无法筛选时使用
+        self._by_length: Dict[int, List[int]] = defaultdict(list)
+
+    @property
+    def size(self) -> int:
+        return len(self._words)
+
+    def add(self, word: str):
+        if word in self._ids:
+            return
+        word_id = len(self._words)
+        self._words.append(word)
+        self._ids[word] = word_id
+        length = len(word)
+        self._by_length[length].append(word_id)
+        for gram in bigrams(word):
+            self._postings[(length, gram)].append(word_id)
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[int, str]]:
+        """返回编辑距离不超过 max_distance 的 (距离, 单词)，按距离排序"""
+        pattern = Pattern(word)
+        grams = bigrams(word)
+        threshold = len(grams) - 2 * max_distance
+        results = []
+        for length in range(
+            max(0, len(word) - max_distance), len(word) + max_distance + 1
+        ):
+            if threshold <= 0:
+                candidates = self._by_length.get(length, ())
+            else:
+                counts = Counter()
+                for gram in grams:
+                    postings = self._postings.get((length, gram))
+                    if postings:
+                        counts.update(postings)
+                candidates = [i for i, n in counts.items() if n >= threshold]
+
+            for word_id in candidates:
+                candidate = self._words[word_id]
+                distance = pattern.distance(candidate)
+                if distance <= max_distance:
+                    results.append((distance, candidate))
+        results.sort()
+        return results
+
+
+class FuzzyIndex:
+    """单词拼写纠错索引
+
+    启动时在后台线程中构建，之后随添加单词和写入翻译缓存增量更新。
+    多用户模式下每个用户有自己的索引，只包含该用户的单词和翻译缓存，
+    本地词典由作为 base 的全局索引提供，不会在用户之间重复加载。
+    """
+
+    def __init__(self, base: Optional["FuzzyIndex"] = None):
+        self.base = base
+        self._lock = threading.Lock()
+        self._index = BigramIndex()
+        # 小写形式 -> 原始形式
+        self._known: Dict[str, str] = {}
+        # 本地词典中的单词（小写），只在全局索引上加载
+        self._dictionary: Set[str] = set()
+        self._ready = threading.Event()
+        self.authoritative = False
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def build_async(self):
+        # 在当前上下文中执行，多用户模式下读取当前用户的数据库
+        context = contextvars.copy_context()
+        threading.Thread(
+            target=context.run, args=(self.build,), name="fuzzy-index", daemon=True
+        ).start()
+
+    def build(self):
+        """从数据库和本地词典文件构建索引"""
+        words = []
+        if self.base is None and DICTIONARY_PATH and os.path.exists(DICTIONARY_PATH):
+            from warmup import read_wordlist
+
+            dictionary = read_wordlist(DICTIONARY_PATH)
+            self._dictionary = {word.strip().lower() for word in dictionary}
+            words.extend(dictionary)
+            self.authoritative = True
+
+        conn = get_db_connection()
+        try:
+            words.extend(row[0] for row in conn.execute("SELECT word FROM words"))
+            words.extend(
+                row[0] for row in conn.execute("SELECT DISTINCT word FROM translations")
+            )
+        finally:
+            conn.close()
+
+        self.add_many(words)
+        self._ready.set()
+        if self.base is None:
+            print(f"拼写纠错索引已就绪: {self._index.size} 个单词")
+
+    def add_many(self, words: Iterable[str]):
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str):
+        key = word.strip().lower()
+        if not key:
+            return
+        with self._lock:
+            if key in self._known:
+                return
+            self._known[key] = word.strip()
+            self._index.add(key)
+
+    def contains(self, word: str) -> bool:
+        if word.strip().lower() in self._known:
+            return True
+        return self.base is not None and self.base.contains(word)
+
+    def in_dictionary(self, word: str) -> bool:
+        """单词收录在本地词典中，用于确认屈折形式的原形（见 resolve_headword）"""
+        if word.strip().lower() in self._dictionary:
+            return True
+        return self.base is not None and self.base.in_dictionary(word)
+
+    def contains_form(self, word: str) -> bool:
+        """单词本身或其原形已收录"""
+        return self.contains(word) or any(
+            self.contains(candidate) for candidate in lemma_candidates(word)
+        )
+
+    def suggest(
+        self, word: str, max_distance: int = MAX_DISTANCE, limit: int = MAX_SUGGESTIONS
+    ) -> List[Dict]:
+        """返回编辑距离在 max_distance 以内的候选单词，不包括单词本身"""
+        key = word.strip().lower()
+        if not key:
+            return []
+        with self._lock:
+            matches = self._index.search(key, max_distance)
+            suggestions = [
+                {"word": self._known[candidate], "distance": distance}
+                for distance, candidate in matches
+                if distance > 0
+            ][:limit]
+        if self.base is not None:
+            seen = {s["word"].lower() for s in suggestions}
+            suggestions += [
+                s
+                for s in self.base.suggest(word, max_distance, limit)
+                if s["word"].lower() not in seen
+            ]
+            suggestions.sort(key=lambda s: s["distance"])
+        return suggestions[:limit]
+
+    def check(self, word: str) -> Optional[List[Dict]]:
+        """判断单词是否应视为拼写错误
+
+        Returns:
+            索引以本地词典为准、单词未收录且存在候选时返回候选列表，否则返回 None
+        """
+        authoritative = self.authoritative or (
+            self.base is not None and self.base.ready and self.base.authoritative
+        )
+        if not self.ready or not authoritative or self.contains_form(word):
+            return None
+        return self.suggest(word) or None
+
+
+fuzzy_index = FuzzyIndex()
+
+
+def _tenant_index() -> FuzzyIndex:
+    index = FuzzyIndex(base=fuzzy_index)
+    index.build_async()
+    return index
+
+
+def current_fuzzy_index() -> FuzzyIndex:
+    """当前用户的纠错索引，单用户模式下为全局索引"""
+    return tenant_local("fuzzy", fuzzy_index, _tenant_index)
@@ -0,0 +1,284 @@
+"""单词规范化：大小写折叠与词形还原
+
+words.word 按原样唯一，“run”“runs”“Running”会成为不同的单词，
+也会分别抓取上游。这里把输入的词形解析为一个词头：
+
+1. 大小写折叠（NFKC + casefold）
+2. 不规则词形表（went -> go、children -> child），只收录没有歧义的词形，
+   left、found、saw 这类本身也是常用词头的不收录
+3. 基于后缀的规则（studies -> study、running -> run、liked -> like），
+   不处理 -er/-est，computer、teacher 这类派生词是独立的词头
+
+规则只生成候选，候选必须是已知的词才会被采用，避免把“during”还原成“dur”：
+不规则词形、-s/-es 和双写词尾辅音的 -ing/-ed（running、stopped）还原的原形
+是已保存的单词即可；其他 -ing/-ed 的还原容易误判（using -> us、caring -> car、
+interesting -> interest），只有本地词典收录原形、不收录该词形时才采用。
+解析结果记录在 word_forms 表中（词形 -> 词头），之后直接命中。
+
+原形晚于它的词形保存时（先加了“runs”再加“run”），db.absorb_inflections
+把已保存的词形并入新词头。
+"""
+
+import unicodedata
+from typing import Callable, List, Optional
+
+# 不规则词形 -> 原形
+IRREGULAR = {
+    # 动词
+    "am": "be", "is": "be", "are": "be", "was": "be", "were": "be",
+    "been": "be", "being": "be", "has": "have", "had": "have", "does": "do",
+    "did": "do", "done": "do", "went": "go", "gone": "go", "ran": "run",
+    "came": "come", "became": "become", "began": "begin", "begun": "begin",
+    "broke": "break", "broken": "break", "brought": "bring", "built": "build",
+    "bought": "buy", "caught": "catch", "chose": "choose", "chosen": "choose",
+    "drew": "draw", "drawn": "draw", "drank": "drink", "drunk": "drink",
+    "drove": "drive", "driven": "drive", "ate": "eat", "eaten": "eat",
+    "fallen": "fall", "fought": "fight", "flew": "fly", "flown": "fly",
+    "forgot": "forget", "forgotten": "forget", "forgave": "forgive",
+    "forgiven": "forgive", "froze": "freeze", "frozen": "freeze", "got": "get",
+    "gotten": "get", "gave": "give", "given": "give", "grew": "grow",
+    "grown": "grow", "hung": "hang", "heard": "hear", "hid": "hide",
+    "hidden": "hide", "held": "hold", "kept": "keep", "knew": "know",
+    "known": "know", "laid": "lay", "led": "lead", "lent": "lend",
+    "lain": "lie", "lost": "lose", "made": "make", "meant": "mean",
+    "met": "meet", "paid": "pay", "rode": "ride", "ridden": "ride",
+    "rang": "ring", "rung": "ring", "risen": "rise", "said": "say",
+    "seen": "see", "sought": "seek", "sold": "sell", "sent": "send",
+    "shook": "shake", "shaken": "shake", "shone": "shine", "shot": "shoot",
+    "showed": "show", "shown": "show", "sang": "sing", "sung": "sing",
+    "sank": "sink", "sunk": "sink", "sat": "sit", "slept": "sleep",
+    "slid": "slide", "spoke": "speak", "spoken": "speak", "spent": "spend",
+    "stood": "stand", "stole": "steal", "stolen": "steal", "stuck": "stick",
+    "struck": "strike", "swore": "swear", "sworn": "swear", "swam": "swim",
+    "swum": "swim", "took": "take", "taken": "take", "taught": "teach",
+    "tore": "tear", "torn": "tear", "told": "tell", "thought": "think",
+    "threw": "throw", "thrown": "throw", "understood": "understand",
+    "woke": "wake", "woken": "wake", "wore": "wear", "worn": "wear",
+    "won": "win", "wrote": "write", "written": "write", "fed": "feed",
+    "fled": "flee", "bent": "bend", "bitten": "bite", "bled": "bleed",
+    "blew": "blow", "blown": "blow", "bred": "breed", "dealt": "deal",
+    "dug": "dig", "dreamt": "dream", "dwelt": "dwell", "knelt": "kneel",
+    "leapt": "leap", "overcame": "overcome", "sped": "speed", "spun": "spin",
+    "sprang": "spring", "sprung": "spring", "stung": "sting",
+    "strove": "strive", "striven": "strive", "swept": "sweep", "swung": "swing",
+    "wept": "weep", "withdrew": "withdraw", "withdrawn": "withdraw",
+    # 名词复数
+    "men": "man", "women": "woman", "children": "child", "people": "person",
+    "feet": "foot", "teeth": "tooth", "geese": "goose", "mice": "mouse",
+    "lice": "louse", "oxen": "ox", "criteria": "criterion",
+    "phenomena": "phenomenon", "analyses": "analysis", "crises": "crisis",
+    "theses": "thesis", "hypotheses": "hypothesis", "diagnoses": "diagnosis",
+    "indices": "index", "appendices": "appendix", "matrices": "matrix",
+    "vertices": "vertex", "cacti": "cactus", "fungi": "fungus",
+    "nuclei": "nucleus", "stimuli": "stimulus", "syllabi": "syllabus",
+    "alumni": "alumnus", "curricula": "curriculum", "bacteria": "bacterium",
+}  # fmt: skip
+
+# 以 s/ed/ing 结尾但不是（或通常不作为）屈折形式的常见词，不做后缀还原
+NON_INFLECTED = {
+    "news", "series", "species", "means", "physics", "mathematics",
+    "economics", "politics", "ethics", "always", "perhaps", "whereas",
+    "thus", "this", "its", "his", "hers", "ours", "yours", "theirs",
+    "bus", "gas", "yes", "lens", "bias", "atlas", "canvas", "chaos",
+    "during", "nothing", "something", "anything", "everything", "morning",
+    "evening", "ceiling", "king", "ring", "sing", "thing", "bring",
+    "spring", "string", "swing", "wing", "sting", "cling", "fling",
+    "need", "seed", "feed", "speed", "bleed", "breed", "greed", "indeed",
+    "bed", "red", "shed", "wed", "hundred", "naked", "wicked", "sacred",
+    "building", "meeting", "feeling", "painting", "wedding", "clothing",
+    "setting", "beginning", "earring", "pudding", "awning",
+}  # fmt: skip
+
+VOWELS = set("aeiou")
+# -ing/-ed 还原出的原形至少的长度（using 不还原为 us）
+MIN_STEM_LENGTH = 3
+
+
+def fold(word: str) -> str:
+    """大小写折叠，用于比较和作为缓存键"""
+    return unicodedata.normalize("NFKC", word or "").strip().casefold()
+
+
+def _undouble(stem: str) -> List[str]:
+    """running -> runn -> run；stopped -> stopp -> stop"""
+    if len(stem) >= 3 and stem[-1] == stem[-2] and stem[-1] not in VOWELS:
+        return [stem[:-1]]
+    return []
+
+
+def _ends_cvc(stem: str) -> bool:
+    """以辅音-元音-辅音结尾（hop、car、plan），去掉的多半是词尾的 e"""
+    return (
+        len(stem) >= 3
+        and stem[-1] not in VOWELS | set("wxy")
+        and stem[-2] in VOWELS
+        and stem[-3] not in VOWELS
+    )
+
+
+def _doubled_stem(word: str) -> Optional[str]:
+    """running -> run、stopped -> stop：双写词尾辅音的 -ing/-ed 形式的原形
+
+    只有以辅音-元音-辅音结尾的原形才会双写，这一形式不会是 caring、using 之类
+    的误判，不需要本地词典确认。l、s、f、z 常见本身就双写（killing、passed），
+    不按这条规则还原。
+    """
+    w = fold(word)
+    if not w.isalpha() or w in NON_INFLECTED:
+        return None
+    for suffix in ("ing", "ed"):
+        if not w.endswith(suffix):
+            continue
+        stem = w[: -len(suffix)]
+        if stem[-1:] in set("lsfz"):
+            return None
+        for candidate in _undouble(stem):
+            if _ends_cvc(candidate):
+                return candidate
+    return None
+
+
+def inflected_forms(headword: str) -> List[str]:
+    """resolve_headword 不经本地词典确认就会归并到 headword 的词形
+
+    不规则词形、-s/-es 复数和第三人称、双写词尾辅音的 -ing/-ed。
+    """
+    h = fold(headword)
+    if not h.isalpha():
+        return []
+    forms = [form for form, lemma in IRREGULAR.items() if lemma == h]
+    forms += [h + "s", h + "es", h + h[-1] + "ing", h + h[-1] + "ed"]
+    if h.endswith("y"):
+        forms.append(h[:-1] + "ies")
+    if h.endswith("f"):
+        forms.append(h[:-1] + "ves")
+    if h.endswith("fe"):
+        forms.append(h[:-2] + "ves")
+    return [
+        form
+        for form in forms
+        if h in lemma_candidates(form, verb_forms=False) or _doubled_stem(form) == h
+    ]
+
+
+def lemma_candidates(word: str, verb_forms: bool = True) -> List[str]:
+    """可能的原形，越靠前越可能，不包括单词本身
+
+    Args:
+        word: 单词
+        verb_forms: 是否包括 -ing/-ed 还原出的原形
+    """
+    w = fold(word)
+    candidates = []
+    if w in IRREGULAR:
+        candidates.append(IRREGULAR[w])
+
+    if len(w) >= 4 and w.isalpha() and w not in NON_INFLECTED:
+        if w.endswith("ies"):
+            candidates.append(w[:-3] + "y")
+        elif w.endswith("ves"):
+            candidates += [w[:-3] + "f", w[:-3] + "fe"]
+        if w.endswith(("ches", "shes", "sses", "xes", "zes", "oes")):
+            candidates.append(w[:-2])
+        if w.endswith("s") and not w.endswith(("ss", "us", "is")):
+            candidates.append(w[:-1])
+
+        for suffix in ("ing", "ed") if verb_forms else ():
+            if not w.endswith(suffix) or len(w) - len(suffix) < 2:
+                continue
+            stem = w[: -len(suffix)]
+            if suffix == "ed" and stem.endswith("i"):
+                # studied -> study，tied -> tie
+                candidates += [stem[:-1] + "y", stem + "e"]
+                break
+            candidates += _undouble(stem)
+            # hoping -> hope，caring -> care 优先于 hop、car
+            stems = [stem + "e", stem] if _ends_cvc(stem) else [stem, stem + "e"]
+            candidates += [s for s in stems if len(s) >= MIN_STEM_LENGTH]
+            break
+
+    seen = {w}
+    result = []
+    for candidate in candidates:
+        if len(candidate) >= 2 and candidate not in seen:
+            seen.add(candidate)
+            result.append(candidate)
+    return result
+
+
+def init_lemma_tables(conn):
+    """创建词形表和大小写不敏感的单词索引"""
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS word_forms (
+            form TEXT PRIMARY KEY,
+            headword TEXT NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_word_forms_headword ON word_forms(headword);
+        CREATE INDEX IF NOT EXISTS idx_words_word_nocase ON words(word COLLATE NOCASE);
+        """
+    )
+    conn.commit()
+
+
+def _saved_headword(conn, word: str) -> Optional[str]:
+    """大小写不敏感地查找已保存的单词，返回其保存时的拼写"""
+    row = conn.execute(
+        "SELECT word FROM words WHERE word = ? COLLATE NOCASE ORDER BY id LIMIT 1",
+        (word,),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def resolve_headword(
+    conn, word: str, is_known: Optional[Callable[[str], bool]] = None
+) -> str:
+    """解析 word 应归入的词头
+
+    依次尝试：word_forms 中记录的映射、大小写不敏感的已保存单词、
+    不规则词形、-s/-es 或双写词尾辅音的 -ing/-ed 还原的原形为已保存的单词、
+    词形不在本地词典中而原形在（包括其他 -ing/-ed 还原的原形，已保存时使用
+    保存时的拼写）。
+
+    Args:
+        conn: 数据库连接
+        word: 用户输入的词形
+        is_known: 判断单词是否收录在本地词典中，为空时不做 -ing/-ed 还原
+
+    Returns:
+        词头；都没有命中时返回去除首尾空白的原词
+    """
+    word = unicodedata.normalize("NFKC", word or "").strip()
+    key = fold(word)
+
+    row = conn.execute(
+        "SELECT headword FROM word_forms WHERE form = ?", (key,)
+    ).fetchone()
+    if row:
+        return row[0]
+
+    saved = _saved_headword(conn, word)
+    if saved:
+        return saved
+
+    for candidate in lemma_candidates(key, verb_forms=False) + [_doubled_stem(key)]:
+        saved = candidate and _saved_headword(conn, candidate)
+        if saved:
+            return saved
+
+    if is_known is not None and not is_known(key):
+        for candidate in lemma_candidates(key):
+            if is_known(candidate):
+                return _saved_headword(conn, candidate) or candidate
+    return word
+
+
+def record_form(conn, word: str, headword: str):
+    """记录词形到词头的映射，由调用方提交事务"""
+    key = fold(word)
+    if key != headword:
+        conn.execute(
+            "INSERT OR REPLACE INTO word_forms (form, headword) VALUES (?, ?)",
+            (key, headword),
+        )
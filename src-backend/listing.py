@@ -0,0 +1,300 @@
+"""单词列表的排序与筛选
+
+GET /api/notebooks/{id}/words 支持按添加时间、单词、单词长度排序，并按添加时间
+范围、有无笔记、有无释义筛选。排序键和筛选条件中来自 words 表的部分
+（单词、长度、有无笔记和释义）由触发器冗余到 word_entries 上，每种排序键有
+一个以 (notebook_id, 排序键, id) 开头、包含全部筛选列的覆盖索引：
+
+- 查询用 INDEXED BY 固定使用排序键对应的索引，按索引顺序读取，不需要临时 B 树
+  排序；添加时间范围在按时间排序时是索引上的范围定位，其余筛选在索引上判断，
+  不回表，命中的行再按主键取 words 中的内容
+- 总数用同一个索引计数
+
+check_query_plans 对所有支持的组合执行 EXPLAIN QUERY PLAN，出现全表扫描或
+临时 B 树时报告（python -m wordbook plans）。
+"""
+
+from datetime import datetime, timedelta
+from itertools import product
+from typing import List, Optional, Sequence, Tuple
+
+# 排序键 -> (索引, ORDER BY 列)，末尾的 id 使相同排序值的分页结果稳定
+SORT_KEYS = {
+    "add_time": ("idx_entries_by_time", ["we.add_time", "we.id"]),
+    "word": ("idx_entries_by_word", ["we.sort_word", "we.id"]),
+    "length": ("idx_entries_by_length", ["we.word_length", "we.sort_word", "we.id"]),
+}
+# 各排序键的默认方向：最新添加的在前，单词和长度从小到大
+DEFAULT_ORDER = {"add_time": "desc", "word": "asc", "length": "asc"}
+ORDERS = ("asc", "desc")
+
+# 数据库中保存 UTC 时间，接口参数和返回值为北京时间
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DISPLAY_OFFSET = timedelta(hours=8)
+TIME_INPUT_FORMATS = [TIME_FORMAT, "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S"]
+DATE_FORMAT = "%Y-%m-%d"
+
+_HAS_NOTE = "COALESCE(trim({0}.note), '') != ''"
+_HAS_DEFINITION = "COALESCE(trim({0}.definition), '') != ''"
+
+# word_entries 上冗余的列，以及在 words 上计算它们的表达式。批量插入时直接写入
+# 这些列，插入触发器只补齐没有提供冗余列（sort_word 为空）的条目
+LISTING_COLUMNS = "sort_word, word_length, has_note, has_definition"
+LISTING_VALUES = (
+    f"word, length(word), {_HAS_NOTE.format('words')}, "
+    f"{_HAS_DEFINITION.format('words')}"
+)
+
+
+def init_listing_columns(conn):
+    """在 word_entries 上冗余排序和筛选用的列，创建同步触发器和覆盖索引"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(word_entries)")]
+    for name, definition in [
+        ("sort_word", "TEXT COLLATE NOCASE"),
+        ("word_length", "INTEGER"),
+        ("has_note", "INTEGER NOT NULL DEFAULT 0"),
+        ("has_definition", "INTEGER NOT NULL DEFAULT 0"),
+    ]:
+        if name not in columns:
+            conn.execute(f"ALTER TABLE word_entries ADD COLUMN {name} {definition}")
+
+    has_note = _HAS_NOTE.format("NEW")
+    has_definition = _HAS_DEFINITION.format("NEW")
+    conn.executescript(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_listing_entry_insert
+        AFTER INSERT ON word_entries
+        WHEN NEW.sort_word IS NULL
+        BEGIN
+            UPDATE word_entries
+            SET (sort_word, word_length, has_note, has_definition) = (
+                SELECT w.word, length(w.word), {_HAS_NOTE.format("w")},
+                    {_HAS_DEFINITION.format("w")}
+                FROM words w WHERE w.id = NEW.word_id
+            )
+            WHERE id = NEW.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_listing_entry_word
+        AFTER UPDATE OF word_id ON word_entries
+        BEGIN
+            UPDATE word_entries
+            SET (sort_word, word_length, has_note, has_definition) = (
+                SELECT w.word, length(w.word), {_HAS_NOTE.format("w")},
+                    {_HAS_DEFINITION.format("w")}
+                FROM words w WHERE w.id = NEW.word_id
+            )
+            WHERE id = NEW.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_listing_word_insert
+        AFTER INSERT ON words
+        BEGIN
+            UPDATE word_entries
+            SET sort_word = NEW.word, word_length = length(NEW.word),
+                has_note = {has_note}, has_definition = {has_definition}
+            WHERE word_id = NEW.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_listing_word_update
+        AFTER UPDATE OF word, definition, note ON words
+        BEGIN
+            UPDATE word_entries
+            SET sort_word = NEW.word, word_length = length(NEW.word),
+                has_note = {has_note}, has_definition = {has_definition}
+            WHERE word_id = NEW.id;
+        END;
+        """
+    )
+    conn.execute(
+        f"""
+        UPDATE word_entries
+        SET (sort_word, word_length, has_note, has_definition) = (
+            SELECT w.word, length(w.word), {_HAS_NOTE.format("w")},
+                {_HAS_DEFINITION.format("w")}
+            FROM words w WHERE w.id = word_entries.word_id
+        )
+        """
+    )
+    conn.executescript(
+        """
+        CREATE INDEX IF NOT EXISTS idx_entries_by_time ON word_entries(
+            notebook_id, add_time, id, has_note, has_definition, word_id
+        );
+        CREATE INDEX IF NOT EXISTS idx_entries_by_word ON word_entries(
+            notebook_id, sort_word, id, add_time, has_note, has_definition, word_id
+        );
+        CREATE INDEX IF NOT EXISTS idx_entries_by_length ON word_entries(
+            notebook_id, word_length, sort_word, id,
+            add_time, has_note, has_definition, word_id
+        );
+        """
+    )
+    conn.commit()
+
+
+def parse_time(value: str, end: bool = False) -> str:
+    """把北京时间的日期或时间转换为数据库中的 UTC 时间，作为半开区间的端点
+
+    Args:
+        value: 如 2024-05-01 或 2024-05-01 08:30:00
+        end: 是否为区间终点。终点包含当天（只给日期时）或当秒
+
+    Raises:
+        ValueError: 无法识别的格式
+    """
+    value = value.strip()
+    try:
+        moment = datetime.strptime(value, DATE_FORMAT)
+        step = timedelta(days=1)
+    except ValueError:
+        for fmt in TIME_INPUT_FORMATS:
+            try:
+                moment = datetime.strptime(value, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"无法识别的时间: {value}")
+        step = timedelta(seconds=1)
+    if end:
+        moment += step
+    return (moment - DISPLAY_OFFSET).strftime(TIME_FORMAT)
+
+
+class WordListing:
+    """一次单词列表查询的排序和筛选条件
+
+    Raises:
+        ValueError: 排序键、方向或时间参数无效
+    """
+
+    def __init__(
+        self,
+        notebook_id: int,
+        sort: str = "add_time",
+        order: Optional[str] = None,
+        added_from: Optional[str] = None,
+        added_to: Optional[str] = None,
+        has_note: Optional[bool] = None,
+        has_definition: Optional[bool] = None,
+    ):
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort 应为 {'、'.join(SORT_KEYS)} 之一")
+        order = (order or DEFAULT_ORDER[sort]).lower()
+        if order not in ORDERS:
+            raise ValueError("order 应为 asc 或 desc")
+        self.index, columns = SORT_KEYS[sort]
+        self.order_by = ", ".join(f"{column} {order.upper()}" for column in columns)
+        # 排序键的各列，分页时从上一页最后一行接着读
+        self.key_columns = list(columns)
+        self._after_op = ">" if order == "asc" else "<"
+
+        conditions = ["we.notebook_id = ?"]
+        self.params: List = [notebook_id]
+        if added_from:
+            conditions.append("we.add_time >= ?")
+            self.params.append(parse_time(added_from))
+        if added_to:
+            conditions.append("we.add_time < ?")
+            self.params.append(parse_time(added_to, end=True))
+        if has_note is not None:
+            conditions.append("we.has_note = ?")
+            self.params.append(int(has_note))
+        if has_definition is not None:
+            conditions.append("we.has_definition = ?")
+            self.params.append(int(has_definition))
+        self.where = " AND ".join(conditions)
+
+    def count_sql(self) -> Tuple[str, List]:
+        """符合条件的单词数"""
+        return (
+            f"SELECT COUNT(*) FROM word_entries we INDEXED BY {self.index} "
+            f"WHERE {self.where}",
+            list(self.params),
+        )
+
+    def rows_sql(
+        self,
+        select: str,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        after: Optional[Sequence] = None,
+    ) -> Tuple[str, List]:
+        """按排序键读取一页，select 中用 w 和 we 引用 words 和 word_entries
+
+        CROSS JOIN 固定以 word_entries 为外层，按索引顺序读取后逐行取单词内容。
+
+        Args:
+            after: 上一页最后一行的排序键（与 key_columns 对应），
+                只读取排在它之后的行
+        """
+        where, params = self.where, list(self.params)
+        if after is not None:
+            where += (
+                f" AND ({', '.join(self.key_columns)}) {self._after_op} "
+                f"({', '.join('?' * len(self.key_columns))})"
+            )
+            params.extend(after)
+        return (
+            f"""
+            SELECT {select}
+            FROM word_entries we INDEXED BY {self.index}
+            CROSS JOIN words w ON w.id = we.word_id
+            WHERE {where}
+            ORDER BY {self.order_by}
+            LIMIT ? OFFSET ?
+            """,
+            [*params, -1 if limit is None else limit, offset or 0],
+        )
+
+
+# 检查分页查询计划时用作“上一页最后一行”的排序键
+_SAMPLE_KEYS = {
+    "we.add_time": "2024-06-01 00:00:00",
+    "we.sort_word": "m",
+    "we.word_length": 5,
+    "we.id": 1000,
+}
+
+
+def _plan_problems(conn, sql: str, params: List) -> List[str]:
+    problems = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+        detail = row[3]
+        if detail.startswith("SCAN") or "TEMP B-TREE" in detail:
+            problems.append(detail)
+    return problems
+
+
+def check_query_plans(conn) -> List[str]:
+    """检查所有排序、方向和筛选组合的查询计划
+
+    Returns:
+        有全表扫描或临时 B 树排序的组合及其计划，为空表示全部通过
+    """
+    failures = []
+    dates = [(None, None), ("2024-01-01", None), (None, "2024-12-31")]
+    dates.append(("2024-01-01 08:00:00", "2024-12-31"))
+    flags = (None, True, False)
+    for sort, order, (added_from, added_to), has_note, has_definition in product(
+        SORT_KEYS, ORDERS, dates, flags, flags
+    ):
+        listing = WordListing(
+            1, sort, order, added_from, added_to, has_note, has_definition
+        )
+        combination = (
+            f"sort={sort} order={order} added_from={added_from} "
+            f"added_to={added_to} has_note={has_note} "
+            f"has_definition={has_definition}"
+        )
+        after = [_SAMPLE_KEYS[column] for column in listing.key_columns]
+        for kind, (sql, params) in (
+            ("rows", listing.rows_sql("w.word", limit=20)),
+            ("page", listing.rows_sql("w.word", limit=20, after=after)),
+            ("count", listing.count_sql()),
+        ):
+            problems = _plan_problems(conn, sql, params)
+            if problems:
+                failures.append(f"{combination} [{kind}]: {'; '.join(problems)}")
+    return failures
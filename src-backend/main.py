@@ -1,26 +1,71 @@
+import os
 import shutil
 import sqlite3
 import tempfile
+import threading
 import zipfile
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
-import pandas as pd
 import pytz  # 添加这个导入
+from audio import ACCENTS, fetch_audio
+from bulk import (
+    SET_OPERATIONS,
+    combine_notebooks,
+    detect_format,
+    import_rows,
+    missing_notebooks,
+    read_rows,
+)
 from db import (
+    absorb_inflections,
     add_word_to_notebook,
+    bump_data_version,
     create_notebook,
+    get_data_version,
     get_db_connection,
+    init_db,
     search_words,
 )
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from exports import EXPORT_WAIT_SECONDS, ExportJob, export_jobs
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import (
+    FileResponse,
+    ORJSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
+from fuzzy import current_fuzzy_index, fuzzy_index
+from lemma import fold, record_form, resolve_headword
+from listing import WordListing
+from maintenance import TASKS, maintenance
+from metrics import InstrumentedConnection, MetricsMiddleware, registry
+from migrations import LATEST_VERSION, migrate, schema_version
+from profiling import ProfilingMiddleware, profiled
 from pydantic import BaseModel
-from search import search_word
-from starlette.background import BackgroundTask  # 修改这里的导入
+from quiz import build_quiz
+from review import grade_word, next_due, next_due_at
+from reverse_index import index_word, reverse_lookup, sync_reverse_index
+from scheduler import QueueFullError, scheduler
+from serialization import CompressionMiddleware, RawJSONResponse, json_rows
+from singleflight import SingleFlight
+from tenants import (
+    TENANT_MODE,
+    TenantMiddleware,
+    TenantStaticFiles,
+    background_context,
+    backups_dir,
+    covers_dir,
+    current_tenant,
+    current_tenant_id,
+    data_dir,
+    tenant_cache,
+)
+from warmup import enqueue_words, lookup_translation, runner
 
 
 def init_directories():
@@ -39,11 +84,14 @@ def init_directories():
 # 在应用初始化时创建目录
 DB_DIR, UPLOAD_DIR = init_directories()
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 dist = Path("dist")
 if not dist.exists():
     dist = Path(__file__).parent.parent / "dist"
 
+# 多用户模式下按请求头选择用户的数据目录（放在 CORS 之内，预检请求不需要用户标识）
+app.add_middleware(TenantMiddleware)
+
 # CORS 配置
 app.add_middleware(
     CORSMiddleware,
@@ -53,6 +101,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 较大的 JSON/NDJSON 响应按客户端支持情况使用 gzip 压缩
+app.add_middleware(CompressionMiddleware)
+
+# 记录每个路由的请求数、状态码和延迟
+app.add_middleware(MetricsMiddleware)
+# 按配置或请求头对采样的请求进行性能分析
+app.add_middleware(ProfilingMiddleware)
+
 # 挂载静态文件
 app.mount(
     "/assets",
@@ -61,7 +117,7 @@ app.mount(
 )
 
 # 添加静态文件服务
-app.mount("/covers", StaticFiles(directory=str(UPLOAD_DIR)), name="covers")
+app.mount("/covers", TenantStaticFiles(directory=str(UPLOAD_DIR)), name="covers")
 
 
 @app.get("/")
@@ -74,56 +130,24 @@ async def read_static(xxx: str):
     return FileResponse(dist / xxx)
 
 
-def init_database():
-    """初始化数据库和表"""
-    db_path = DB_DIR / "wordbook.db"
-
-    # 如果数据库文件不存在，创建数据库和表
-    if not db_path.exists():
-        conn = sqlite3.connect(str(db_path))
-        cursor = conn.cursor()
-
-        # 创建表
-        cursor.executescript(
-            """
-            CREATE TABLE IF NOT EXISTS notebooks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                cover TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-
-            CREATE TABLE IF NOT EXISTS words (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                word TEXT NOT NULL UNIQUE,
-                definition TEXT,
-                note TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-
-            CREATE TABLE IF NOT EXISTS word_entries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                word_id INTEGER,
-                notebook_id INTEGER,
-                add_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (word_id) REFERENCES words(id),
-                FOREIGN KEY (notebook_id) REFERENCES notebooks(id),
-                UNIQUE(word_id, notebook_id)
-            );
-        """
-        )
+def get_db_connection(check_same_thread: bool = True):
+    """获取数据库连接
 
-        conn.commit()
-        conn.close()
+    多用户模式下为当前用户数据库的连接（可在其他线程中使用）
 
+    Args:
+        check_same_thread: 为 False 时允许在其他线程中使用该连接（如流式响应）
+    """
+    tenant = current_tenant()
+    if tenant is not None:
+        return tenant.connect()
 
-def get_db_connection():
-    """获取数据库连接"""
     db_path = DB_DIR / "wordbook.db"
-    # 确保数据库和表已初始化
-    init_database()
-
-    conn = sqlite3.connect(str(db_path))
+    conn = sqlite3.connect(
+        str(db_path),
+        factory=InstrumentedConnection,
+        check_same_thread=check_same_thread,
+    )
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -131,7 +155,44 @@ def get_db_connection():
 # 在应用启动时初始化
 @app.on_event("startup")
 async def startup_event():
-    init_database()
+    init_db()
+    runner.start()
+    fuzzy_index.build_async()
+    start_reverse_index_sync()
+    maintenance.start()
+    if TENANT_MODE:
+        tenant_cache.start()
+
+
+def start_reverse_index_sync():
+    """在后台线程中补齐中文反查索引（当前用户的数据库）"""
+
+    def sync():
+        conn = get_db_connection(check_same_thread=False)
+        try:
+            indexed = sync_reverse_index(conn)
+            if indexed:
+                print(f"中文反查索引已补齐: {indexed} 个单词")
+        finally:
+            conn.close()
+
+    # 在当前上下文中执行，使后台线程访问同一个用户的数据库
+    context = background_context()
+    threading.Thread(
+        target=context.run, args=(sync,), name="reverse-index", daemon=True
+    ).start()
+
+
+# 多用户模式下每个用户打开时补齐其反查索引
+tenant_cache.on_open(start_reverse_index_sync)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    runner.stop()
+    maintenance.stop()
+    export_jobs.stop()
+    tenant_cache.stop()
 
 
 # 定义请求和响应模型
@@ -146,6 +207,14 @@ class WordCreate(BaseModel):
     note: Optional[str] = None
 
 
+class NotebookSetOperation(BaseModel):
+    operation: str
+    sources: List[int]
+    name: Optional[str] = None
+    target: Optional[int] = None
+    preview: bool = False
+
+
 class NotebookResponse(BaseModel):
     id: int
     name: str
@@ -159,6 +228,12 @@ class WordResponse(BaseModel):
     add_time: datetime
 
 
+# 合并并发的相同查询：同一 (word, platform) 同时只抓取/查询一次
+translate_flight = SingleFlight()
+word_flight = SingleFlight()
+audio_flight = SingleFlight()
+
+
 # 修改获取北京时间的辅助函数
 def get_beijing_time():
     """获取北京时间"""
@@ -252,6 +327,11 @@ def add_word_to_notebook(notebook_id: int, word_data: dict):
             note_with_timestamp += "\n"
         note_with_timestamp += f"Added in {notebook_name} at {current_time}\n"
 
+        # 大小写和屈折形式归并到同一个词头，记录用户输入的词形
+        surface = word
+        word = resolve_headword(conn, surface, current_fuzzy_index().in_dictionary)
+        record_form(conn, surface, word)
+
         # 检查单词是否已存在于 words 表
         cursor.execute("SELECT id FROM words WHERE word = ?", (word,))
         result = cursor.fetchone()
@@ -283,10 +363,23 @@ def add_word_to_notebook(notebook_id: int, word_data: dict):
                 (word_id, notebook_id),
             )
 
+            # 之前保存的屈折形式（如先加的 runs）并入这个词头
+            if absorb_inflections(conn, word_id, word):
+                definition, note_with_timestamp = cursor.execute(
+                    "SELECT definition, note FROM words WHERE id = ?", (word_id,)
+                ).fetchone()
+
+        # 与单词写入同一事务更新中文反查索引
+        index_word(conn, word_id, definition, note_with_timestamp)
+
         conn.commit()
         conn.close()
 
-        return {"success": True}
+        # 后台抓取释义和音标写入翻译缓存
+        enqueue_words([word])
+        current_fuzzy_index().add(word)
+
+        return {"success": True, "word": word}
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -296,11 +389,54 @@ def add_word_to_notebook(notebook_id: int, word_data: dict):
 
 
 @app.get("/api/notebooks/{notebook_id}/words")
+@profiled("get_words")
 def get_words(
-    notebook_id: int, limit: Optional[int] = None, offset: Optional[int] = None
+    notebook_id: int,
+    request: Request,
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+    stream: bool = False,
+    sort: str = "add_time",
+    order: Optional[str] = None,
+    added_from: Optional[str] = None,
+    added_to: Optional[str] = None,
+    has_note: Optional[bool] = None,
+    has_definition: Optional[bool] = None,
 ):
+    """获取词书中的单词
+
+    stream=1 或 Accept: application/x-ndjson 时以 NDJSON 流式返回，每行一个单词，
+    总数放在 X-Total-Count 响应头中
+
+    Args:
+        sort: 排序键，add_time（默认）、word 或 length
+        order: asc 或 desc，默认添加时间从新到旧，单词和长度从小到大
+        added_from: 添加时间不早于该北京时间（日期或日期时间）
+        added_to: 添加时间不晚于该北京时间，只给日期时包含当天
+        has_note: 只返回有（或没有）笔记的单词
+        has_definition: 只返回有（或没有）释义的单词
+
+    总数为符合筛选条件的单词数。各种组合都按索引顺序读取，见 listing.py。
+    """
+    try:
+        listing = WordListing(
+            notebook_id,
+            sort,
+            order,
+            added_from,
+            added_to,
+            has_note,
+            has_definition,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400, detail={"code": "INVALID_PARAMS", "message": str(e)}
+        )
+
+    # 流式响应在线程池的其他线程中读取游标
+    conn = get_db_connection(check_same_thread=False)
+
     # 检查笔记本是否存在
-    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT id FROM notebooks WHERE id = ?", (notebook_id,))
     if not cursor.fetchone():
@@ -310,38 +446,70 @@ def get_words(
             detail={"code": "NOTEBOOK_NOT_FOUND", "message": "笔记本不存在"},
         )
 
-    # 获取总数
-    cursor.execute(
-        """
-        SELECT COUNT(*) as total
-        FROM word_entries
-        WHERE notebook_id = ?
-    """,
-        (notebook_id,),
-    )
-    total = cursor.fetchone()["total"]
-
-    # 修改查询，将时间转换为北京时间
-    cursor.execute(
-        """
-        SELECT 
-            w.word,
-            w.definition,
-            w.note,
-            datetime(we.add_time, '+8 hours') as add_time
-        FROM words w
-        JOIN word_entries we ON w.id = we.word_id
-        WHERE we.notebook_id = ?
-        ORDER BY we.add_time DESC
-        LIMIT ? OFFSET ?
-    """,
-        (notebook_id, limit or -1, offset or 0),
-    )
+    # 获取符合筛选条件的总数
+    cursor.execute(*listing.count_sql())
+    total = cursor.fetchone()[0]
+
+    if stream or "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            iter_ndjson(conn, listing, limit, offset),
+            media_type="application/x-ndjson",
+            headers={
+                "X-Total-Count": str(total),
+                "Access-Control-Expose-Headers": "X-Total-Count",
+            },
+        )
 
-    words = [dict(row) for row in cursor.fetchall()]
+    cursor.execute(*listing.rows_sql(WORD_JSON, limit, offset))
+    words = json_rows(cursor)
     conn.close()
 
-    return {"words": words, "total": total}
+    return RawJSONResponse(b'{"words":%s,"total":%d}' % (words, total))
+
+
+# 单词列表每行的 JSON，时间转换为北京时间
+# 由 SQLite 直接把每行编码为 JSON 文本，省去 Python 字典和序列化的开销
+WORD_JSON = """
+    json_object(
+        'word', w.word,
+        'definition', w.definition,
+        'note', w.note,
+        'add_time', datetime(we.add_time, '+8 hours')
+    )
+"""
+# 流式响应每页读取的行数
+STREAM_BATCH_SIZE = 500
+
+
+def iter_ndjson(
+    conn, listing: WordListing, limit: Optional[int], offset: Optional[int]
+):
+    """按排序键分页读取并输出 NDJSON，读取完毕或客户端断开后关闭连接
+
+    每页读完、释放读锁之后才输出，下一页从上一页最后一行的排序键接着读。
+    客户端下载慢时不会一直持有读事务，不阻塞其他请求写入（数据库不是 WAL 模式）。
+    """
+    select = f"{WORD_JSON}, {', '.join(listing.key_columns)}"
+    remaining = limit if limit is not None and limit >= 0 else None
+    after = None
+    try:
+        while remaining is None or remaining > 0:
+            size = STREAM_BATCH_SIZE
+            if remaining is not None:
+                size = min(size, remaining)
+                remaining -= size
+            if after is None:
+                sql, params = listing.rows_sql(select, size, offset)
+            else:
+                sql, params = listing.rows_sql(select, size, after=after)
+            rows = conn.execute(sql, params).fetchall()
+            if rows:
+                yield "".join(row[0] + "\n" for row in rows)
+            if len(rows) < size:
+                break
+            after = tuple(rows[-1])[1:]
+    finally:
+        conn.close()
 
 
 @app.get("/api/words/search")
@@ -353,10 +521,57 @@ def search(keyword: str):
         )
 
     results = search_words(keyword)
+    if not results:
+        # 没有匹配时给出拼写相近的候选
+        return {"words": results, "suggestions": current_fuzzy_index().suggest(keyword)}
     return {"words": results}
 
 
+@app.get("/api/words/suggest")
+def suggest(word: str):
+    """返回编辑距离 1~2 以内的候选单词"""
+    if not word:
+        raise HTTPException(
+            status_code=400,
+            detail={"code": "INVALID_PARAMS", "message": "单词不能为空"},
+        )
+
+    return {
+        "word": word,
+        "exists": current_fuzzy_index().contains(word),
+        "suggestions": current_fuzzy_index().suggest(word),
+    }
+
+
+@app.get("/api/words/reverse")
+def reverse_search(q: str, limit: int = 20):
+    """按中文释义或笔记反查英文单词
+
+    Args:
+        q: 中文查询词，如“坚持”
+        limit: 最多返回的单词数
+    """
+    if not q.strip():
+        raise HTTPException(
+            status_code=400,
+            detail={"code": "INVALID_PARAMS", "message": "搜索关键词不能为空"},
+        )
+
+    try:
+        conn = get_db_connection()
+        try:
+            words = reverse_lookup(conn, q, max(1, min(limit, 100)))
+        finally:
+            conn.close()
+        return {"words": words}
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail={"code": "DATABASE_ERROR", "message": str(e)}
+        )
+
+
 @app.get("/api/translate")
+@profiled("translate")
 def translate(word: str, platform: str = "youdao"):
     """翻译接口
 
@@ -374,7 +589,24 @@ def translate(word: str, platform: str = "youdao"):
         if platform not in ["youdao", "bing"]:
             platform = "youdao"
 
-        result = search_word(word, platform)
+        # 本地词典未收录且有相近候选时，直接返回候选而不请求上游
+        suggestions = current_fuzzy_index().check(word)
+        if suggestions:
+            raise HTTPException(
+                status_code=404,
+                detail={
+                    "code": "WORD_NOT_FOUND",
+                    "message": "单词不存在，你是不是要找",
+                    "suggestions": suggestions,
+                },
+            )
+
+        result = translate_flight.do(
+            (current_tenant_id(), fold(word), platform),
+            lookup_translation,
+            word,
+            platform,
+        )
 
         # 构建包含发音的翻译文本
         translation_text = f"英 [{result['uk_pronoun']}]  美 [{result['us_pronoun']}]\n\n{result['mean_zh']}"
@@ -385,32 +617,316 @@ def translate(word: str, platform: str = "youdao"):
             "uk_pronoun": result["uk_pronoun"],
             "us_pronoun": result["us_pronoun"],
         }
+    except HTTPException as he:
+        raise he
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503, detail={"code": "UPSTREAM_BUSY", "message": str(e)}
+        )
     except Exception as e:
         raise HTTPException(
-            status_code=500, detail={"code": "SEARCH_ERROR", "message": str(e)}
+            status_code=500,
+            detail={
+                "code": "SEARCH_ERROR",
+                "message": str(e),
+                "suggestions": current_fuzzy_index().suggest(word),
+            },
         )
 
 
-@app.get("/api/words/{word}")
-def get_word(word: str):
-    """获取单词信息
+@app.get("/api/audio/{word}")
+def get_audio(word: str, request: Request, accent: str = "us"):
+    """单词发音，首次请求时从上游抓取并缓存
+
+    Args:
+        word: 单词
+        accent: 口音，uk（英音）或 us（美音）
+    """
+    if not word.strip() or accent not in ACCENTS:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "code": "INVALID_PARAMS",
+                "message": "单词不能为空，口音为 uk 或 us",
+            },
+        )
+
+    try:
+        clip = audio_flight.do(
+            (current_tenant_id(), fold(word), accent), fetch_audio, word, accent
+        )
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503, detail={"code": "UPSTREAM_BUSY", "message": str(e)}
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=502,
+            detail={"code": "AUDIO_UNAVAILABLE", "message": f"获取发音失败: {e}"},
+        )
+
+    # 文件按内容哈希保存，哈希即为强 ETag；Range 请求由 FileResponse 处理
+    sha256 = clip["sha256"]
+    etag = f'"{sha256}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(clip["path"], media_type=clip["content_type"], headers=headers)
+
+
+@app.post("/api/notebooks/{notebook_id}/audio/prefetch")
+def prefetch_notebook_audio(notebook_id: int, accent: Optional[str] = None):
+    """在后台预取词书中所有单词的发音
+
+    Args:
+        notebook_id: 词书ID
+        accent: 只预取一种口音（uk 或 us），默认两种都预取
+    """
+    if accent is not None and accent not in ACCENTS:
+        raise HTTPException(
+            status_code=400,
+            detail={"code": "INVALID_PARAMS", "message": "口音为 uk 或 us"},
+        )
+
+    conn = get_db_connection()
+    try:
+        if not conn.execute(
+            "SELECT 1 FROM notebooks WHERE id = ?", (notebook_id,)
+        ).fetchone():
+            raise HTTPException(
+                status_code=404,
+                detail={"code": "NOTEBOOK_NOT_FOUND", "message": "词书不存在"},
+            )
+        words = [
+            row[0]
+            for row in conn.execute(
+                """
+                SELECT w.word FROM words w
+                JOIN word_entries we ON w.id = we.word_id
+                WHERE we.notebook_id = ?
+                """,
+                (notebook_id,),
+            )
+        ]
+    finally:
+        conn.close()
+
+    accents = [accent] if accent else list(ACCENTS)
+    queued = enqueue_words(words, [f"audio-{a}" for a in accents])
+    return {"success": True, "words": len(words), "queued": queued}
+
+
+def lookup_word(word: str):
+    """从数据库中查询单词的定义和笔记，大小写和屈折形式解析为已保存的词头"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    headword = resolve_headword(conn, word, current_fuzzy_index().in_dictionary)
+    cursor.execute("SELECT definition, note FROM words WHERE word = ?", (headword,))
+    result = cursor.fetchone()
+    conn.close()
 
-    如果单词存在于数据库中，返回其定义和笔记
+    if result:
+        return {
+            "exists": True,
+            "word": headword,
+            "definition": result["definition"],
+            "note": result["note"],
+        }
+    return {"exists": False}
+
+
+@app.get("/api/notebooks/{notebook_id}/quiz")
+def get_quiz(notebook_id: int, count: int = 10, choices: int = 4):
+    """从词书中随机抽题生成选择题
+
+    Args:
+        notebook_id: 词书 ID
+        count: 题目数
+        choices: 每题的选项数（含正确答案）
     """
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT definition, note FROM words WHERE word = ?", (word,))
-        result = cursor.fetchone()
+        cursor.execute("SELECT id FROM notebooks WHERE id = ?", (notebook_id,))
+        if not cursor.fetchone():
+            conn.close()
+            raise HTTPException(
+                status_code=404,
+                detail={"code": "NOTEBOOK_NOT_FOUND", "message": "词书不存在"},
+            )
+
+        questions = build_quiz(
+            conn, notebook_id, max(1, min(count, 100)), max(2, min(choices, 8))
+        )
         conn.close()
+        return {"questions": questions}
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail={"code": "DATABASE_ERROR", "message": str(e)}
+        )
 
-        if result:
-            return {
-                "exists": True,
-                "definition": result["definition"],
-                "note": result["note"],
-            }
-        return {"exists": False}
+
+@app.get("/api/review/next")
+def get_next_review(notebook_id: Optional[int] = None, limit: int = 20):
+    """获取下一批到期需要复习的单词
+
+    Args:
+        notebook_id: 词书 ID，不传时从所有词书中选取
+        limit: 最多返回的单词数
+    """
+    try:
+        conn = get_db_connection()
+        words = next_due(conn, notebook_id, max(1, min(limit, 200)))
+        result = {"words": words}
+        if not words:
+            result["next_due_at"] = next_due_at(conn, notebook_id)
+        conn.close()
+        return result
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail={"code": "DATABASE_ERROR", "message": str(e)}
+        )
+
+
+@app.post("/api/review/grade")
+def grade_review(grade_data: dict):
+    """记录复习结果并安排下次复习时间
+
+    请求体: {"notebookId": 1, "word": "hello", "grade": 4}，grade 为 0~5
+    """
+    try:
+        notebook_id = grade_data.get("notebookId")
+        word = grade_data.get("word")
+        grade = grade_data.get("grade")
+
+        if not all([notebook_id, word]) or grade not in range(0, 6):
+            raise HTTPException(
+                status_code=400,
+                detail={"code": "INVALID_PARAMS", "message": "缺少必要参数"},
+            )
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM words WHERE word = ?", (word,))
+        word_result = cursor.fetchone()
+        state = word_result and grade_word(conn, word_result["id"], notebook_id, grade)
+        if not state:
+            conn.close()
+            raise HTTPException(
+                status_code=404,
+                detail={"code": "WORD_NOT_FOUND", "message": "单词不在该词书中"},
+            )
+
+        conn.commit()
+        conn.close()
+        return {"success": True, "review": state}
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail={"code": "DATABASE_ERROR", "message": str(e)}
+        )
+
+
+@app.get("/api/upstream/stats")
+def upstream_stats():
+    """上游请求调度器的队列深度和等待时间统计，以及预热队列的任务数"""
+    return {"providers": scheduler.stats(), "warmup": runner.stats()}
+
+
+def collect_upstream_metrics():
+    """将上游调度器的统计输出为 Prometheus 指标"""
+    lines = []
+    fields = [
+        ("queue_depth", "gauge", "上游请求队列深度"),
+        ("requests", "counter", "上游请求数（含重试）"),
+        ("retries", "counter", "上游请求重试次数"),
+        ("rejected", "counter", "队列已满被拒绝的上游请求数"),
+        ("wait_seconds_total", "counter", "上游请求排队等待总耗时"),
+    ]
+    stats = scheduler.stats()
+    for field, metric_type, help_text in fields:
+        name = f"wordbook_upstream_{field}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for provider, provider_stats in stats.items():
+            lines.append(f'{name}{{provider="{provider}"}} {provider_stats[field]}')
+    return lines
+
+
+registry.add_collector(collect_upstream_metrics)
+
+
+def collect_tenant_metrics():
+    """多用户模式下打开的用户数和连接数"""
+    if not TENANT_MODE:
+        return []
+    stats = tenant_cache.stats()
+    lines = []
+    fields = [
+        ("open_tenants", "gauge", "当前打开的用户数"),
+        ("idle_connections", "gauge", "用户数据库的空闲连接数"),
+        ("busy_connections", "gauge", "用户数据库使用中的连接数"),
+        ("opened_total", "counter", "打开用户的累计次数"),
+        ("evicted_total", "counter", "逐出用户的累计次数"),
+    ]
+    for field, metric_type, help_text in fields:
+        name = f"wordbook_tenant_{field}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.append(f"{name} {stats[field]}")
+    return lines
+
+
+registry.add_collector(collect_tenant_metrics)
+
+
+@app.get("/api/metrics")
+def get_metrics():
+    """Prometheus 文本格式的运行指标"""
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/api/admin/maintenance")
+def maintenance_status():
+    """后台维护任务的间隔、最近一次执行的耗时和回收的空间"""
+    try:
+        return maintenance.report()
+    except sqlite3.Error as e:
+        raise HTTPException(
+            status_code=500, detail={"code": "DATABASE_ERROR", "message": str(e)}
+        )
+
+
+@app.post("/api/admin/maintenance/{task}")
+def run_maintenance(task: str):
+    """立即执行一个维护任务，返回执行结果"""
+    if task not in TASKS:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "code": "TASK_NOT_FOUND",
+                "message": f"未知的维护任务: {task}，可选: {', '.join(TASKS)}",
+            },
+        )
+    return maintenance.run_task(task)
+
+
+@app.get("/api/words/{word}")
+def get_word(word: str):
+    """获取单词信息
+
+    如果单词（或其大小写、屈折变体）存在于数据库中，返回其词头、定义和笔记
+    """
+    try:
+        return word_flight.do(
+            (current_tenant_id(), fold(word), "db"), lookup_word, word
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500, detail={"code": "DATABASE_ERROR", "message": str(e)}
@@ -611,6 +1127,69 @@ def copy_notebook(notebook_id: int):
         )
 
 
+@app.post("/api/notebooks/combine")
+def combine_notebook_sets(request: NotebookSetOperation):
+    """词书的并集、交集、差集，结果写入新词书或已有词书"""
+    if request.operation not in SET_OPERATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "code": "INVALID_PARAMS",
+                "message": f"operation 应为 {'、'.join(SET_OPERATIONS)} 之一",
+            },
+        )
+    if len(set(request.sources)) < 2:
+        raise HTTPException(
+            status_code=400,
+            detail={"code": "INVALID_PARAMS", "message": "至少需要两本不同的词书"},
+        )
+    if request.target is not None and request.name:
+        raise HTTPException(
+            status_code=400,
+            detail={"code": "INVALID_PARAMS", "message": "name 和 target 不能同时指定"},
+        )
+
+    conn = get_db_connection()
+    try:
+        notebook_ids = request.sources + (
+            [request.target] if request.target is not None else []
+        )
+        missing = missing_notebooks(conn, notebook_ids)
+        if missing:
+            raise HTTPException(
+                status_code=404,
+                detail={
+                    "code": "NOTEBOOK_NOT_FOUND",
+                    "message": f"词书不存在: {', '.join(map(str, missing))}",
+                },
+            )
+        result = combine_notebooks(
+            conn,
+            request.operation,
+            request.sources,
+            target_id=request.target,
+            name=request.name,
+            preview=request.preview,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"词书集合运算失败: {e}")
+        raise HTTPException(
+            status_code=500, detail={"code": "DATABASE_ERROR", "message": str(e)}
+        )
+    finally:
+        conn.close()
+
+    if request.preview:
+        return {"success": True, "preview": True, **result}
+    return {
+        "success": True,
+        "notebook": {"id": result["notebook_id"], "name": result["name"]},
+        "added": result["added"],
+    }
+
+
 @app.put("/api/notebooks/{notebook_id}")
 def rename_notebook(notebook_id: int, notebook_data: dict):
     """重命名词书"""
@@ -704,7 +1283,7 @@ async def upload_cover(file: UploadFile = File(...)):
             )
 
         new_filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}.{file_extension}"
-        file_path = UPLOAD_DIR / new_filename
+        file_path = covers_dir() / new_filename
 
         try:
             # 读取文件内容
@@ -734,47 +1313,54 @@ async def upload_cover(file: UploadFile = File(...)):
         )
 
 
-# 修改导出功能，导出整个 .wordbook 目录的压缩包
-@app.get("/api/export-db")
-async def export_database():
-    """导出整个 .wordbook 目录为 zip 文件"""
-    try:
-        # 创建临时目录用于存放 zip 文件
-        with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as temp_zip:
-            # 创建 zip 文件
-            with zipfile.ZipFile(temp_zip.name, "w", zipfile.ZIP_DEFLATED) as zf:
-                # 添加数据库文件
-                db_path = DB_DIR / "wordbook.db"
-                if db_path.exists():
-                    zf.write(db_path, "wordbook.db")
-
-                # 添加封面目录
-                covers_dir = DB_DIR / "covers"
-                if covers_dir.exists():
-                    for cover_file in covers_dir.glob("*"):
-                        if cover_file.is_file():
-                            zf.write(cover_file, f"covers/{cover_file.name}")
-
-            # 生成导出文件名
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            filename = f"wordbook_backup_{timestamp}.zip"
-
-            # 设置响应头
-            headers = {
-                "Content-Disposition": f"attachment; filename={filename}",
-                "Access-Control-Expose-Headers": "Content-Disposition",
-            }
-
-            return FileResponse(
-                path=temp_zip.name,
-                filename=filename,
-                media_type="application/zip",
-                headers=headers,
-                background=BackgroundTask(
-                    lambda: Path(temp_zip.name).unlink(missing_ok=True)
-                ),
-            )
+def export_artifact_response(job: ExportJob) -> FileResponse:
+    """返回导出任务生成的文件
 
+    FileResponse 处理 Range / If-Range 请求，中断的下载可以续传；
+    非 ASCII 文件名按 RFC 5987 写入 filename*。
+    """
+    if job.status == "failed":
+        raise HTTPException(
+            status_code=500,
+            detail={"code": "EXPORT_ERROR", "message": f"导出失败: {job.error}"},
+        )
+    if job.status != "done":
+        raise HTTPException(
+            status_code=409,
+            detail={"code": "EXPORT_NOT_READY", "message": "导出尚未完成"},
+        )
+    if not job.artifact.exists():
+        raise HTTPException(
+            status_code=410,
+            detail={"code": "EXPORT_EXPIRED", "message": "导出文件已过期，请重新导出"},
+        )
+    return FileResponse(
+        path=job.artifact,
+        filename=job.filename,
+        media_type=job.media_type,
+        headers={"Access-Control-Expose-Headers": "Content-Disposition"},
+    )
+
+
+def wait_for_export(job: ExportJob):
+    """旧的 GET 导出接口：EXPORT_WAIT_SECONDS 内完成时直接返回文件
+
+    否则返回 202 和任务信息（与 POST 提交相同），客户端轮询
+    /api/exports/{job_id} 后从 download_url 下载，不会一直占着工作线程、
+    超过代理的超时时间。
+    """
+    if job.done.wait(EXPORT_WAIT_SECONDS):
+        return export_artifact_response(job)
+    return ORJSONResponse(
+        job.to_dict(),
+        status_code=202,
+        headers={"Location": f"/api/exports/{job.id}"},
+    )
+
+
+def start_database_export() -> ExportJob:
+    try:
+        return export_jobs.start_database()
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -782,8 +1368,54 @@ async def export_database():
         )
 
 
+def start_notebook_export(notebook_id: int) -> ExportJob:
+    job = export_jobs.start_notebook(notebook_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404, detail={"code": "NOT_FOUND", "message": "词书不存在"}
+        )
+    return job
+
+
+@app.get("/api/export-db")
+def export_database():
+    """导出整个 .wordbook 目录为 zip 文件，很快完成时直接返回，否则返回 202"""
+    return wait_for_export(start_database_export())
+
+
+@app.post("/api/export-db", status_code=202)
+def submit_database_export():
+    """提交数据库导出任务，立即返回任务信息"""
+    return start_database_export().to_dict()
+
+
+@app.get("/api/exports/{job_id}")
+def get_export_job(job_id: str):
+    """查询导出任务的进度"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail={"code": "EXPORT_NOT_FOUND", "message": "导出任务不存在"},
+        )
+    return job.to_dict()
+
+
+@app.get("/api/exports/{job_id}/download")
+def download_export(job_id: str):
+    """下载导出任务生成的文件，支持 Range 断点续传"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail={"code": "EXPORT_NOT_FOUND", "message": "导出任务不存在"},
+        )
+    return export_artifact_response(job)
+
+
 # 修改导入功能，支持导入 zip 文件
 @app.post("/api/import")
+@profiled("import_database")
 async def import_database(file: UploadFile = File(...)):
     """导入 wordbook 备份 zip 文件"""
     try:
@@ -832,9 +1464,10 @@ async def import_database(file: UploadFile = File(...)):
                     """
                     )
                     tables = cursor.fetchall()
-                    conn.close()
+                    version = schema_version(conn)
 
                     if len(tables) != 3:
+                        conn.close()
                         raise HTTPException(
                             status_code=400,
                             detail={
@@ -842,25 +1475,63 @@ async def import_database(file: UploadFile = File(...)):
                                 "message": "无效的数据库文件",
                             },
                         )
+                    if version > LATEST_VERSION:
+                        conn.close()
+                        raise HTTPException(
+                            status_code=400,
+                            detail={
+                                "code": "INVALID_DATABASE",
+                                "message": "备份文件来自更新版本的程序，请先升级",
+                            },
+                        )
+
+                    # 在替换前把导入的数据库迁移到最新结构，迁移失败时不影响当前数据
+                    migrate(conn)
+                    conn.close()
+
+                    # 导入后数据版本需大于当前版本，使依赖旧数据的缓存失效
+                    conn = get_db_connection()
+                    current_version = get_data_version(conn)
+                    conn.close()
 
                     # 备份当前数据
-                    if DB_DIR.exists():
+                    target_dir = data_dir()
+                    if target_dir.exists():
                         backup_dir = (
-                            DB_DIR.parent
+                            backups_dir()
                             / f"wordbook_backup_{datetime.now().strftime('%Y%m%d%H%M%S')}"
                         )
-                        shutil.copytree(DB_DIR, backup_dir)
-
-                    # 替换数据库和封面文件
-                    shutil.copy2(db_path, DB_DIR / "wordbook.db")
+                        # 导出文件可以重新生成，不备份
+                        shutil.copytree(
+                            target_dir,
+                            backup_dir,
+                            ignore=shutil.ignore_patterns("exports"),
+                        )
 
-                    # 更新封面目录
-                    covers_dir = temp_dir_path / "covers"
-                    if covers_dir.exists():
-                        target_covers_dir = DB_DIR / "covers"
-                        if target_covers_dir.exists():
-                            shutil.rmtree(target_covers_dir)
-                        shutil.copytree(covers_dir, target_covers_dir)
+                    # 先复制到同目录的临时文件，再整体替换，其他连接不会读到写了一半的文件
+                    importing_path = target_dir / "wordbook.db.importing"
+                    shutil.copy2(db_path, importing_path)
+
+                    # 多用户模式下替换前关闭该用户缓存的连接（等待后台线程归还），
+                    # 丢弃基于旧数据的缓存；替换完成前该用户的其他请求等待，
+                    # 不会重新打开旧文件
+                    with tenant_cache.replacing(current_tenant_id(), timeout=10):
+                        # 替换数据库和封面文件
+                        os.replace(importing_path, target_dir / "wordbook.db")
+
+                        # 更新封面目录
+                        covers_dir = temp_dir_path / "covers"
+                        if covers_dir.exists():
+                            target_covers_dir = target_dir / "covers"
+                            if target_covers_dir.exists():
+                                shutil.rmtree(target_covers_dir)
+                            shutil.copytree(covers_dir, target_covers_dir)
+
+                    # 导入的数据库可能只有过期的反查索引，在后台补齐
+                    conn = get_db_connection()
+                    bump_data_version(conn, current_version)
+                    conn.close()
+                    start_reverse_index_sync()
 
                     return {"success": True, "message": "数据库导入成功"}
 
@@ -880,69 +1551,89 @@ async def import_database(file: UploadFile = File(...)):
 
 
 @app.get("/api/notebooks/{notebook_id}/export")
+@profiled("export_notebook")
 def export_notebook(notebook_id: int):
-    """导出词书为 Excel 文件"""
-    try:
-        # 获取词书信息
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    """导出词书为 Excel 文件，很快完成时直接返回，否则返回 202"""
+    return wait_for_export(start_notebook_export(notebook_id))
 
-        # 获取词书名称
-        cursor.execute("SELECT name FROM notebooks WHERE id = ?", (notebook_id,))
-        notebook = cursor.fetchone()
-        if not notebook:
-            raise HTTPException(
-                status_code=404, detail={"code": "NOT_FOUND", "message": "词书不存在"}
-            )
 
-        notebook_name = notebook["name"]
+@app.post("/api/notebooks/{notebook_id}/export", status_code=202)
+def submit_notebook_export(notebook_id: int):
+    """提交词书导出任务，立即返回任务信息"""
+    return start_notebook_export(notebook_id).to_dict()
 
-        # 获取词书中的单词
-        cursor.execute(
-            """
-            SELECT w.word, w.definition, w.note, we.add_time
-            FROM words w
-            JOIN word_entries we ON w.id = we.word_id
-            WHERE we.notebook_id = ?
-            ORDER BY we.add_time DESC
-        """,
-            (notebook_id,),
-        )
 
-        words = cursor.fetchall()
-        conn.close()
+@app.post("/api/notebooks/{notebook_id}/import")
+@profiled("import_notebook")
+def import_notebook(notebook_id: int, file: UploadFile = File(...)):
+    """从 Excel / CSV 导入单词到词书，列与导出的 Excel 相同
 
-        # 创建 DataFrame
-        df = pd.DataFrame(words, columns=["单词", "释义", "笔记", "添加时间"])
-
-        # 格式化时间列
-        df["添加时间"] = pd.to_datetime(df["添加时间"]).dt.strftime("%Y-%m-%d %H:%M:%S")
-
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as temp_file:
-            # 将数据写入 Excel 文件
-            df.to_excel(temp_file.name, index=False, engine="openpyxl")
-
-            # 生成文件名
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            filename = f"{notebook_name}_{timestamp}.xlsx"
-
-            # 设置响应头
-            headers = {
-                "Content-Disposition": f'attachment; filename="{filename}"',
-                "Access-Control-Expose-Headers": "Content-Disposition",
-            }
-
-            # 返回文件
-            return FileResponse(
-                path=temp_file.name,
-                filename=filename,
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                headers=headers,
+    上传文件超过 1 MiB 时由 Starlette 暂存到磁盘，逐行解析、分批提交，
+    内存占用与文件行数无关。
+    """
+    fmt = detect_format(file.filename or "")
+    if fmt is None:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "code": "INVALID_FILE_TYPE",
+                "message": "请上传 .xlsx、.csv 或 .ndjson 文件",
+            },
+        )
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute("SELECT 1 FROM notebooks WHERE id = ?", (notebook_id,))
+        if cursor.fetchone() is None:
+            raise HTTPException(
+                status_code=404,
+                detail={"code": "NOTEBOOK_NOT_FOUND", "message": "词书不存在"},
             )
 
+        fuzzy = current_fuzzy_index()
+
+        def on_batch(report, words):
+            # 与逐个添加单词一样加入翻译预热队列和拼写纠错索引，
+            # 预热按折叠后的词头入队，与查询时的缓存键一致
+            if words:
+                enqueue_words(sorted({fold(word) for word in words}))
+                for word in words:
+                    fuzzy.add(word)
+
+        report = import_rows(
+            conn,
+            notebook_id,
+            read_rows(file.file, fmt),
+            is_known=fuzzy.in_dictionary,
+            on_batch=on_batch,
+        )
+    except HTTPException:
+        raise
     except Exception as e:
+        print(f"导入词书失败: {e}")
         raise HTTPException(
-            status_code=500,
-            detail={"code": "EXPORT_ERROR", "message": f"导出失败: {str(e)}"},
+            status_code=500, detail={"code": "DATABASE_ERROR", "message": str(e)}
+        )
+    finally:
+        conn.close()
+
+    print(
+        f"导入词书 {notebook_id}: {report['rows']} 行，新增 {report['added']}，"
+        f"出错 {report['error_count']}"
+    )
+    if report["aborted"] is not None:
+        if not report["rows"]:
+            raise HTTPException(
+                status_code=400,
+                detail={"code": "INVALID_FILE", "message": report["aborted"]},
+            )
+        # 中止之前的行已经提交，连同统计一起返回，客户端知道导入了哪些行
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "code": "IMPORT_INCOMPLETE",
+                "message": f"{report['aborted']}，已导入前 {report['rows']} 行",
+                "report": report,
+            },
         )
+    return {"success": True, **report}
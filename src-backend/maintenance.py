@@ -0,0 +1,470 @@
+"""后台数据库维护
+
+在后台线程中按配置的间隔执行维护任务，不占用请求路径：
+
+- orphans: 删除不在任何词书中的单词（及其反查索引、词形记录）
+- analyze: ANALYZE（受 analysis_limit 限制）和 PRAGMA optimize
+- vacuum: 回收空闲页。首次运行时切换为 auto_vacuum=INCREMENTAL 并整体 VACUUM，
+  之后每次用 incremental_vacuum 分步回收，每步只短暂持有写锁
+- checkpoint: WAL 模式下执行被动检查点（不阻塞读写）
+- covers: 删除没有被任何词书引用的封面文件
+- backups: 只保留最近几份导入时生成的 wordbook_backup_* 目录
+
+每次执行的耗时、回收的空间记录在 maintenance_log 表中，
+通过 /api/admin/maintenance 查看。多用户模式下各用户的数据库分别维护，
+见 MaintenanceScheduler.run_due_tenants。
+"""
+
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from db import get_db_connection
+from tenants import backups_dir, covers_dir, data_dir, tenant_cache, use_tenant
+
+MAINTENANCE_ENABLED = os.environ.get("WORDBOOK_MAINTENANCE", "1") != "0"
+
+# 各任务的默认执行间隔（秒），可通过 WORDBOOK_MAINTENANCE_INTERVALS 覆盖，
+# 格式如 "vacuum=604800,covers=3600"，设为 0 表示不自动执行
+DEFAULT_INTERVALS = {
+    "orphans": 24 * 3600,
+    "analyze": 24 * 3600,
+    "vacuum": 7 * 24 * 3600,
+    "checkpoint": 3600,
+    "covers": 24 * 3600,
+    "backups": 24 * 3600,
+}
+
+# 每批删除的孤立单词数，以及批次之间的间隔（秒），限制单次持有写锁的时间
+ORPHAN_BATCH_SIZE = 500
+BATCH_PAUSE = 0.05
+# incremental_vacuum 每步回收的页数，以及单次 vacuum 任务的总时长上限（秒）
+VACUUM_STEP_PAGES = 256
+VACUUM_TIME_BUDGET = float(os.environ.get("WORDBOOK_VACUUM_TIME_BUDGET", "5"))
+# 空闲页占比超过该值时才执行首次整体 VACUUM
+VACUUM_MIN_FREE_RATIO = 0.1
+# ANALYZE 每个索引最多检查的行数
+ANALYSIS_LIMIT = 1000
+# 刚上传、尚未设置为封面的文件在该时间（秒）内不会被删除
+COVER_GRACE_SECONDS = 24 * 3600
+KEEP_BACKUPS = int(os.environ.get("WORDBOOK_KEEP_BACKUPS", "3"))
+# 维护连接等待锁的时间（毫秒），拿不到锁时放弃本批，下次再试
+BUSY_TIMEOUT_MS = 200
+TICK_SECONDS = 60
+
+# 数据库中保存 UTC 时间，接口返回北京时间
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _load_intervals() -> Dict[str, int]:
+    intervals = dict(DEFAULT_INTERVALS)
+    for item in os.environ.get("WORDBOOK_MAINTENANCE_INTERVALS", "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() in intervals and value.strip().isdigit():
+            intervals[name.strip()] = int(value)
+    return intervals
+
+
+def init_maintenance_tables(conn):
+    """创建维护记录表"""
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS maintenance_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task TEXT NOT NULL,
+            started_at TIMESTAMP NOT NULL,
+            duration_ms REAL NOT NULL,
+            reclaimed_bytes INTEGER NOT NULL DEFAULT 0,
+            detail TEXT,
+            error TEXT
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_maintenance_log_task
+            ON maintenance_log(task, id);
+        """
+    )
+    conn.commit()
+
+
+def _connect():
+    conn = get_db_connection()
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def _close(conn):
+    # 多用户模式下连接会被复用，恢复默认的锁等待时间（sqlite3.connect 的 5 秒）
+    conn.execute("PRAGMA busy_timeout = 5000")
+    conn.close()
+
+
+def _db_bytes(conn) -> int:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return conn.execute("PRAGMA page_count").fetchone()[0] * page_size
+
+
+def _dir_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def clean_orphans() -> Dict:
+    """分批删除不在任何词书中的单词"""
+    conn = _connect()
+    try:
+        deleted = 0
+        last_id = 0
+        while True:
+            ids = [
+                row[0]
+                for row in conn.execute(
+                    """
+                    SELECT id FROM words w
+                    WHERE id > ? AND NOT EXISTS (
+                        SELECT 1 FROM word_entries we WHERE we.word_id = w.id
+                    )
+                    ORDER BY id
+                    LIMIT ?
+                    """,
+                    (last_id, ORPHAN_BATCH_SIZE),
+                )
+            ]
+            if not ids:
+                break
+            last_id = ids[-1]
+            placeholders = ",".join("?" * len(ids))
+            # 查询和删除之间单词可能被重新加入词书，删除时再检查一次
+            conn.execute(
+                f"""
+                DELETE FROM words
+                WHERE id IN ({placeholders}) AND NOT EXISTS (
+                    SELECT 1 FROM word_entries we WHERE we.word_id = words.id
+                )
+                """,
+                ids,
+            )
+            deleted += conn.execute("SELECT changes()").fetchone()[0]
+            conn.execute(
+                f"""
+                DELETE FROM word_index
+                WHERE rowid IN ({placeholders})
+                AND rowid NOT IN (SELECT id FROM words WHERE id IN ({placeholders}))
+                """,
+                ids + ids,
+            )
+            conn.commit()
+            time.sleep(BATCH_PAUSE)
+
+        if deleted:
+            conn.execute(
+                "DELETE FROM word_forms WHERE headword NOT IN (SELECT word FROM words)"
+            )
+            conn.commit()
+        return {"reclaimed_bytes": 0, "detail": f"删除 {deleted} 个孤立单词"}
+    finally:
+        _close(conn)
+
+
+def analyze() -> Dict:
+    """更新查询规划器的统计信息"""
+    conn = _connect()
+    try:
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+        conn.commit()
+        return {"reclaimed_bytes": 0, "detail": "ANALYZE + PRAGMA optimize"}
+    finally:
+        _close(conn)
+
+
+def vacuum() -> Dict:
+    """回收空闲页
+
+    auto_vacuum 不是 INCREMENTAL 时，空闲页足够多才整体 VACUUM 一次并切换模式；
+    之后分步 incremental_vacuum，每步之间释放锁，总时长不超过 VACUUM_TIME_BUDGET。
+    """
+    conn = _connect()
+    try:
+        before = _db_bytes(conn)
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+        if auto_vacuum != 2:
+            if not page_count or free_pages / page_count < VACUUM_MIN_FREE_RATIO:
+                return {
+                    "reclaimed_bytes": 0,
+                    "detail": f"空闲页 {free_pages}/{page_count}，无需整体 VACUUM",
+                }
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            return {
+                "reclaimed_bytes": before - _db_bytes(conn),
+                "detail": "整体 VACUUM 并切换为 auto_vacuum=INCREMENTAL",
+            }
+
+        deadline = time.monotonic() + VACUUM_TIME_BUDGET
+        steps = 0
+        while free_pages and time.monotonic() < deadline:
+            # execute() 只步进一次，只回收一页；executescript 会执行到结束
+            conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})")
+            steps += 1
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            time.sleep(BATCH_PAUSE)
+        return {
+            "reclaimed_bytes": before - _db_bytes(conn),
+            "detail": f"incremental_vacuum {steps} 步，剩余空闲页 {free_pages}",
+        }
+    finally:
+        _close(conn)
+
+
+def checkpoint() -> Dict:
+    """WAL 模式下执行被动检查点"""
+    conn = _connect()
+    try:
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        if mode != "wal":
+            return {"reclaimed_bytes": 0, "detail": f"journal_mode={mode}，跳过"}
+        wal_path = data_dir() / "wordbook.db-wal"
+        before = wal_path.stat().st_size if wal_path.exists() else 0
+        busy, frames, done = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        after = wal_path.stat().st_size if wal_path.exists() else 0
+        return {
+            "reclaimed_bytes": before - after,
+            "detail": f"检查点 {done}/{frames} 帧" + ("（有读写占用）" if busy else ""),
+        }
+    finally:
+        _close(conn)
+
+
+def clean_covers() -> Dict:
+    """删除没有被任何词书引用、且超过宽限期的封面文件"""
+    directory = covers_dir()
+    if not directory.exists():
+        return {"reclaimed_bytes": 0, "detail": "没有封面目录"}
+
+    conn = _connect()
+    try:
+        referenced = {
+            os.path.basename(row[0])
+            for row in conn.execute(
+                "SELECT cover FROM notebooks WHERE cover IS NOT NULL AND cover != ''"
+            )
+        }
+    finally:
+        _close(conn)
+
+    reclaimed = 0
+    removed = 0
+    cutoff = time.time() - COVER_GRACE_SECONDS
+    for path in directory.iterdir():
+        if not path.is_file() or path.name in referenced:
+            continue
+        stat = path.stat()
+        if stat.st_mtime > cutoff:
+            continue
+        path.unlink()
+        reclaimed += stat.st_size
+        removed += 1
+    return {"reclaimed_bytes": reclaimed, "detail": f"删除 {removed} 个未引用的封面"}
+
+
+def clean_backups() -> Dict:
+    """只保留最近 KEEP_BACKUPS 份导入前的备份目录"""
+    backups = sorted(backups_dir().glob("wordbook_backup_*"), key=lambda p: p.name)
+    expired = backups[: max(0, len(backups) - KEEP_BACKUPS)]
+
+    reclaimed = 0
+    for path in expired:
+        reclaimed += _dir_bytes(path)
+        shutil.rmtree(path, ignore_errors=True)
+    return {
+        "reclaimed_bytes": reclaimed,
+        "detail": f"删除 {len(expired)} 个旧备份，保留 {len(backups) - len(expired)} 个",
+    }
+
+
+TASKS: Dict[str, Callable[[], Dict]] = {
+    "orphans": clean_orphans,
+    "analyze": analyze,
+    "vacuum": vacuum,
+    "checkpoint": checkpoint,
+    "covers": clean_covers,
+    "backups": clean_backups,
+}
+
+
+class MaintenanceScheduler:
+    """按间隔依次执行维护任务的后台线程，同一时间只执行一个任务"""
+
+    def __init__(self):
+        self.intervals = _load_intervals()
+        self.running: Optional[str] = None
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not MAINTENANCE_ENABLED or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop, name="maintenance", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _last_run(self, conn, task: str) -> Optional[datetime]:
+        row = conn.execute(
+            """
+            SELECT started_at FROM maintenance_log
+            WHERE task = ? ORDER BY id DESC LIMIT 1
+            """,
+            (task,),
+        ).fetchone()
+        if row is None:
+            return None
+        return datetime.strptime(row[0], TIME_FORMAT)
+
+    def due_tasks(self):
+        """到期需要执行的任务"""
+        conn = get_db_connection()
+        try:
+            now = datetime.utcnow()
+            due = []
+            for task, interval in self.intervals.items():
+                if interval <= 0:
+                    continue
+                last = self._last_run(conn, task)
+                if last is None or (now - last).total_seconds() >= interval:
+                    due.append(task)
+            return due
+        finally:
+            conn.close()
+
+    def run_task(self, task: str) -> Dict:
+        """执行单个任务并记录结果"""
+        with self._run_lock:
+            self.running = task
+            started = datetime.utcnow()
+            start = time.perf_counter()
+            result = {"reclaimed_bytes": 0, "detail": None, "error": None}
+            try:
+                result.update(TASKS[task]())
+            except sqlite3.OperationalError as e:
+                # 多为拿不到锁，下次再试
+                result["error"] = str(e)
+            except Exception as e:
+                result["error"] = str(e)
+            finally:
+                self.running = None
+            result["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+            conn = get_db_connection()
+            try:
+                conn.execute(
+                    """
+                    INSERT INTO maintenance_log
+                        (task, started_at, duration_ms, reclaimed_bytes, detail, error)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        task,
+                        started.strftime(TIME_FORMAT),
+                        result["duration_ms"],
+                        result["reclaimed_bytes"],
+                        result["detail"],
+                        result["error"],
+                    ),
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+            if result["error"]:
+                print(f"维护任务 {task} 失败: {result['error']}")
+            return {"task": task, **result}
+
+    def run_due(self):
+        for task in self.due_tasks():
+            if self._stop.is_set():
+                break
+            self.run_task(task)
+
+    def run_due_tenants(self, since: float):
+        """多用户模式下，以用户身份对 since（time.monotonic()）之后有过请求的
+        用户执行其到期的任务，任务和执行记录都在该用户的数据库中
+
+        用户的数据只在打开期间变化，只检查已打开且最近有请求的用户，不会为了
+        维护而打开或唤醒空闲的用户（维护时访问用户会刷新其最近使用时间，
+        调用方应传入上一轮检查结束的时间）。
+        """
+        for tenant_id in tenant_cache.active_since(since):
+            if self._stop.is_set():
+                break
+            try:
+                with use_tenant(tenant_id):
+                    self.run_due()
+            except Exception as e:
+                print(f"用户 {tenant_id} 的维护调度失败: {e}")
+
+    def _loop(self):
+        tenants_checked = 0.0
+        while not self._stop.is_set():
+            try:
+                self.run_due()
+            except Exception as e:
+                print(f"维护调度失败: {e}")
+            self.run_due_tenants(tenants_checked)
+            tenants_checked = time.monotonic()
+            self._stop.wait(TICK_SECONDS)
+
+    def report(self) -> Dict:
+        """各任务的间隔、最近一次执行结果和累计回收的空间"""
+        conn = get_db_connection()
+        try:
+            tasks = {}
+            for task, interval in self.intervals.items():
+                row = conn.execute(
+                    """
+                    SELECT datetime(started_at, '+8 hours') AS started_at,
+                           duration_ms, reclaimed_bytes, detail, error
+                    FROM maintenance_log
+                    WHERE task = ? ORDER BY id DESC LIMIT 1
+                    """,
+                    (task,),
+                ).fetchone()
+                total = conn.execute(
+                    """
+                    SELECT COUNT(*), COALESCE(SUM(reclaimed_bytes), 0)
+                    FROM maintenance_log WHERE task = ?
+                    """,
+                    (task,),
+                ).fetchone()
+                tasks[task] = {
+                    "interval_seconds": interval,
+                    "runs": total[0],
+                    "reclaimed_bytes_total": total[1],
+                    "last_run": dict(row) if row else None,
+                }
+            return {
+                "enabled": MAINTENANCE_ENABLED,
+                "running": self.running,
+                "database_bytes": _db_bytes(conn),
+                "free_bytes": conn.execute("PRAGMA freelist_count").fetchone()[0]
+                * conn.execute("PRAGMA page_size").fetchone()[0],
+                "tasks": tasks,
+            }
+        finally:
+            conn.close()
+
+
+maintenance = MaintenanceScheduler()
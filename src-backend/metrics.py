@@ -0,0 +1,349 @@
+import bisect
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from profiling import SLOW_QUERY_SECONDS, log_slow_query
+
+# 延迟直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """单调递增计数器"""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in items
+        ]
+
+
+class Histogram:
+    """固定分桶的直方图"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [每个分桶的计数..., 总和, 总数]
+        self._values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _bucket_line(self, labels: Tuple, le: str, count) -> str:
+        label_text = _format_labels(self.labelnames, labels, f'le="{le}"')
+        return f"{self.name}_bucket{label_text} {count}"
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(
+                (labels, list(series)) for labels, series in self._values.items()
+            )
+
+        lines = []
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(
+                    self._bucket_line(labels, _format_value(bound), cumulative)
+                )
+            lines.append(self._bucket_line(labels, "+Inf", series[-1]))
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{label_text} {series[-1]}")
+        return lines
+
+
+class Registry:
+    """指标注册表，按 Prometheus 文本格式输出"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], List[str]]):
+        """注册在输出时才计算的指标，collector 直接返回文本行"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter(
+    "wordbook_http_requests_total",
+    "HTTP 请求数",
+    ("method", "route", "status"),
+)
+HTTP_LATENCY = registry.histogram(
+    "wordbook_http_request_duration_seconds",
+    "HTTP 请求处理耗时",
+    ("method", "route"),
+)
+DB_STATEMENTS = registry.histogram(
+    "wordbook_db_statement_duration_seconds",
+    "SQLite 语句执行耗时",
+    ("operation",),
+)
+UPSTREAM_LATENCY = registry.histogram(
+    "wordbook_upstream_duration_seconds",
+    "上游请求排队、抓取与解析耗时",
+    ("provider", "phase"),
+)
+
+
+class MetricsMiddleware:
+    """记录每个路由的请求数、状态码和延迟的 ASGI 中间件"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            # 使用路由模板而不是实际路径，避免标签数量无限增长
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, route_path, status)
+            HTTP_LATENCY.observe(elapsed, method, route_path)
+
+
+def _operation(sql: str) -> str:
+    """取 SQL 语句的第一个关键字作为指标标签"""
+    head = sql.lstrip().split(None, 1)
+    op = head[0].lower() if head else ""
+    if op in ("select", "insert", "update", "delete", "replace", "with", "pragma"):
+        return op
+    return "other"
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """记录每条语句耗时的游标，超过阈值的语句输出到慢查询日志
+
+    SELECT 在 execute() 时只读到第一行，耗时还包括之后 fetchone/fetchmany/
+    fetchall 和迭代读取各行的时间（不含调用方在两次读取之间的处理），
+    读完所有行、执行下一条语句、关闭或释放游标时记录。
+    """
+
+    # 尚未记录的语句: [sql, 参数, 操作, 累计耗时]
+    _pending = None
+
+    def _record(self, sql, parameters, operation, elapsed):
+        DB_STATEMENTS.observe(elapsed, operation)
+        if SLOW_QUERY_SECONDS and elapsed >= SLOW_QUERY_SECONDS:
+            log_slow_query(self.connection, sql, parameters, elapsed)
+
+    def _flush(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            self._record(*pending)
+
+    def _add(self, elapsed: float, done: bool):
+        if self._pending is not None:
+            self._pending[3] += elapsed
+            if done:
+                self._flush()
+
+    def execute(self, sql, parameters=()):
+        self._flush()
+        start = time.perf_counter()
+        try:
+            result = super().execute(sql, parameters)
+        except BaseException:
+            self._record(sql, parameters, _operation(sql), time.perf_counter() - start)
+            raise
+        self._pending = [sql, parameters, _operation(sql), time.perf_counter() - start]
+        if self.description is None:
+            # 没有结果行（INSERT、UPDATE 等），语句已执行完
+            self._flush()
+        return result
+
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            row = super().fetchone()
+        except BaseException:
+            self._add(time.perf_counter() - start, done=True)
+            raise
+        self._add(time.perf_counter() - start, done=row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        try:
+            rows = super().fetchmany(size)
+        except BaseException:
+            self._add(time.perf_counter() - start, done=True)
+            raise
+        self._add(time.perf_counter() - start, done=len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self._add(time.perf_counter() - start, done=True)
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except BaseException:
+            self._add(time.perf_counter() - start, done=True)
+            raise
+        self._add(time.perf_counter() - start, done=False)
+        return row
+
+    def close(self):
+        self._flush()
+        super().close()
+
+    def __del__(self):
+        self._flush()
+
+    def executemany(self, sql, seq_of_parameters):
+        self._flush()
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._record(sql, None, _operation(sql), elapsed)
+
+    def executescript(self, sql_script):
+        self._flush()
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._record(sql_script, None, "script", elapsed)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """默认使用 InstrumentedCursor 的数据库连接
+
+    用法: sqlite3.connect(path, factory=InstrumentedConnection)
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Connection 上的快捷方法不会经过 cursor()，需要单独覆盖
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
@@ -0,0 +1,188 @@
+"""数据库结构迁移
+
+数据库结构的版本记录在 PRAGMA user_version 中，MIGRATIONS 按版本号顺序列出
+每一步迁移。启动时（以及导入数据库时）执行一次 migrate()：版本已是最新时
+只读取一次 user_version；否则依次执行未完成的迁移，每步完成后更新版本号。
+请求处理中不再检查表结构。
+
+每一步都是幂等的（IF NOT EXISTS、先检查列和索引），没有版本号的旧数据库
+（user_version 为 0，由旧版 main.py 或 schema.sql 创建）从第一步开始执行，
+已经存在的表和索引不受影响；中途失败时下次启动会重新执行未完成的那一步。
+
+修改表结构时在末尾追加一步，不要修改已发布的步骤。
+"""
+
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from audio import init_audio_tables
+from db import init_data_version
+from lemma import init_lemma_tables
+from listing import init_listing_columns
+from maintenance import init_maintenance_tables
+from reverse_index import init_reverse_index
+from review import init_review_tables
+from warmup import init_warmup_tables
+
+SCHEMA_PATH = Path(__file__).parent / "schema.sql"
+
+
+def _columns(conn, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _has_unique_index(conn, table: str, columns: List[str]) -> bool:
+    """table 上是否已有恰好覆盖 columns 的唯一索引（含 UNIQUE 约束的自动索引）"""
+    for index in conn.execute(f"PRAGMA index_list({table})").fetchall():
+        if not index[2]:
+            continue
+        indexed = [row[2] for row in conn.execute(f"PRAGMA index_info('{index[1]}')")]
+        if indexed == columns:
+            return True
+    return False
+
+
+def create_base_tables(conn):
+    """notebooks、words、word_entries 三张基础表"""
+    conn.executescript(SCHEMA_PATH.read_text(encoding="utf-8"))
+
+
+def add_words_created_at(conn):
+    """schema.sql 创建的旧数据库中 words 没有 created_at
+
+    ADD COLUMN 不能使用 CURRENT_TIMESTAMP 作为默认值，因此重建 words 表，
+    已有单词以最早加入词书的时间作为创建时间。单词 ID 保持不变，
+    表上的触发器和索引由之后的迁移重新创建。
+    """
+    if "created_at" in _columns(conn, "words"):
+        return
+    conn.execute("BEGIN")
+    conn.execute(
+        """
+        CREATE TABLE words_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            word TEXT NOT NULL UNIQUE,
+            definition TEXT,
+            note TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO words_new (id, word, definition, note, created_at)
+        SELECT id, word, definition, note, COALESCE(
+            (SELECT MIN(add_time) FROM word_entries WHERE word_id = words.id),
+            CURRENT_TIMESTAMP
+        )
+        FROM words
+        """
+    )
+    conn.execute("DROP TABLE words")
+    conn.execute("ALTER TABLE words_new RENAME TO words")
+    conn.commit()
+
+
+def unique_word_entries(conn):
+    """schema.sql 创建的 word_entries 没有 (word_id, notebook_id) 唯一约束
+
+    删除重复的条目（保留最早的一条）后创建唯一索引。
+    """
+    if _has_unique_index(conn, "word_entries", ["word_id", "notebook_id"]):
+        return
+    conn.execute(
+        """
+        DELETE FROM word_entries
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM word_entries GROUP BY word_id, notebook_id
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_word_entries_word_notebook
+        ON word_entries(word_id, notebook_id)
+        """
+    )
+    conn.commit()
+
+
+def drop_redundant_indexes(conn):
+    """删除被其他索引覆盖的索引，减少写入开销
+
+    - idx_word 与 words.word 的 UNIQUE 约束重复
+    - idx_word_id 是 (word_id, notebook_id) 唯一索引的前缀
+    - idx_word_entries_notebook(notebook_id, id) 与 idx_notebook_id 相同
+      （普通索引隐含 rowid，即 id）
+    """
+    conn.executescript(
+        """
+        CREATE INDEX IF NOT EXISTS idx_notebook_id ON word_entries(notebook_id);
+        DROP INDEX IF EXISTS idx_word;
+        DROP INDEX IF EXISTS idx_word_id;
+        DROP INDEX IF EXISTS idx_word_entries_notebook;
+        """
+    )
+
+
+# (版本号, 说明, 迁移函数)，版本号从 1 开始连续递增
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "基础表", create_base_tables),
+    (2, "words.created_at", add_words_created_at),
+    (3, "word_entries 唯一约束", unique_word_entries),
+    (4, "删除重复索引", drop_redundant_indexes),
+    (5, "数据版本计数器", init_data_version),
+    (6, "翻译缓存与预热队列", init_warmup_tables),
+    (7, "中文反查索引", init_reverse_index),
+    (8, "词形表与大小写不敏感索引", init_lemma_tables),
+    (9, "复习状态与复习记录", init_review_tables),
+    (10, "维护记录", init_maintenance_tables),
+    (11, "发音缓存", init_audio_tables),
+    (12, "单词列表排序与筛选索引", init_listing_columns),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn) -> int:
+    """执行未完成的迁移
+
+    Args:
+        conn: 数据库连接
+
+    Returns:
+        执行的迁移步数
+
+    Raises:
+        RuntimeError: 数据库版本比当前程序支持的更新
+    """
+    current = schema_version(conn)
+    if current == LATEST_VERSION:
+        return 0
+    if current > LATEST_VERSION:
+        raise RuntimeError(
+            f"数据库结构版本 {current} 高于程序支持的版本 {LATEST_VERSION}，请升级程序"
+        )
+
+    # 新建的数据库不逐步输出日志（多用户模式下每个新用户都会新建数据库）
+    fresh = (
+        conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'words'"
+        ).fetchone()
+        is None
+    )
+    applied = 0
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        step(conn)
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+        applied += 1
+        if not fresh:
+            print(f"数据库迁移 {version}: {description}")
+    return applied
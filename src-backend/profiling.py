@@ -0,0 +1,134 @@
+import asyncio
+import contextvars
+import cProfile
+import functools
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# 按比例随机采样请求进行性能分析，0 表示关闭
+PROFILE_SAMPLE_RATE = float(os.environ.get("WORDBOOK_PROFILE_SAMPLE_RATE", "0"))
+# 是否允许通过请求头 X-Wordbook-Profile: 1 触发性能分析
+PROFILE_ALLOW_HEADER = os.environ.get("WORDBOOK_PROFILE_ALLOW_HEADER", "0") == "1"
+PROFILE_HEADER = b"x-wordbook-profile"
+PROFILE_DIR = Path.home() / ".wordbook" / "profiles"
+
+# 超过该耗时的 SQL 语句会连同查询计划一起输出到日志，0 表示关闭
+SLOW_QUERY_SECONDS = float(os.environ.get("WORDBOOK_SLOW_QUERY_MS", "200")) / 1000
+
+_profile_requested = contextvars.ContextVar("profile_requested", default=False)
+# 同一时间只能有一个 cProfile 在运行（Python 3.12 起同时启用第二个会抛出
+# "Another profiling tool is already active"），已有请求在分析时跳过后来的请求
+_profile_lock = threading.Lock()
+
+
+class ProfilingMiddleware:
+    """决定当前请求是否需要性能分析的 ASGI 中间件
+
+    实际的分析由 @profiled 装饰的处理函数完成，同步处理函数运行在线程池中，
+    通过 contextvar 传递采样结果。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._sampled(scope):
+            await self.app(scope, receive, send)
+            return
+
+        token = _profile_requested.set(True)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _profile_requested.reset(token)
+
+    def _sampled(self, scope) -> bool:
+        if PROFILE_ALLOW_HEADER:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER and value == b"1":
+                    return True
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _dump(profiler: cProfile.Profile, name: str, elapsed: float):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    path = PROFILE_DIR / f"{timestamp}_{name}_{int(elapsed * 1000)}ms.prof"
+    profiler.dump_stats(str(path))
+    print(f"性能分析已保存: {path}")
+
+
+def _acquire(name: str) -> bool:
+    """当前请求被采样且没有其他请求在分析时取得分析权"""
+    if not _profile_requested.get():
+        return False
+    if not _profile_lock.acquire(blocking=False):
+        print(f"已有请求在进行性能分析，跳过 {name}")
+        return False
+    return True
+
+
+def profiled(name: str):
+    """对被采样的请求用 cProfile 分析处理函数，结果写入 ~/.wordbook/profiles
+
+    生成的 .prof 文件可用 python -m pstats 或 snakeviz 查看。
+    """
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _acquire(name):
+                    return await func(*args, **kwargs)
+                # 异步处理函数在 await 期间会混入事件循环中其他任务的调用
+                profiler = cProfile.Profile()
+                start = time.perf_counter()
+                profiler.enable()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    profiler.disable()
+                    _profile_lock.release()
+                    _dump(profiler, name, time.perf_counter() - start)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _acquire(name):
+                return func(*args, **kwargs)
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            try:
+                return profiler.runcall(func, *args, **kwargs)
+            finally:
+                _profile_lock.release()
+                _dump(profiler, name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def log_slow_query(conn, sql: str, parameters, elapsed: float):
+    """输出慢查询及其 EXPLAIN QUERY PLAN"""
+    statement = " ".join(sql.split())
+    print(f"慢查询 ({elapsed * 1000:.1f}ms): {statement} 参数: {parameters!r}")
+
+    if parameters is None:
+        return
+    try:
+        # 使用原生游标，避免查询计划本身再被计时和记录
+        cursor = sqlite3.Cursor(conn)
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+        for row in cursor.fetchall():
+            print(f"    {tuple(row)[-1]}")
+        cursor.close()
+    except sqlite3.Error as e:
+        print(f"    无法获取查询计划: {e}")
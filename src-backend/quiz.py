@@ -0,0 +1,246 @@
+"""词书选择题测验
+
+抽题不使用 ORDER BY RANDOM()（需要扫描并排序整个词书），而是在词书条目的
+id 范围内取随机数，沿 idx_notebook_id 索引（notebook_id 加隐含的 id）定位到
+不小于它的第一条，每抽一个单词只需一次索引查找，抽 N 个单词为 O(N log n)。
+条目 id 不连续时，紧跟在空隙后面的条目被抽中的概率略高，对测验来说可以接受。
+
+干扰项是其他单词的释义，按词性（释义中的 n./v./adj. 等）分桶，没有同词性
+的候选时按单词长度分桶。每个词书的候选池抽样构建后缓存在内存中，
+数据版本（db.get_data_version）变化后重新构建。
+"""
+
+import random
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional
+
+from db import get_data_version
+from tenants import tenant_local
+
+# 每个词书的干扰项候选池抽样的单词数
+POOL_SAMPLE_SIZE = 1000
+# 每个桶最多保留的候选数
+POOL_BUCKET_SIZE = 200
+# 最多缓存的词书数
+POOL_CACHE_SIZE = 64
+# 多用户模式下每个用户最多缓存的词书数
+TENANT_POOL_CACHE_SIZE = 4
+# 抽样允许的重复次数为 count // 2 加上该值，超过时说明词书很小，改为直接读取全部条目
+MAX_EXTRA_DUPLICATES = 10
+
+PART_OF_SPEECH = re.compile(
+    r"(?<![A-Za-z])(n|v|vt|vi|adj|adv|prep|conj|pron|int|interj|num|art|abbr|aux)\.",
+)
+
+
+def clean_definition(definition: str) -> str:
+    """去掉翻译结果开头的音标行，只保留释义"""
+    lines = [line.strip() for line in (definition or "").splitlines()]
+    lines = [line for line in lines if line and not line.startswith(("英 [", "美 ["))]
+    return "\n".join(lines)
+
+
+def part_of_speech(definition: str) -> Optional[str]:
+    """释义中第一个词性标记，如 n.、adj.；vt./vi. 归为 v."""
+    match = PART_OF_SPEECH.search(definition or "")
+    if not match:
+        return None
+    pos = match.group(1)
+    return "v" if pos in ("vt", "vi") else pos
+
+
+def length_bucket(word: str) -> int:
+    """单词长度分桶：<=4、5~6、7~8、9~10、>=11"""
+    return min(max(len(word) - 3, 1) // 2, 4)
+
+
+def _bucket_keys(word: str, definition: str) -> List[str]:
+    keys = []
+    pos = part_of_speech(definition)
+    if pos:
+        keys.append(f"pos:{pos}")
+    keys.append(f"len:{length_bucket(word)}")
+    return keys
+
+
+def sample_entries(conn, notebook_id: int, count: int, rng: random.Random) -> List[int]:
+    """从词书中随机抽取至多 count 个不重复的单词 ID"""
+    # MIN 和 MAX 分开查询才能各自只做一次索引查找
+    low = conn.execute(
+        "SELECT MIN(id) FROM word_entries WHERE notebook_id = ?", (notebook_id,)
+    ).fetchone()[0]
+    if low is None:
+        return []
+    high = conn.execute(
+        "SELECT MAX(id) FROM word_entries WHERE notebook_id = ?", (notebook_id,)
+    ).fetchone()[0]
+
+    word_ids = []
+    seen = set()
+    duplicates = 0
+    while len(word_ids) < count:
+        word_id = conn.execute(
+            """
+            SELECT word_id FROM word_entries
+            WHERE notebook_id = ? AND id >= ?
+            ORDER BY id
+            LIMIT 1
+            """,
+            (notebook_id, rng.randint(low, high)),
+        ).fetchone()[0]
+        if word_id not in seen:
+            seen.add(word_id)
+            word_ids.append(word_id)
+            continue
+
+        duplicates += 1
+        if duplicates > count // 2 + MAX_EXTRA_DUPLICATES:
+            # 重复过多说明词书中的单词不比 count 多几倍，直接读取全部条目
+            all_ids = [
+                r[0]
+                for r in conn.execute(
+                    "SELECT word_id FROM word_entries WHERE notebook_id = ?",
+                    (notebook_id,),
+                )
+            ]
+            rng.shuffle(all_ids)
+            return all_ids[:count]
+    return word_ids
+
+
+def _load_words(conn, word_ids: List[int]) -> List[Dict]:
+    if not word_ids:
+        return []
+    placeholders = ",".join("?" * len(word_ids))
+    rows = conn.execute(
+        f"SELECT id, word, definition FROM words WHERE id IN ({placeholders})",
+        word_ids,
+    ).fetchall()
+    by_id = {
+        r[0]: {"id": r[0], "word": r[1], "definition": clean_definition(r[2])}
+        for r in rows
+    }
+    return [by_id[i] for i in word_ids if i in by_id and by_id[i]["definition"]]
+
+
+class DistractorPools:
+    """按词书缓存的干扰项候选池"""
+
+    def __init__(self, capacity: int = POOL_CACHE_SIZE):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        # notebook_id -> (数据版本, {桶: [(word_id, 释义)]})
+        self._pools: "OrderedDict[int, tuple]" = OrderedDict()
+
+    def get(self, conn, notebook_id: int) -> Dict[str, List]:
+        version = get_data_version(conn)
+        with self._lock:
+            cached = self._pools.get(notebook_id)
+            if cached and cached[0] == version:
+                self._pools.move_to_end(notebook_id)
+                return cached[1]
+
+        pool = self._build(conn, notebook_id)
+        with self._lock:
+            self._pools[notebook_id] = (version, pool)
+            self._pools.move_to_end(notebook_id)
+            while len(self._pools) > self.capacity:
+                self._pools.popitem(last=False)
+        return pool
+
+    def clear(self):
+        with self._lock:
+            self._pools.clear()
+
+    def _build(self, conn, notebook_id: int) -> Dict[str, List]:
+        rng = random.Random()
+        words = _load_words(
+            conn, sample_entries(conn, notebook_id, POOL_SAMPLE_SIZE, rng)
+        )
+        if len(words) < POOL_SAMPLE_SIZE // 10:
+            # 词书太小时从所有单词中补充候选
+            words += _load_words(conn, _sample_words(conn, POOL_SAMPLE_SIZE, rng))
+
+        pool = defaultdict(list)
+        for word in words:
+            for key in _bucket_keys(word["word"], word["definition"]) + ["any"]:
+                if len(pool[key]) < POOL_BUCKET_SIZE:
+                    pool[key].append((word["id"], word["definition"]))
+        return dict(pool)
+
+
+def _sample_words(conn, count: int, rng: random.Random) -> List[int]:
+    """从所有单词中随机抽取单词 ID（按 rowid 范围抽样）"""
+    low = conn.execute("SELECT MIN(id) FROM words").fetchone()[0]
+    if low is None:
+        return []
+    high = conn.execute("SELECT MAX(id) FROM words").fetchone()[0]
+    word_ids = set()
+    for _ in range(count):
+        row = conn.execute(
+            "SELECT id FROM words WHERE id >= ? ORDER BY id LIMIT 1",
+            (rng.randint(low, high),),
+        ).fetchone()
+        word_ids.add(row[0])
+    return list(word_ids)
+
+
+pools = DistractorPools()
+
+
+def _pick_distractors(
+    pool: Dict[str, List], question: Dict, count: int, rng: random.Random
+) -> List[str]:
+    chosen = []
+    seen = {question["definition"]}
+    for key in _bucket_keys(question["word"], question["definition"]) + ["any"]:
+        candidates = pool.get(key, [])
+        picks = rng.sample(candidates, min(len(candidates), count * 3))
+        for word_id, definition in picks:
+            if len(chosen) >= count:
+                return chosen
+            if word_id != question["id"] and definition not in seen:
+                seen.add(definition)
+                chosen.append(definition)
+    return chosen
+
+
+def build_quiz(
+    conn,
+    notebook_id: int,
+    count: int = 10,
+    choices: int = 4,
+    seed: Optional[int] = None,
+) -> List[Dict]:
+    """生成选择题：给出单词，从 choices 个释义中选出正确的一个
+
+    Args:
+        conn: 数据库连接
+        notebook_id: 词书 ID
+        count: 题目数
+        choices: 每题的选项数（含正确答案）
+        seed: 抽题使用的随机种子（可选）
+
+    Returns:
+        题目列表，answer 为正确选项的下标
+    """
+    rng = random.Random(seed)
+    # 没有释义的单词不能出题，多抽一些
+    questions = _load_words(conn, sample_entries(conn, notebook_id, count * 2, rng))
+    questions = questions[:count]
+    if not questions:
+        return []
+
+    tenant_pools = tenant_local(
+        "quiz", pools, lambda: DistractorPools(TENANT_POOL_CACHE_SIZE)
+    )
+    pool = tenant_pools.get(conn, notebook_id)
+    quiz = []
+    for question in questions:
+        options = _pick_distractors(pool, question, choices - 1, rng)
+        answer = rng.randint(0, len(options))
+        options.insert(answer, question["definition"])
+        quiz.append({"word": question["word"], "choices": options, "answer": answer})
+    return quiz
@@ -0,0 +1,164 @@
+"""中文释义反查英文单词
+
+words.definition 和 words.note 是自由文本，按中文查单词只能全表 LIKE。
+这里维护一张 FTS5 全文索引 word_index（rowid 与 words.id 一致），
+写入前先把文本切成词元：连续的汉字切成重叠的二元组（“坚持不懈” ->
+“坚持 持不 不懈”），单个汉字保留为一元组，字母和数字按单词小写。
+查询词按同样的方式切分后作为短语匹配，结果按 bm25 排序。
+
+FTS5 自带的 trigram 分词器要求查询至少三个字符，查不了“坚持”这样的
+两字词，因此自行切分二元组，再交给默认的 unicode61 分词器按空格分词。
+"""
+
+import re
+import threading
+from typing import Dict, Iterable, List
+
+# 汉字（含扩展 A 区和兼容汉字）
+CJK_RUN = re.compile(r"[㐀-䶿一-鿿豈-﫿]+")
+TOKEN = re.compile(r"[㐀-䶿一-鿿豈-﫿]+|[^\W_]+")
+
+# 释义的权重高于笔记
+DEFINITION_WEIGHT = 1.0
+NOTE_WEIGHT = 0.3
+SYNC_BATCH_SIZE = 5000
+DEFAULT_LIMIT = 20
+
+_sync_lock = threading.Lock()
+
+
+def tokenize(text: str) -> List[str]:
+    """把文本切成词元：汉字二元组（单字时为一元组）以及小写的字母数字串"""
+    tokens = []
+    for match in TOKEN.finditer(text or ""):
+        run = match.group()
+        if CJK_RUN.fullmatch(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+def _index_text(text: str) -> str:
+    return " ".join(tokenize(text))
+
+
+def build_match_query(query: str) -> str:
+    """把查询词转换为 FTS5 MATCH 表达式
+
+    每段连续的汉字或字母数字作为一个短语，各短语之间为 AND。
+    单个汉字按前缀匹配，可以命中以它开头的所有二元组。
+    """
+    phrases = []
+    for match in TOKEN.finditer(query or ""):
+        run = match.group()
+        tokens = tokenize(run)
+        if len(tokens) == 1 and CJK_RUN.fullmatch(run):
+            phrases.append(f'"{tokens[0]}"*')
+        else:
+            phrases.append('"' + " ".join(tokens) + '"')
+    return " ".join(phrases)
+
+
+def init_reverse_index(conn):
+    """创建反查索引表（如不存在）"""
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS word_index
+        USING fts5(definition, note)
+        """
+    )
+    conn.commit()
+
+
+def index_word(conn, word_id: int, definition: str, note: str):
+    """写入或更新单个单词的索引，由调用方提交事务"""
+    conn.execute(
+        "INSERT OR REPLACE INTO word_index (rowid, definition, note) VALUES (?, ?, ?)",
+        (word_id, _index_text(definition), _index_text(note)),
+    )
+
+
+def _index_rows(conn, rows: Iterable) -> int:
+    batch = [(row[0], _index_text(row[1]), _index_text(row[2])) for row in rows]
+    conn.executemany(
+        "INSERT OR REPLACE INTO word_index (rowid, definition, note) VALUES (?, ?, ?)",
+        batch,
+    )
+    return len(batch)
+
+
+def sync_reverse_index(conn) -> int:
+    """补齐尚未建立索引的单词，删除已不存在的单词的索引
+
+    启动和导入数据库后调用；日常写入由 index_word 增量维护，
+    因此这里通常只做一次反连接检查。
+
+    Returns:
+        新建立索引的单词数
+    """
+    with _sync_lock:
+        init_reverse_index(conn)
+        conn.execute("DELETE FROM word_index WHERE rowid NOT IN (SELECT id FROM words)")
+
+        indexed = 0
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                """
+                SELECT id, definition, note FROM words
+                WHERE id > ? AND id NOT IN (SELECT rowid FROM word_index)
+                ORDER BY id
+                LIMIT ?
+                """,
+                (last_id, SYNC_BATCH_SIZE),
+            ).fetchall()
+            if not rows:
+                break
+            indexed += _index_rows(conn, rows)
+            last_id = rows[-1][0]
+            conn.commit()
+
+        conn.commit()
+        return indexed
+
+
+def reverse_lookup(conn, query: str, limit: int = DEFAULT_LIMIT) -> List[Dict]:
+    """按中文释义或笔记查找英文单词
+
+    Args:
+        conn: 数据库连接
+        query: 查询词，如“坚持”
+        limit: 最多返回的单词数
+
+    Returns:
+        按相关度排序的单词列表
+    """
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    cursor = conn.execute(
+        """
+        SELECT w.word, w.definition, w.note,
+               bm25(word_index, ?, ?) AS score
+        FROM word_index
+        JOIN words w ON w.id = word_index.rowid
+        WHERE word_index MATCH ?
+        ORDER BY score, length(w.word), w.word
+        LIMIT ?
+        """,
+        (DEFINITION_WEIGHT, NOTE_WEIGHT, match, limit),
+    )
+    return [
+        {
+            "word": row[0],
+            "definition": row[1],
+            "note": row[2],
+            "score": round(-row[3], 4),
+        }
+        for row in cursor
+    ]
@@ -0,0 +1,253 @@
+"""间隔重复复习
+
+每个 (单词, 词书) 一条复习状态，按 SM-2 算法安排下次复习时间 due_at。
+复习队列通过 (notebook_id, due_at) 索引按到期时间顺序读取，
+取下一批到期单词只需一次索引定位加顺序扫描 limit 行，与复习历史的规模无关。
+
+复习状态由 word_entries 上的触发器维护：单词加入词书时立即到期，
+移动到其他词书时保留复习进度，从词书删除时一并删除。
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+# SM-2 参数（初始 ease 为 2.5，见 review_state 表的默认值）
+MIN_EASE = 1.3
+# 回答错误后在本轮复习中再次出现的间隔
+RELEARN_DELAY = timedelta(minutes=10)
+MAX_GRADE = 5
+PASS_GRADE = 3
+
+# 数据库中保存 UTC 时间，接口返回北京时间（与单词列表的 add_time 一致）
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DISPLAY_OFFSET = timedelta(hours=8)
+
+
+def init_review_tables(conn):
+    """创建复习状态表、复习记录表和同步触发器，并为已有单词补齐复习状态"""
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS review_state (
+            word_id INTEGER NOT NULL,
+            notebook_id INTEGER NOT NULL,
+            due_at TIMESTAMP NOT NULL,
+            interval REAL NOT NULL DEFAULT 0,
+            ease REAL NOT NULL DEFAULT 2.5,
+            reps INTEGER NOT NULL DEFAULT 0,
+            lapses INTEGER NOT NULL DEFAULT 0,
+            last_review TIMESTAMP,
+            PRIMARY KEY (word_id, notebook_id)
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS idx_review_state_due
+            ON review_state(notebook_id, due_at);
+        CREATE INDEX IF NOT EXISTS idx_review_state_due_all
+            ON review_state(due_at);
+
+        CREATE TABLE IF NOT EXISTS review_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            word_id INTEGER NOT NULL,
+            notebook_id INTEGER NOT NULL,
+            grade INTEGER NOT NULL,
+            interval REAL NOT NULL,
+            ease REAL NOT NULL,
+            reviewed_at TIMESTAMP NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_review_log_word
+            ON review_log(word_id, notebook_id);
+
+        CREATE TRIGGER IF NOT EXISTS trg_review_entry_insert
+        AFTER INSERT ON word_entries
+        BEGIN
+            INSERT OR IGNORE INTO review_state (word_id, notebook_id, due_at)
+            VALUES (NEW.word_id, NEW.notebook_id, CURRENT_TIMESTAMP);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_review_entry_move
+        AFTER UPDATE OF word_id, notebook_id ON word_entries
+        BEGIN
+            UPDATE OR REPLACE review_state
+            SET word_id = NEW.word_id, notebook_id = NEW.notebook_id
+            WHERE word_id = OLD.word_id AND notebook_id = OLD.notebook_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_review_entry_delete
+        AFTER DELETE ON word_entries
+        BEGIN
+            DELETE FROM review_state
+            WHERE word_id = OLD.word_id AND notebook_id = OLD.notebook_id;
+        END;
+        """
+    )
+    # 建表前已存在的单词，以加入词书的时间作为首次到期时间
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO review_state (word_id, notebook_id, due_at)
+        SELECT word_id, notebook_id, COALESCE(add_time, CURRENT_TIMESTAMP)
+        FROM word_entries we
+        WHERE NOT EXISTS (
+            SELECT 1 FROM review_state r
+            WHERE r.word_id = we.word_id AND r.notebook_id = we.notebook_id
+        )
+        """
+    )
+    conn.commit()
+
+
+def _now() -> datetime:
+    return datetime.utcnow().replace(microsecond=0)
+
+
+def schedule(state: Dict, grade: int, now: datetime) -> Dict:
+    """按 SM-2 计算回答后的复习状态
+
+    Args:
+        state: 当前状态，包含 interval（天）、ease、reps、lapses
+        grade: 回答质量 0~5，3 及以上为记住
+        now: 回答时间（UTC）
+
+    Returns:
+        新状态，包含 due_at
+    """
+    interval, ease = state["interval"], state["ease"]
+    reps, lapses = state["reps"], state["lapses"]
+
+    if grade < PASS_GRADE:
+        reps = 0
+        lapses += 1
+        interval = 0.0
+        due_at = now + RELEARN_DELAY
+    else:
+        if reps == 0:
+            interval = 1.0
+        elif reps == 1:
+            interval = 6.0
+        else:
+            interval = round(interval * ease, 2)
+        reps += 1
+        due_at = now + timedelta(days=interval)
+
+    miss = MAX_GRADE - grade
+    ease = max(MIN_EASE, round(ease + 0.1 - miss * (0.08 + miss * 0.02), 3))
+
+    return {
+        "interval": interval,
+        "ease": ease,
+        "reps": reps,
+        "lapses": lapses,
+        "due_at": due_at.strftime(TIME_FORMAT),
+    }
+
+
+def next_due(
+    conn,
+    notebook_id: Optional[int] = None,
+    limit: int = 20,
+    now: Optional[datetime] = None,
+) -> List[Dict]:
+    """按到期时间顺序返回已到期的单词
+
+    Args:
+        conn: 数据库连接
+        notebook_id: 词书 ID，为空时从所有词书中选取
+        limit: 最多返回的单词数
+        now: 当前时间（UTC），默认为系统时间
+
+    Returns:
+        到期单词列表，最早到期的在前
+    """
+    now = (now or _now()).strftime(TIME_FORMAT)
+    where = "r.due_at <= ?"
+    params = [now]
+    if notebook_id is not None:
+        where = "r.notebook_id = ? AND " + where
+        params.insert(0, notebook_id)
+
+    cursor = conn.execute(
+        f"""
+        SELECT w.word, w.definition, w.note, r.notebook_id,
+               datetime(r.due_at, '+8 hours') AS due_at,
+               r.interval, r.reps, r.lapses
+        FROM review_state r
+        JOIN words w ON w.id = r.word_id
+        WHERE {where}
+        ORDER BY r.due_at
+        LIMIT ?
+        """,
+        params + [limit],
+    )
+    columns = [d[0] for d in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+def next_due_at(conn, notebook_id: Optional[int] = None) -> Optional[str]:
+    """最近一次到期时间（北京时间），没有待复习的单词时返回 None"""
+    if notebook_id is None:
+        row = conn.execute(
+            "SELECT datetime(MIN(due_at), '+8 hours') FROM review_state"
+        ).fetchone()
+    else:
+        row = conn.execute(
+            """
+            SELECT datetime(MIN(due_at), '+8 hours') FROM review_state
+            WHERE notebook_id = ?
+            """,
+            (notebook_id,),
+        ).fetchone()
+    return row[0]
+
+
+def grade_word(
+    conn, word_id: int, notebook_id: int, grade: int, now: Optional[datetime] = None
+) -> Optional[Dict]:
+    """记录一次回答并更新复习状态，由调用方提交事务
+
+    Returns:
+        新的复习状态（due_at 为北京时间）；该单词不在词书中时返回 None
+    """
+    row = conn.execute(
+        """
+        SELECT interval, ease, reps, lapses FROM review_state
+        WHERE word_id = ? AND notebook_id = ?
+        """,
+        (word_id, notebook_id),
+    ).fetchone()
+    if row is None:
+        return None
+
+    now = now or _now()
+    state = schedule(
+        {"interval": row[0], "ease": row[1], "reps": row[2], "lapses": row[3]},
+        grade,
+        now,
+    )
+    reviewed_at = now.strftime(TIME_FORMAT)
+    conn.execute(
+        """
+        UPDATE review_state
+        SET due_at = ?, interval = ?, ease = ?, reps = ?, lapses = ?, last_review = ?
+        WHERE word_id = ? AND notebook_id = ?
+        """,
+        (
+            state["due_at"],
+            state["interval"],
+            state["ease"],
+            state["reps"],
+            state["lapses"],
+            reviewed_at,
+            word_id,
+            notebook_id,
+        ),
+    )
+    conn.execute(
+        """
+        INSERT INTO review_log
+            (word_id, notebook_id, grade, interval, ease, reviewed_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (word_id, notebook_id, grade, state["interval"], state["ease"], reviewed_at),
+    )
+
+    due_at = datetime.strptime(state["due_at"], TIME_FORMAT) + DISPLAY_OFFSET
+    return {**state, "due_at": due_at.strftime(TIME_FORMAT)}
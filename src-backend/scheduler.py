@@ -0,0 +1,202 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+from metrics import UPSTREAM_LATENCY
+
+# 优先级：数值越小越先执行
+INTERACTIVE = 0  # 用户发起的查询
+BACKGROUND = 10  # 后台预热等批量任务
+
+# 每个上游平台的默认限速配置
+DEFAULT_RATE = float(os.environ.get("WORDBOOK_UPSTREAM_RATE", "2"))  # 每秒请求数
+DEFAULT_BURST = int(os.environ.get("WORDBOOK_UPSTREAM_BURST", "5"))  # 令牌桶容量
+DEFAULT_MAX_QUEUE = int(os.environ.get("WORDBOOK_UPSTREAM_MAX_QUEUE", "100"))
+DEFAULT_MAX_RETRIES = int(os.environ.get("WORDBOOK_UPSTREAM_MAX_RETRIES", "3"))
+
+RETRY_BASE_DELAY = 0.5  # 秒
+RETRY_MAX_DELAY = 30.0  # 秒
+
+
+class QueueFullError(Exception):
+    """等待队列已满，拒绝新的上游请求"""
+
+
+class TokenBucket:
+    """令牌桶限速器，非线程安全，由调度器的锁保护"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def try_acquire(self) -> float:
+        """尝试取出一个令牌
+
+        Returns:
+            0 表示成功取到令牌，否则为需要等待的秒数
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class _ProviderStats:
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def as_dict(self, queue_depth: int) -> Dict:
+        return {
+            "queue_depth": queue_depth,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+        }
+
+
+class OutboundScheduler:
+    """上游请求调度器
+
+    每个平台一个令牌桶和一个有界优先队列：交互式查询排在后台任务之前，
+    遇到 429/5xx 或网络错误时按带抖动的指数退避重试。每次请求的排队等待
+    和 HTTP 耗时分别记录为 UPSTREAM_LATENCY 的 queue 和 fetch 阶段。
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._queues: Dict[str, List] = {}
+        self._stats: Dict[str, _ProviderStats] = {}
+
+    def _provider(self, provider: str):
+        if provider not in self._buckets:
+            self._buckets[provider] = TokenBucket(self.rate, self.burst)
+            self._queues[provider] = []
+            self._stats[provider] = _ProviderStats()
+        return self._buckets[provider], self._queues[provider], self._stats[provider]
+
+    def _acquire(self, provider: str, priority: int):
+        """排队并等待轮到自己且有可用令牌"""
+        with self._cond:
+            bucket, queue, stats = self._provider(provider)
+            if len(queue) >= self.max_queue:
+                stats.rejected += 1
+                raise QueueFullError(f"上游 {provider} 请求队列已满")
+
+            ticket = (priority, next(self._seq))
+            heapq.heappush(queue, ticket)
+            # 新请求可能插到队首，唤醒其他等待者重新检查
+            self._cond.notify_all()
+            enqueued = time.monotonic()
+
+            while True:
+                if queue[0] == ticket:
+                    wait = bucket.try_acquire()
+                    if wait == 0:
+                        heapq.heappop(queue)
+                        self._cond.notify_all()
+                        break
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+
+            waited = time.monotonic() - enqueued
+            stats.requests += 1
+            stats.wait_seconds_total += waited
+            stats.wait_seconds_max = max(stats.wait_seconds_max, waited)
+        UPSTREAM_LATENCY.observe(waited, provider, "queue")
+
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response]):
+        """计算重试前的等待时间，优先遵循 Retry-After"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), RETRY_MAX_DELAY)
+        # full jitter
+        return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt))
+
+    def get(
+        self, provider: str, url: str, priority: int = INTERACTIVE, **kwargs
+    ) -> requests.Response:
+        """经限速和重试后发出 GET 请求
+
+        Args:
+            provider: 上游平台名称，每个平台独立限速
+            url: 请求地址
+            priority: 优先级，INTERACTIVE 或 BACKGROUND
+
+        Returns:
+            最后一次请求的响应
+        """
+        attempt = 0
+        while True:
+            self._acquire(provider, priority)
+            response = None
+            start = time.perf_counter()
+            try:
+                response = requests.get(url, **kwargs)
+                if response.status_code != 429 and response.status_code < 500:
+                    return response
+            except requests.RequestException:
+                if attempt >= self.max_retries:
+                    self._record_failure(provider)
+                    raise
+            finally:
+                UPSTREAM_LATENCY.observe(time.perf_counter() - start, provider, "fetch")
+
+            if attempt >= self.max_retries:
+                self._record_failure(provider)
+                return response
+
+            with self._cond:
+                self._stats[provider].retries += 1
+            time.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    def _record_failure(self, provider: str):
+        with self._cond:
+            self._stats[provider].failures += 1
+
+    def stats(self) -> Dict[str, Dict]:
+        """各平台的队列深度、等待时间等统计"""
+        with self._cond:
+            return {
+                provider: stats.as_dict(len(self._queues[provider]))
+                for provider, stats in self._stats.items()
+            }
+
+
+# 全局调度器实例，search.py 的所有上游请求都经过它
+scheduler = OutboundScheduler()
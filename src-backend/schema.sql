@@ -1,9 +1,12 @@
+-- 基础表结构（迁移的第 1 步，见 migrations.py）
+-- 已发布的数据库不会重新执行本文件，修改表结构请在 migrations.py 中追加迁移
+
 -- 1. 创建词本表：记录各个单词本的信息
 CREATE TABLE IF NOT EXISTS notebooks (                          -- 创建词本表
     id INTEGER PRIMARY KEY AUTOINCREMENT,        -- 词本ID，主键，自动递增
     name TEXT NOT NULL,                          -- 词本名称，不允许为空
     cover TEXT DEFAULT NULL,                     -- 词本封面图片URL或路径，允许为空
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP -- 创建时间，默认为当前时间戳
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP -- 创建时间，默认为当前时间戳
 );
 
 -- 2. 创建单词表：记录单词及其释义和笔记
@@ -11,7 +14,8 @@ CREATE TABLE IF NOT EXISTS words (                             -- 创建单词
     id INTEGER PRIMARY KEY AUTOINCREMENT,        -- 单词ID，主键，自动递增
     word TEXT NOT NULL UNIQUE,                   -- 单词内容，不允许为空且必须唯一
     definition TEXT,                             -- 单词释义
-    note TEXT                                    -- 单词笔记
+    note TEXT,                                   -- 单词笔记
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP -- 创建时间，默认为当前时间戳
 );
 
 -- 3. 创建单词条目表：记录某单词在具体某个词本中的添加记录（包括添加时间）
@@ -19,16 +23,11 @@ CREATE TABLE IF NOT EXISTS word_entries (                      -- 创建单词
     id INTEGER PRIMARY KEY AUTOINCREMENT,        -- 条目ID，主键，自动递增
     word_id INTEGER NOT NULL,                    -- 关联的单词ID，不允许为空
     notebook_id INTEGER NOT NULL,                -- 关联的词本ID，不允许为空
-    add_time DATETIME DEFAULT CURRENT_TIMESTAMP, -- 添加时间，默认为当前时间戳
+    add_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP, -- 添加时间，默认为当前时间戳
     FOREIGN KEY(word_id) REFERENCES words(id),   -- 外键约束：关联words表的id字段
-    FOREIGN KEY(notebook_id) REFERENCES notebooks(id) -- 外键约束：关联notebooks表的id字段
+    FOREIGN KEY(notebook_id) REFERENCES notebooks(id), -- 外键约束：关联notebooks表的id字段
+    UNIQUE(word_id, notebook_id)                 -- 同一单词在一个词本中只出现一次，也用于按单词查找条目
 );
 
--- 为 words 表的 word 字段添加索引
-CREATE UNIQUE INDEX IF NOT EXISTS idx_word ON words(word);
-
--- 为 word_entries 表的 word_id 字段添加索引
-CREATE INDEX IF NOT EXISTS idx_word_id ON word_entries(word_id);
-
--- 为 word_entries 表的 notebook_id 字段添加索引
+-- 为 word_entries 表的 notebook_id 字段添加索引（隐含 id，可按词本顺序读取条目）
 CREATE INDEX IF NOT EXISTS idx_notebook_id ON word_entries(notebook_id);
@@ -1,16 +1,27 @@
-import requests
+import os
+import time
+
 from bs4 import BeautifulSoup
+from metrics import UPSTREAM_LATENCY
+from scheduler import INTERACTIVE, scheduler
+
+# 上游词典地址，可通过环境变量替换为本地的替身服务
+YOUDAO_URL = os.environ.get("WORDBOOK_YOUDAO_URL", "https://www.youdao.com/result")
+BING_URL = os.environ.get("WORDBOOK_BING_URL", "https://cn.bing.com/dict/search")
 
 
-def get_url(url):
+def get_url(url, provider="youdao", priority=INTERACTIVE):
     head = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "}
-    response = requests.get(url=url, headers=head)
+    # 排队和抓取耗时由调度器记录
+    response = scheduler.get(provider, url, priority=priority, headers=head, timeout=10)
 
     if response.status_code != 200:
         raise Exception("Get url failed.")
 
+    start = time.perf_counter()
     content = response.text
     soup = BeautifulSoup(content, "html.parser")
+    UPSTREAM_LATENCY.observe(time.perf_counter() - start, provider, "parse")
     return soup
 
 
@@ -30,15 +41,15 @@ def extract_text(html):
     return html.text.strip()
 
 
-def search_word(word, type="youdao"):
+def search_word(word, type="youdao", priority=INTERACTIVE):
     ans = {}
     mean_zh = ""
 
     if type == "youdao":
 
-        url = f"https://www.youdao.com/result?word={word}&lang=en"
+        url = f"{YOUDAO_URL}?word={word}&lang=en"
 
-        soup = get_url(url)
+        soup = get_url(url, "youdao", priority)
 
         word_text = soup.find("div", attrs={"class": "title"})
         check_word_is_none(word_text)
@@ -53,8 +64,8 @@ def search_word(word, type="youdao"):
 
     if type == "bing":
 
-        url = f"https://cn.bing.com/dict/search?q={word}"
-        soup = get_url(url)
+        url = f"{BING_URL}?q={word}"
+        soup = get_url(url, "bing", priority)
 
         word_text = soup.find("div", attrs={"class": "hd_div"}).find("h1")
         check_word_is_none(word_text)
@@ -0,0 +1,79 @@
+import os
+
+from fastapi.responses import Response
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+
+# 响应体超过该大小（字节）且客户端支持时使用 gzip 压缩
+GZIP_MINIMUM_SIZE = int(os.environ.get("WORDBOOK_GZIP_MINIMUM_SIZE", "1024"))
+GZIP_COMPRESS_LEVEL = 6
+
+# 只压缩文本类响应，图片、xlsx、zip 等已压缩的文件原样返回
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "text/",
+    "application/javascript",
+)
+# 标记不压缩的响应，GZipMiddleware 原样透传已设置 Content-Encoding 的响应
+PASSTHROUGH_ENCODING = "identity"
+
+
+def json_rows(cursor) -> bytes:
+    """将每行只有一列 JSON 文本的查询结果拼接为 JSON 数组
+
+    配合 SQLite 的 json_object() 使用，行数据直接编码为字节，不经过 Python 字典。
+    """
+    return b"[" + b",".join(row[0].encode("utf-8") for row in cursor) + b"]"
+
+
+class RawJSONResponse(Response):
+    """已编码好的 JSON 字节响应"""
+
+    media_type = "application/json"
+
+
+class CompressionMiddleware:
+    """按内容类型选择性压缩的 GZipMiddleware
+
+    GZipMiddleware 不会压缩已设置 Content-Encoding 的响应。非文本类响应在交给
+    GZipMiddleware 之前标记为 Content-Encoding: identity，由它原样透传，标记在
+    发给客户端之前去掉；只依赖 ASGI 消息和 GZipMiddleware 公开的行为，不依赖
+    其内部实现。
+    """
+
+    def __init__(self, app, minimum_size: int = GZIP_MINIMUM_SIZE):
+        self.app = app
+        self.gzip = GZipMiddleware(
+            self._mark_uncompressible, minimum_size, compresslevel=GZIP_COMPRESS_LEVEL
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_unmarked(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=list(message["headers"]))
+                if headers.get("content-encoding") == PASSTHROUGH_ENCODING:
+                    del headers["content-encoding"]
+                    message = {**message, "headers": headers.raw}
+            await send(message)
+
+        await self.gzip(scope, receive, send_unmarked)
+
+    async def _mark_uncompressible(self, scope, receive, send):
+        async def send_marked(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=list(message["headers"]))
+                content_type = headers.get("content-type", "")
+                if (
+                    not content_type.startswith(COMPRESSIBLE_TYPES)
+                    and "content-encoding" not in headers
+                ):
+                    headers["content-encoding"] = PASSTHROUGH_ENCODING
+                    message = {**message, "headers": headers.raw}
+            await send(message)
+
+        await self.app(scope, receive, send_marked)
@@ -0,0 +1,64 @@
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    """一次正在进行中的调用，等待者共享它的结果"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """合并并发的相同请求
+
+    同一个 key 同时只会有一个调用真正执行，其余并发调用阻塞等待，
+    并直接拿到第一个调用的结果（或异常）。调用结束后 key 即被移除，
+    不会缓存结果。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """执行 fn，相同 key 的并发调用只执行一次
+
+        Args:
+            key: 合并请求所用的键
+            fn: 实际执行的函数
+
+        Returns:
+            fn 的返回值，所有等待者共享同一个对象
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def in_flight(self) -> int:
+        """当前正在进行中的调用数"""
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,480 @@
+"""多用户模式
+
+默认只服务一个单词本（~/.wordbook）。设置 WORDBOOK_MULTI_TENANT=1 后，
+每个请求必须带有用户标识请求头（默认 X-Wordbook-User，由前置的认证代理
+设置，代理需要丢弃客户端自带的同名请求头），每个用户使用独立的数据目录::
+
+    ~/.wordbook/tenants/<用户>/wordbook.db
+    ~/.wordbook/tenants/<用户>/covers/
+
+当前用户通过 contextvar 传递（TenantMiddleware 设置，线程池和后台线程中
+用 use_tenant 设置），db.get_db_connection 和 main.get_db_connection
+据此返回该用户数据库的连接，不需要修改各个接口。
+
+打开的用户保存在有上限的 LRU 缓存中（TenantCache）：每个用户保留少量空闲
+连接复用，以及纠错索引、测验干扰项等缓存；超过上限或空闲超时的用户被逐出，
+关闭其连接并释放缓存。打开的文件描述符和内存因此只与缓存上限有关，
+与用户总数无关。
+"""
+
+import contextvars
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import InstrumentedConnection
+from starlette.responses import JSONResponse
+from starlette.staticfiles import StaticFiles
+
+TENANT_MODE = os.environ.get("WORDBOOK_MULTI_TENANT", "0") == "1"
+TENANT_HEADER = (
+    os.environ.get("WORDBOOK_TENANT_HEADER", "X-Wordbook-User").lower().encode()
+)
+# 同时打开的用户数上限
+MAX_OPEN_TENANTS = int(os.environ.get("WORDBOOK_TENANT_CACHE_SIZE", "128"))
+# 超过该时间（秒）没有请求的用户被逐出
+TENANT_IDLE_SECONDS = int(os.environ.get("WORDBOOK_TENANT_IDLE_SECONDS", "600"))
+# 每个用户保留的空闲连接数
+IDLE_CONNECTIONS = 2
+# 每个连接的页缓存上限（KiB），SQLite 默认为 2000
+CONNECTION_CACHE_KIB = int(os.environ.get("WORDBOOK_TENANT_CACHE_KIB", "512"))
+
+DATA_DIR = Path.home() / ".wordbook"
+TENANTS_DIR = DATA_DIR / "tenants"
+# 字母或数字开头，不含路径分隔符，可直接作为目录名
+TENANT_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.@-]{0,63}$")
+# 不需要用户标识的路径（前端页面和运行指标）
+PUBLIC_PATHS = ("/api/metrics",)
+
+_current_tenant = contextvars.ContextVar("current_tenant", default=None)
+# 当前请求取得的用户连接，请求结束时归还没有关闭的连接
+_request_connections = contextvars.ContextVar("request_connections", default=None)
+
+
+class TenantConnection(InstrumentedConnection):
+    """用户数据库的连接，close() 时放回所属用户的空闲连接中
+
+    每次取出时有一个新的 lease，重复 close() 只归还一次。
+    """
+
+    tenant: "Tenant" = None
+    lease: Optional[object] = None
+
+    def close(self):
+        if self.tenant is None:
+            super().close()
+        else:
+            self.tenant.release(self)
+
+    def discard(self):
+        super().close()
+
+
+class Tenant:
+    """一个用户的数据目录、空闲连接和缓存"""
+
+    def __init__(self, tenant_id: str):
+        self.id = tenant_id
+        self.root = TENANTS_DIR / tenant_id
+        self.db_path = self.root / "wordbook.db"
+        self.covers_dir = self.root / "covers"
+        self.backups_dir = TENANTS_DIR / ".backups" / tenant_id
+        self.last_used = time.monotonic()
+        self.closed = False
+        self.in_use = 0
+        self._idle: List[TenantConnection] = []
+        self._caches: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._opened = threading.Event()
+        self._open_lock = threading.Lock()
+
+    def open(self) -> bool:
+        """首次使用时创建目录并执行迁移
+
+        Returns:
+            是否由本次调用完成打开
+        """
+        if self._opened.is_set():
+            return False
+        with self._open_lock:
+            if self._opened.is_set():
+                return False
+            # migrations 依赖 db 和各功能模块，而它们依赖本模块
+            from migrations import migrate
+
+            self.covers_dir.mkdir(parents=True, exist_ok=True)
+            conn = self.connect()
+            try:
+                migrate(conn)
+            finally:
+                conn.close()
+            self._opened.set()
+            return True
+
+    def connect(self) -> TenantConnection:
+        """取一个空闲连接，没有时新建
+
+        请求中取得的连接记录在请求上，请求结束时没有关闭的（如接口抛出异常
+        前没有关闭）由 TenantMiddleware 归还，使用中的连接数不会泄漏。
+        """
+        conn = None
+        with self._lock:
+            self.in_use += 1
+            if self._idle:
+                conn = self._idle.pop()
+
+        if conn is None:
+            conn = sqlite3.connect(
+                str(self.db_path), factory=TenantConnection, check_same_thread=False
+            )
+            conn.execute(f"PRAGMA cache_size = -{CONNECTION_CACHE_KIB}")
+            conn.row_factory = sqlite3.Row
+            conn.tenant = self
+        conn.lease = lease = object()
+        leases = _request_connections.get()
+        if leases is not None:
+            leases.append((conn, lease))
+        return conn
+
+    def release(self, conn: TenantConnection, lease: Optional[object] = None):
+        """归还连接；用户已被逐出或空闲连接已满时关闭连接
+
+        Args:
+            lease: 只在连接仍是这次取出时归还（已归还并被再次取出时不处理）
+        """
+        with self._lock:
+            if conn.lease is None or (lease is not None and lease is not conn.lease):
+                return
+            conn.lease = None
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = sqlite3.Row
+        with self._lock:
+            self.in_use -= 1
+            self._released.notify_all()
+            if not self.closed and len(self._idle) < IDLE_CONNECTIONS:
+                self._idle.append(conn)
+                return
+        conn.discard()
+
+    def cache(self, name: str, factory: Callable[[], object]):
+        """该用户的缓存对象，不存在时用 factory 创建"""
+        with self._lock:
+            if name in self._caches:
+                return self._caches[name]
+        # factory 可能会访问数据库（取连接需要同一把锁），在锁外创建
+        value = factory()
+        with self._lock:
+            return self._caches.setdefault(name, value)
+
+    def close(self):
+        """关闭空闲连接、释放缓存；使用中的连接在归还时关闭"""
+        with self._lock:
+            self.closed = True
+            idle, self._idle = self._idle, []
+            self._caches.clear()
+        for conn in idle:
+            conn.discard()
+
+    def wait_released(self, timeout: float) -> bool:
+        """等待使用中的连接全部归还
+
+        Returns:
+            是否在超时前全部归还
+        """
+        with self._lock:
+            return self._released.wait_for(lambda: self.in_use == 0, timeout)
+
+    @property
+    def idle_connections(self) -> int:
+        return len(self._idle)
+
+
+class TenantCache:
+    """打开的用户的 LRU 缓存"""
+
+    def __init__(
+        self,
+        capacity: int = MAX_OPEN_TENANTS,
+        idle_seconds: int = TENANT_IDLE_SECONDS,
+    ):
+        self.capacity = capacity
+        self.idle_seconds = idle_seconds
+        self._tenants: "OrderedDict[str, Tenant]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._on_open: List[Callable[[], None]] = []
+        # 正在替换数据文件的用户 -> 替换完成时设置的事件
+        self._replacing: Dict[str, threading.Event] = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.opened = 0
+        self.evicted = 0
+
+    def on_open(self, callback: Callable[[], None]):
+        """注册用户打开后执行的回调，执行时当前用户已设置"""
+        self._on_open.append(callback)
+
+    def get(self, tenant_id: str) -> Tenant:
+        """取得用户，不在缓存中时打开；超出上限时逐出最久未使用的用户
+
+        用户的数据文件正在被替换时（见 replacing）等待替换完成。
+        """
+        evicted = []
+        while True:
+            with self._lock:
+                pending = self._replacing.get(tenant_id)
+                if pending is None:
+                    tenant = self._tenants.get(tenant_id)
+                    if tenant is None:
+                        tenant = Tenant(tenant_id)
+                        self._tenants[tenant_id] = tenant
+                        while len(self._tenants) > self.capacity:
+                            evicted.append(self._tenants.popitem(last=False)[1])
+                    else:
+                        self._tenants.move_to_end(tenant_id)
+                    tenant.last_used = time.monotonic()
+                    break
+            pending.wait()
+
+        for old in evicted:
+            old.close()
+            self.evicted += 1
+
+        if tenant.open():
+            self.opened += 1
+            with use_tenant(tenant_id):
+                for callback in self._on_open:
+                    try:
+                        callback()
+                    except Exception as e:
+                        print(f"用户 {tenant_id} 打开后的回调失败: {e}")
+        return tenant
+
+    def active_since(self, since: float) -> List[str]:
+        """已打开、且在 since（time.monotonic()）之后有过请求的用户"""
+        with self._lock:
+            return [
+                tenant_id
+                for tenant_id, tenant in self._tenants.items()
+                if tenant.last_used >= since
+            ]
+
+    @contextmanager
+    def replacing(self, tenant_id: Optional[str], timeout: float = 0):
+        """在替换用户的数据文件（如导入数据库）期间使用
+
+        逐出该用户并等待使用中的连接归还；退出之前其他线程取得该用户时都会
+        等待，不会在替换完成前重新打开旧文件、拿着旧文件的连接。同一用户的
+        替换依次进行。tenant_id 为 None（单用户模式）时什么也不做。
+
+        Yields:
+            使用中的连接是否已全部归还
+        """
+        if tenant_id is None:
+            yield True
+            return
+
+        done = threading.Event()
+        while True:
+            with self._lock:
+                pending = self._replacing.get(tenant_id)
+                if pending is None:
+                    self._replacing[tenant_id] = done
+                    break
+            pending.wait()
+        try:
+            yield self.evict(tenant_id, timeout)
+        finally:
+            with self._lock:
+                del self._replacing[tenant_id]
+            done.set()
+
+    def evict(self, tenant_id: str, timeout: float = 0) -> bool:
+        """逐出用户，如替换其数据库文件之前
+
+        Args:
+            tenant_id: 用户标识
+            timeout: 等待使用中的连接（如后台线程）归还的最长时间（秒）
+
+        Returns:
+            使用中的连接是否已全部归还
+        """
+        with self._lock:
+            tenant = self._tenants.pop(tenant_id, None)
+        if tenant is None:
+            return True
+        tenant.close()
+        self.evicted += 1
+        return tenant.wait_released(timeout)
+
+    def evict_idle(self) -> int:
+        """逐出空闲超时且没有使用中连接的用户"""
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [
+                tenant_id
+                for tenant_id, tenant in self._tenants.items()
+                if tenant.last_used < cutoff and tenant.in_use == 0
+            ]
+        for tenant_id in idle:
+            self.evict(tenant_id)
+        return len(idle)
+
+    def start(self):
+        """启动定期逐出空闲用户的后台线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop, name="tenant-evictor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            tenants, self._tenants = list(self._tenants.values()), OrderedDict()
+        for tenant in tenants:
+            tenant.close()
+
+    def _loop(self):
+        interval = max(1, min(60, self.idle_seconds // 2))
+        while not self._stop.wait(interval):
+            self.evict_idle()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            tenants = list(self._tenants.values())
+        return {
+            "open_tenants": len(tenants),
+            "idle_connections": sum(t.idle_connections for t in tenants),
+            "busy_connections": sum(t.in_use for t in tenants),
+            "opened_total": self.opened,
+            "evicted_total": self.evicted,
+        }
+
+
+tenant_cache = TenantCache()
+
+
+def current_tenant_id() -> Optional[str]:
+    """当前请求的用户，单用户模式下为 None"""
+    return _current_tenant.get()
+
+
+def current_tenant() -> Optional[Tenant]:
+    tenant_id = _current_tenant.get()
+    return None if tenant_id is None else tenant_cache.get(tenant_id)
+
+
+def background_context() -> contextvars.Context:
+    """复制当前上下文供后台线程使用：保留当前用户，不把连接记录到当前请求上"""
+    context = contextvars.copy_context()
+    context.run(_request_connections.set, None)
+    return context
+
+
+@contextmanager
+def use_tenant(tenant_id: Optional[str]):
+    """在后台线程等请求之外的地方以指定用户的身份访问数据"""
+    token = _current_tenant.set(tenant_id)
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+
+def tenant_local(name: str, default, factory: Callable[[], object]):
+    """当前用户的缓存对象，单用户模式下返回全局的 default"""
+    tenant = current_tenant()
+    return default if tenant is None else tenant.cache(name, factory)
+
+
+def data_dir() -> Path:
+    """当前用户的数据目录"""
+    tenant = current_tenant()
+    return DATA_DIR if tenant is None else tenant.root
+
+
+def covers_dir() -> Path:
+    """当前用户的封面目录"""
+    tenant = current_tenant()
+    return DATA_DIR / "covers" if tenant is None else tenant.covers_dir
+
+
+def backups_dir() -> Path:
+    """导入数据库前的 wordbook_backup_* 备份所在的目录"""
+    tenant = current_tenant()
+    return DATA_DIR.parent if tenant is None else tenant.backups_dir
+
+
+class TenantMiddleware:
+    """多用户模式下从请求头读取用户标识并设置当前用户的 ASGI 中间件"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not TENANT_MODE
+            or scope["type"] != "http"
+            or not scope["path"].startswith(("/api/", "/covers/"))
+            or scope["path"] in PUBLIC_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        tenant_id = None
+        for name, value in scope["headers"]:
+            if name == TENANT_HEADER:
+                tenant_id = value.decode("latin-1").strip()
+                break
+
+        if not tenant_id:
+            response = JSONResponse(
+                {"detail": {"code": "TENANT_REQUIRED", "message": "缺少用户标识"}},
+                status_code=401,
+            )
+            await response(scope, receive, send)
+            return
+        if not TENANT_ID.match(tenant_id):
+            response = JSONResponse(
+                {"detail": {"code": "INVALID_TENANT", "message": "无效的用户标识"}},
+                status_code=400,
+            )
+            await response(scope, receive, send)
+            return
+
+        leases: List[Tuple[TenantConnection, object]] = []
+        token = _request_connections.set(leases)
+        try:
+            with use_tenant(tenant_id):
+                await self.app(scope, receive, send)
+        finally:
+            _request_connections.reset(token)
+            for conn, lease in leases:
+                conn.tenant.release(conn, lease)
+
+
+class TenantStaticFiles(StaticFiles):
+    """多用户模式下从当前用户的封面目录提供文件"""
+
+    def lookup_path(self, path: str):
+        tenant = current_tenant()
+        if tenant is None:
+            return super().lookup_path(path)
+        directory = os.path.realpath(tenant.covers_dir)
+        full_path = os.path.realpath(os.path.join(directory, path))
+        if os.path.commonpath([full_path, directory]) != directory:
+            return "", None
+        try:
+            return full_path, os.stat(full_path)
+        except (FileNotFoundError, NotADirectoryError):
+            return "", None
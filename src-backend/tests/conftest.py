@@ -0,0 +1,63 @@
+"""测试夹具
+
+main 等模块在导入时读取环境变量和 ~/.wordbook，因此在导入它们之前把 HOME
+指向临时目录、上游词典和发音地址指向 bench.upstream_stub 的替身服务，
+测试不会访问真实上游，也不会改动用户的数据。
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from bench.upstream_stub import UpstreamStub  # noqa: E402
+
+HOME = Path(tempfile.mkdtemp(prefix="wordbook-test-"))
+upstream = UpstreamStub().start()
+os.environ.update(
+    {
+        "HOME": str(HOME),
+        "WORDBOOK_WARM_PLATFORMS": "",
+        "WORDBOOK_MAINTENANCE": "0",
+        "WORDBOOK_UPSTREAM_RATE": "1000",
+        "WORDBOOK_UPSTREAM_BURST": "1000",
+        "WORDBOOK_UPSTREAM_MAX_RETRIES": "0",
+        **upstream.env(),
+    }
+)
+# main 挂载前端构建目录 dist/assets，在临时目录中准备一个空的构建
+(HOME / "dist" / "assets").mkdir(parents=True)
+os.chdir(HOME)
+
+
+@pytest.fixture
+def stub():
+    """上游替身服务，每个测试开始时清零请求数并恢复正常响应"""
+    upstream.hits = 0
+    upstream.status = 200
+    upstream.latency = 0.0
+    yield upstream
+    upstream.status = 200
+    upstream.latency = 0.0
+
+
+@pytest.fixture(scope="session")
+def client():
+    """执行过启动事件的后端测试客户端，所有测试共用 ~/.wordbook/wordbook.db"""
+    from fastapi.testclient import TestClient
+    from main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def notebook(client, request):
+    """新建的空词书 ID"""
+    response = client.post("/api/notebooks", json={"name": request.node.name})
+    return response.json()["notebook"]["id"]
@@ -0,0 +1,78 @@
+"""发音缓存：首次抓取、缓存命中、条件请求和 Range 请求"""
+
+import sqlite3
+
+from audio import AUDIO_DIR
+from bench.upstream_stub import AUDIO_BYTES, fake_audio
+from db import DB_PATH
+
+
+def cached_clips(word):
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        return conn.execute(
+            "SELECT accent, size FROM audio_clips WHERE word = ?", (word,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def test_first_fetch_is_cached(client, stub):
+    first = client.get("/api/audio/Echo")
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "audio/mpeg"
+    assert first.content == fake_audio("echo", "2")
+    assert stub.hits == 1
+
+    second = client.get("/api/audio/echo")
+    assert second.status_code == 200
+    assert second.content == first.content
+    assert second.headers["etag"] == first.headers["etag"]
+    assert stub.hits == 1
+    assert cached_clips("echo") == [("us", AUDIO_BYTES)]
+
+
+def test_if_none_match_returns_not_modified(client, stub):
+    etag = client.get("/api/audio/ripple", params={"accent": "uk"}).headers["etag"]
+
+    response = client.get(
+        "/api/audio/ripple", params={"accent": "uk"}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    other = client.get("/api/audio/ripple", headers={"If-None-Match": etag})
+    assert other.status_code == 200
+    assert stub.hits == 2
+
+
+def test_range_request_returns_partial_content(client, stub):
+    response = client.get("/api/audio/chime", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 100-199/{AUDIO_BYTES}"
+    assert response.content == fake_audio("chime", "2")[100:200]
+
+    tail = client.get("/api/audio/chime", headers={"Range": "bytes=-10"})
+    assert tail.status_code == 206
+    assert tail.headers["content-range"] == (
+        f"bytes {AUDIO_BYTES - 10}-{AUDIO_BYTES - 1}/{AUDIO_BYTES}"
+    )
+    assert stub.hits == 1
+
+
+def test_upstream_failure_leaves_no_cache_entry(client, stub):
+    files = set(AUDIO_DIR.rglob("*"))
+    stub.status = 500
+
+    response = client.get("/api/audio/static")
+    assert response.status_code == 502
+    assert response.json()["detail"]["code"] == "AUDIO_UNAVAILABLE"
+    assert cached_clips("static") == []
+    assert set(AUDIO_DIR.rglob("*")) == files
+
+    # 上游恢复后重新抓取
+    stub.status = 200
+    assert client.get("/api/audio/static").status_code == 200
+    assert stub.hits == 2
+    assert cached_clips("static") == [("us", AUDIO_BYTES)]
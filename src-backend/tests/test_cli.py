@@ -0,0 +1,128 @@
+"""离线管理命令：导入导出往返、合并和只读检查"""
+
+import csv
+import sqlite3
+
+import pytest
+
+import wordbook
+from migrations import LATEST_VERSION, schema_version
+
+WORDS = [
+    ("abacus", "算盘", "", "2024-03-01 08:00:00"),
+    ("bazaar", "集市", "逗号, 和\n换行", "2024-03-02 09:30:00"),
+    ("cipher", "", "没有释义", "2024-03-03 10:45:00"),
+]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "wordbook.db"
+
+
+def run(db_path, *args):
+    return wordbook.main(["--db", str(db_path), *map(str, args)])
+
+
+def entries(db_path, notebook_id):
+    conn = sqlite3.connect(str(db_path))
+    try:
+        return sorted(
+            conn.execute(
+                """
+                SELECT w.word, COALESCE(w.definition, ''), COALESCE(w.note, ''),
+                    we.add_time
+                FROM word_entries we JOIN words w ON w.id = we.word_id
+                WHERE we.notebook_id = ?
+                """,
+                (notebook_id,),
+            ).fetchall()
+        )
+    finally:
+        conn.close()
+
+
+def import_source(tmp_path, db_path, name, words=WORDS):
+    source = tmp_path / f"{name}.csv"
+    with open(source, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["单词", "释义", "笔记", "添加时间"])
+        writer.writerows(words)
+    assert run(db_path, "import", source, "--name", name) == 0
+
+
+@pytest.mark.parametrize("fmt", ["csv", "xlsx", "ndjson"])
+def test_export_then_import_round_trips(tmp_path, db_path, fmt):
+    import_source(tmp_path, db_path, "源")
+    original = entries(db_path, 1)
+    assert [row[0] for row in original] == ["abacus", "bazaar", "cipher"]
+
+    exported = tmp_path / f"export.{fmt}"
+    assert run(db_path, "export", 1, exported) == 0
+    assert run(db_path, "import", exported, "--name", "副本") == 0
+    assert entries(db_path, 2) == original
+
+    again = tmp_path / f"again.{fmt}"
+    assert run(db_path, "export", 2, again) == 0
+    if fmt != "xlsx":
+        # xlsx 中包含写入时间等元数据，只比较内容
+        assert again.read_bytes() == exported.read_bytes()
+
+
+def test_merge_delete_source_keeps_review_state(tmp_path, db_path, capsys):
+    import_source(tmp_path, db_path, "目标", WORDS[:1])
+    import_source(tmp_path, db_path, "来源", WORDS)
+    conn = sqlite3.connect(str(db_path))
+    conn.execute(
+        """
+        UPDATE review_state SET reps = 3, interval = 6, ease = 2.36,
+            due_at = '2024-04-01 00:00:00'
+        WHERE notebook_id = 2 AND word_id = (
+            SELECT id FROM words WHERE word = 'cipher'
+        )
+        """
+    )
+    conn.commit()
+    conn.close()
+
+    assert run(db_path, "merge", 2, 1, "--delete-source") == 0
+    assert "新增 2 个单词，已存在 1 个" in capsys.readouterr().out
+
+    conn = sqlite3.connect(str(db_path))
+    try:
+        assert conn.execute("SELECT id FROM notebooks").fetchall() == [(1,)]
+        state = conn.execute(
+            """
+            SELECT r.notebook_id, r.reps, r.interval, r.ease, r.due_at
+            FROM review_state r JOIN words w ON w.id = r.word_id
+            WHERE w.word = 'cipher'
+            """
+        ).fetchall()
+        assert state == [(1, 3, 6.0, 2.36, "2024-04-01 00:00:00")]
+    finally:
+        conn.close()
+    assert [row[0] for row in entries(db_path, 1)] == ["abacus", "bazaar", "cipher"]
+    assert run(db_path, "check") == 0
+
+
+def test_check_reports_outdated_schema_without_migrating(tmp_path, db_path, capsys):
+    import_source(tmp_path, db_path, "旧版本")
+    conn = sqlite3.connect(str(db_path))
+    conn.execute(f"PRAGMA user_version = {LATEST_VERSION - 1}")
+    conn.close()
+
+    assert run(db_path, "check") == 1
+    assert "需要迁移" in capsys.readouterr().out
+    assert run(db_path, "plans") == 1
+    assert "需要先迁移" in capsys.readouterr().out
+
+    conn = sqlite3.connect(str(db_path))
+    try:
+        assert schema_version(conn) == LATEST_VERSION - 1
+    finally:
+        conn.close()
+
+
+def test_plans_without_database_does_not_create_it(db_path):
+    assert run(db_path, "plans") == 0
+    assert not db_path.exists()
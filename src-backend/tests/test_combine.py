@@ -0,0 +1,135 @@
+"""词书的并集、交集、差集"""
+
+import sqlite3
+
+import pytest
+
+from bulk import check_database, combine_notebooks, import_rows
+from migrations import migrate
+
+NOTEBOOKS = {
+    1: ("甲", {"alpha": "01", "bravo": "02", "charlie": "03", "delta": "04"}),
+    2: ("乙", {"charlie": "01", "delta": "05", "echo": "06"}),
+    3: ("丙", {"delta": "02", "foxtrot": "07"}),
+    4: ("目标", {"alpha": "09", "zulu": "09"}),
+}
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """四本词书，单词有重叠，添加时间各不相同"""
+    conn = sqlite3.connect(str(tmp_path / "wordbook.db"))
+    conn.row_factory = sqlite3.Row
+    migrate(conn)
+    for notebook_id, (name, words) in NOTEBOOKS.items():
+        conn.execute(
+            "INSERT INTO notebooks (id, name) VALUES (?, ?)", (notebook_id, name)
+        )
+        conn.commit()
+        rows = enumerate(
+            (
+                {"word": word, "add_time": f"2024-01-{day} 08:00:00"}
+                for word, day in words.items()
+            ),
+            start=2,
+        )
+        assert import_rows(conn, notebook_id, rows)["added"] == len(words)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def entries(conn, notebook_id):
+    """词书中的 单词 -> 添加时间"""
+    return dict(
+        conn.execute(
+            """
+            SELECT w.word, we.add_time FROM word_entries we
+            JOIN words w ON w.id = we.word_id
+            WHERE we.notebook_id = ?
+            """,
+            (notebook_id,),
+        ).fetchall()
+    )
+
+
+def test_union_keeps_earliest_add_time(conn):
+    result = combine_notebooks(conn, "union", [1, 2])
+    assert (result["name"], result["added"]) == ("甲 ∪ 乙", 5)
+
+    combined = entries(conn, result["notebook_id"])
+    first, second = entries(conn, 1), entries(conn, 2)
+    assert sorted(combined) == ["alpha", "bravo", "charlie", "delta", "echo"]
+    assert combined["charlie"] == second["charlie"]
+    assert combined["delta"] == first["delta"]
+
+
+def test_intersection_needs_every_source(conn):
+    result = combine_notebooks(conn, "intersection", [1, 2, 3], name="都有")
+    assert (result["name"], result["added"]) == ("都有", 1)
+    assert list(entries(conn, result["notebook_id"])) == ["delta"]
+
+    # 重复的ID只计一次
+    result = combine_notebooks(conn, "intersection", [1, 2, 1])
+    assert sorted(entries(conn, result["notebook_id"])) == ["charlie", "delta"]
+
+
+def test_difference_subtracts_all_other_sources(conn):
+    result = combine_notebooks(conn, "difference", [1, 2, 3])
+    assert result["name"] == "甲 − 乙 − 丙"
+    assert sorted(entries(conn, result["notebook_id"])) == ["alpha", "bravo"]
+
+    result = combine_notebooks(conn, "difference", [3, 1])
+    assert list(entries(conn, result["notebook_id"])) == ["foxtrot"]
+
+
+def test_preview_counts_words_new_to_target(conn):
+    notebooks = conn.execute("SELECT COUNT(*) FROM notebooks").fetchone()[0]
+    before = entries(conn, 4)
+
+    assert combine_notebooks(conn, "union", [1, 2], preview=True) == {
+        "count": 5,
+        "added": 5,
+    }
+    preview = combine_notebooks(conn, "union", [1, 2], target_id=4, preview=True)
+    assert preview == {"count": 5, "added": 4}
+    # 预览不写入
+    assert conn.execute("SELECT COUNT(*) FROM notebooks").fetchone()[0] == notebooks
+    assert entries(conn, 4) == before
+
+    result = combine_notebooks(conn, "union", [1, 2], target_id=4)
+    assert result == {"notebook_id": 4, "name": "目标", "added": 4}
+    after = entries(conn, 4)
+    assert len(after) == 6
+    # 目标中已有的单词保持原来的添加时间
+    assert after["alpha"] == before["alpha"]
+
+
+def test_inserted_entries_get_review_state(conn):
+    created = combine_notebooks(conn, "union", [1, 2, 3])["notebook_id"]
+    combine_notebooks(conn, "difference", [2, 1], target_id=4)
+
+    for notebook_id in (created, 4):
+        missing = conn.execute(
+            """
+            SELECT COUNT(*) FROM word_entries we
+            WHERE we.notebook_id = ? AND NOT EXISTS (
+                SELECT 1 FROM review_state r
+                WHERE r.word_id = we.word_id AND r.notebook_id = we.notebook_id
+            )
+            """,
+            (notebook_id,),
+        ).fetchone()[0]
+        assert missing == 0
+    assert len(entries(conn, created)) == 6
+    assert sorted(entries(conn, 4)) == ["alpha", "echo", "zulu"]
+    assert check_database(conn)["errors"] == []
+
+
+@pytest.mark.parametrize(
+    "operation, sources", [("symmetric", [1, 2]), ("union", [1]), ("union", [2, 2])]
+)
+def test_invalid_combinations_are_rejected(conn, operation, sources):
+    with pytest.raises(ValueError):
+        combine_notebooks(conn, operation, sources)
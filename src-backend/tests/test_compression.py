@@ -0,0 +1,33 @@
+"""按内容类型选择性 gzip 压缩"""
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+def test_json_response_is_compressed(client, notebook):
+    for i in range(40):
+        client.post(
+            f"/api/notebooks/{notebook}/words",
+            json={"word": f"gzip{i:02d}", "definition": "n. 压缩测试用的释义"},
+        )
+
+    response = client.get(f"/api/notebooks/{notebook}/words", headers=GZIP)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/json")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["total"] == 40
+
+
+def test_xlsx_export_is_not_compressed(client, notebook):
+    client.post(f"/api/notebooks/{notebook}/words", json={"word": "spreadsheet"})
+
+    response = client.get(f"/api/notebooks/{notebook}/export", headers=GZIP)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/vnd.openxmlformats")
+    assert int(response.headers["content-length"]) > 1024
+    assert "content-encoding" not in response.headers
+    assert response.content.startswith(b"PK")
+
+
+def test_small_response_is_not_compressed(client):
+    response = client.get("/api/notebooks/0/words", headers=GZIP)
+    assert "content-encoding" not in response.headers
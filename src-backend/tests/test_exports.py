@@ -0,0 +1,118 @@
+"""异步导出任务：进度、断点续传和导出文件的复用"""
+
+import threading
+import time
+
+import pytest
+
+import exports
+import main
+from exports import export_jobs
+
+
+@pytest.fixture
+def words(client, notebook):
+    """有三个单词的词书 ID"""
+    for word in ("quince", "rhubarb", "sorrel"):
+        response = client.post(f"/api/notebooks/{notebook}/words", json={"word": word})
+        assert response.status_code == 200
+    return notebook
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    """写完 Excel 后停在 running 状态，直到测试放行"""
+    release = threading.Event()
+    build = exports.build_notebook
+
+    def gated(job, path):
+        build(job, path)
+        release.wait(10)
+
+    monkeypatch.setattr(exports, "build_notebook", gated)
+    yield release
+    release.set()
+
+
+def wait_done(client, job_id):
+    for _ in range(200):
+        job = client.get(f"/api/exports/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("导出任务没有完成")
+
+
+def test_job_reports_progress(client, words, gate):
+    response = client.post(f"/api/notebooks/{words}/export")
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    for _ in range(200):
+        job = client.get(f"/api/exports/{job_id}").json()
+        if job["processed"] == 3:
+            break
+        time.sleep(0.05)
+    assert job["status"] == "running"
+    assert (job["total"], job["unit"], job["download_url"]) == (3, "rows", None)
+    assert client.get(f"/api/exports/{job_id}/download").status_code == 409
+
+    gate.set()
+    job = wait_done(client, job_id)
+    assert job["status"] == "done"
+    assert job["processed"] == job["total"] == 3
+    assert job["download_url"] == f"/api/exports/{job_id}/download"
+
+
+def test_get_export_returns_job_when_slow(client, words, gate, monkeypatch):
+    monkeypatch.setattr(main, "EXPORT_WAIT_SECONDS", 0.1)
+    response = client.get(f"/api/notebooks/{words}/export")
+    assert response.status_code == 202
+    job = response.json()
+    assert response.headers["location"] == f"/api/exports/{job['id']}"
+
+    gate.set()
+    assert wait_done(client, job["id"])["status"] == "done"
+    # 完成后再次请求直接返回文件
+    response = client.get(f"/api/notebooks/{words}/export")
+    assert response.status_code == 200
+    assert response.content[:2] == b"PK"
+
+
+def test_download_resumes_with_range(client, words):
+    job = client.post(f"/api/notebooks/{words}/export").json()
+    url = wait_done(client, job["id"])["download_url"]
+    full = client.get(url).content
+
+    head = client.get(url, headers={"Range": "bytes=0-9"})
+    assert head.status_code == 206
+    assert head.headers["content-range"] == f"bytes 0-9/{len(full)}"
+    tail = client.get(url, headers={"Range": "bytes=10-"})
+    assert tail.status_code == 206
+    assert head.content + tail.content == full
+
+
+def test_unchanged_data_reuses_artifact(client, words, monkeypatch):
+    first = client.post(f"/api/notebooks/{words}/export").json()
+    first = wait_done(client, first["id"])
+    artifact = export_jobs.get(first["id"]).artifact
+    modified = artifact.stat().st_mtime_ns
+
+    again = client.post(f"/api/notebooks/{words}/export").json()
+    assert again["id"] == first["id"]
+
+    # 重启后任务记录丢失，已有的文件作为缓存直接完成
+    monkeypatch.setattr(export_jobs, "_jobs", type(export_jobs._jobs)())
+    restarted = client.post(f"/api/notebooks/{words}/export").json()
+    assert restarted["id"] != first["id"]
+    assert (restarted["status"], restarted["cached"]) == ("done", True)
+    assert export_jobs.get(restarted["id"]).artifact == artifact
+    assert artifact.stat().st_mtime_ns == modified
+
+    # 数据变化后生成新文件
+    client.post(f"/api/notebooks/{words}/words", json={"word": "tamarind"})
+    changed = wait_done(
+        client, client.post(f"/api/notebooks/{words}/export").json()["id"]
+    )
+    assert changed["total"] == 4
+    assert export_jobs.get(changed["id"]).artifact != artifact
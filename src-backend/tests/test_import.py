@@ -0,0 +1,142 @@
+"""导入 Excel 词书：行号与合并统计"""
+
+import io
+import tracemalloc
+import zipfile
+
+from openpyxl import Workbook
+
+from bulk import read_rows
+
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def xlsx_file(rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def test_import_xlsx_reports_sheet_row_numbers(client, notebook):
+    content = xlsx_file(
+        [
+            ["单词", "释义", "笔记"],
+            ["Apple", "苹果", None],
+            [None, None, None],
+            [None, None, "没有单词"],
+            ["apple", None, None],
+            ["pear", "梨", "水果"],
+        ]
+    )
+    response = client.post(
+        f"/api/notebooks/{notebook}/import",
+        files={"file": ("words.xlsx", content, XLSX_TYPE)},
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["added"], report["duplicates"], report["error_count"]) == (2, 1, 1)
+    # 空行不计入统计，但行号仍与工作表一致
+    assert [error["row"] for error in report["errors"]] == [4]
+
+    words = client.get(f"/api/notebooks/{notebook}/words").json()["words"]
+    assert sorted(word["word"] for word in words) == ["Apple", "pear"]
+
+
+def sheet_xlsx(path, rows):
+    """直接写出只有一个工作表、使用行内字符串的 xlsx，生成大文件比 openpyxl 快"""
+    ns = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    rel_ns = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    pkg_ns = 'xmlns="http://schemas.openxmlformats.org/package/2006/relationships"'
+    types = "http://schemas.openxmlformats.org/package/2006/content-types"
+    main = "application/vnd.openxmlformats-officedocument.spreadsheetml"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(
+            "[Content_Types].xml",
+            f'<Types xmlns="{types}">'
+            '<Default Extension="rels" '
+            'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            f'<Override PartName="/xl/workbook.xml" ContentType="{main}.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            f'ContentType="{main}.worksheet+xml"/></Types>',
+        )
+        archive.writestr(
+            "_rels/.rels",
+            f'<Relationships {pkg_ns}><Relationship Id="rId1" '
+            f'Type="{rel_ns}/officeDocument" Target="xl/workbook.xml"/>'
+            "</Relationships>",
+        )
+        archive.writestr(
+            "xl/workbook.xml",
+            f'<workbook {ns} xmlns:r="{rel_ns}"><sheets>'
+            '<sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>',
+        )
+        archive.writestr(
+            "xl/_rels/workbook.xml.rels",
+            f'<Relationships {pkg_ns}><Relationship Id="rId1" '
+            f'Type="{rel_ns}/worksheet" Target="worksheets/sheet1.xml"/>'
+            "</Relationships>",
+        )
+        with archive.open("xl/worksheets/sheet1.xml", "w") as f:
+            f.write(f"<worksheet {ns}><sheetData>".encode())
+            for number, row in enumerate(rows, start=1):
+                cells = "".join(
+                    f'<c t="inlineStr"><is><t>{value}</t></is></c>' for value in row
+                )
+                f.write(f'<row r="{number}">{cells}</row>'.encode())
+            f.write(b"</sheetData></worksheet>")
+
+
+def peak_memory_reading(path):
+    tracemalloc.start()
+    try:
+        count = sum(1 for _ in read_rows(path, "xlsx"))
+        return count, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_xlsx_memory_does_not_grow_with_rows(tmp_path):
+    peaks = []
+    for rows in (2000, 20000):
+        path = tmp_path / f"{rows}.xlsx"
+        sheet_xlsx(
+            path,
+            [("单词", "释义")] + [(f"word{i}", f"释义 {i}") for i in range(rows)],
+        )
+        count, peak = peak_memory_reading(path)
+        assert count == rows
+        peaks.append(peak)
+    # 行数增加十倍，峰值内存基本不变
+    assert peaks[1] < peaks[0] + 512 * 1024
+
+
+def test_unreadable_tail_reports_rows_already_imported(client, notebook):
+    lines = ["单词,释义"] + [f"tail{i},释义 {i}" for i in range(300)]
+    content = "\n".join(lines).encode() + b"\n\xff\xfe,bad\n"
+    response = client.post(
+        f"/api/notebooks/{notebook}/import",
+        files={"file": ("words.csv", content, "text/csv")},
+    )
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert detail["code"] == "IMPORT_INCOMPLETE"
+    # 解码按块进行，与坏字节在同一块中的几行读不到；报告的就是实际导入的行
+    imported = detail["report"]["added"]
+    assert 250 < imported == detail["report"]["rows"]
+    assert detail["report"]["aborted"] == "文件不是 UTF-8 编码"
+
+    listed = client.get(f"/api/notebooks/{notebook}/words", params={"limit": 0})
+    assert listed.json()["total"] == imported
+
+
+def test_missing_word_column_imports_nothing(client, notebook):
+    response = client.post(
+        f"/api/notebooks/{notebook}/import",
+        files={"file": ("words.csv", "释义\n甲\n".encode(), "text/csv")},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"]["code"] == "INVALID_FILE"
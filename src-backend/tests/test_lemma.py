@@ -0,0 +1,172 @@
+"""屈折形式还原为词头"""
+
+import sqlite3
+
+import pytest
+from db import DB_PATH
+from lemma import init_lemma_tables, lemma_candidates, resolve_headword
+
+# (词形, 与其词干相近的已保存单词, 真正的原形)
+MISLEADING_STEMS = [
+    ("using", "us", "use"),
+    ("used", "us", "use"),
+    ("caring", "car", "care"),
+    ("cared", "car", "care"),
+    ("hoping", "hop", "hope"),
+    ("biting", "bit", "bite"),
+    ("planed", "plan", "plane"),
+]
+
+DICTIONARY = {
+    "us", "use", "car", "care", "hop", "hope", "bit", "bite", "plan",
+    "plane", "interest", "interesting", "run", "study",
+}  # fmt: skip
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        """
+        CREATE TABLE words (
+            id INTEGER PRIMARY KEY, word TEXT UNIQUE, definition TEXT, note TEXT
+        )
+        """
+    )
+    init_lemma_tables(conn)
+    yield conn
+    conn.close()
+
+
+def save(conn, *words):
+    conn.executemany("INSERT INTO words (word) VALUES (?)", [(w,) for w in words])
+
+
+@pytest.mark.parametrize(
+    "word, expected",
+    [
+        ("hoping", ["hope", "hop"]),
+        ("caring", ["care", "car"]),
+        ("planed", ["plane", "plan"]),
+        ("using", ["use"]),
+        ("used", ["use"]),
+        ("running", ["run", "runn", "runne"]),
+        ("interesting", ["interest", "intereste"]),
+        ("studied", ["study", "studie"]),
+    ],
+)
+def test_candidate_order(word, expected):
+    assert lemma_candidates(word) == expected
+
+
+@pytest.mark.parametrize("word, saved, lemma", MISLEADING_STEMS)
+def test_saved_stem_is_not_accepted_without_dictionary(conn, word, saved, lemma):
+    save(conn, saved)
+    assert resolve_headword(conn, word) == word
+
+
+@pytest.mark.parametrize("word, saved, lemma", MISLEADING_STEMS)
+def test_dictionary_confirms_the_real_lemma(conn, word, saved, lemma):
+    save(conn, saved)
+    assert resolve_headword(conn, word, DICTIONARY.__contains__) == lemma
+
+
+def test_word_in_dictionary_is_its_own_headword(conn):
+    save(conn, "interest")
+    assert resolve_headword(conn, "interesting") == "interesting"
+    assert resolve_headword(conn, "interesting", DICTIONARY.__contains__) == (
+        "interesting"
+    )
+
+
+def test_confirmed_lemma_uses_saved_spelling(conn):
+    save(conn, "Run")
+    assert resolve_headword(conn, "running", DICTIONARY.__contains__) == "Run"
+    assert resolve_headword(conn, "Runs") == "Run"
+    assert resolve_headword(conn, "ran") == "Run"
+
+
+def test_adding_inflection_does_not_overwrite_similar_word(client, notebook):
+    client.post(
+        f"/api/notebooks/{notebook}/words",
+        json={"word": "car", "definition": "n. 汽车"},
+    )
+    response = client.post(
+        f"/api/notebooks/{notebook}/words",
+        json={"word": "caring", "definition": "adj. 关心他人的"},
+    )
+    assert response.json()["word"] == "caring"
+
+    words = client.get(f"/api/notebooks/{notebook}/words").json()["words"]
+    assert {w["word"]: w["definition"] for w in words} == {
+        "car": "n. 汽车",
+        "caring": "adj. 关心他人的",
+    }
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        forms = conn.execute(
+            "SELECT form FROM word_forms WHERE headword = 'car'"
+        ).fetchall()
+    finally:
+        conn.close()
+    assert forms == []
+
+
+def test_translate_does_not_reuse_stem_cache(client, stub):
+    assert client.get("/api/translate", params={"word": "us"}).status_code == 200
+    response = client.get("/api/translate", params={"word": "using"})
+    assert response.status_code == 200
+    assert response.json()["word"] == "using"
+    assert stub.hits == 2
+
+
+def db_rows(sql, *params):
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def test_base_form_added_last_absorbs_saved_inflections(client, notebook):
+    other = client.post("/api/notebooks", json={"name": "absorb-other"}).json()[
+        "notebook"
+    ]["id"]
+    client.post(
+        f"/api/notebooks/{notebook}/words",
+        json={"word": "Jogging", "note": "晨练"},
+    )
+    client.post(f"/api/notebooks/{other}/words", json={"word": "jogs"})
+    response = client.post(
+        f"/api/notebooks/{notebook}/words",
+        json={"word": "jog", "definition": "v. 慢跑"},
+    )
+    assert response.json()["word"] == "jog"
+
+    for notebook_id in (notebook, other):
+        words = client.get(f"/api/notebooks/{notebook_id}/words").json()["words"]
+        assert [(w["word"], w["definition"]) for w in words] == [("jog", "v. 慢跑")]
+    assert "晨练" in words[0]["note"]
+
+    assert db_rows("SELECT word FROM words WHERE word LIKE 'jog%'") == [("jog",)]
+    assert sorted(
+        db_rows("SELECT form, headword FROM word_forms WHERE form LIKE 'jog%'")
+    ) == [
+        ("jogging", "jog"),
+        ("jogs", "jog"),
+    ]
+    (word_id,) = db_rows("SELECT id FROM words WHERE word = 'jog'")[0]
+    assert sorted(
+        db_rows("SELECT notebook_id FROM review_state WHERE word_id = ?", word_id)
+    ) == sorted([(notebook,), (other,)])
+
+    # 之后再输入这些词形都归入 jog
+    response = client.post(f"/api/notebooks/{notebook}/words", json={"word": "jogged"})
+    assert response.json()["word"] == "jog"
+
+
+def test_base_form_does_not_absorb_look_alike(client, notebook):
+    client.post(f"/api/notebooks/{notebook}/words", json={"word": "caring"})
+    client.post(f"/api/notebooks/{notebook}/words", json={"word": "car"})
+    words = client.get(f"/api/notebooks/{notebook}/words").json()["words"]
+    assert sorted(w["word"] for w in words) == ["car", "caring"]
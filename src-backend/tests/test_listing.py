@@ -0,0 +1,114 @@
+"""单词列表的查询计划与分页"""
+
+import json
+import sqlite3
+
+import pytest
+
+import main
+from bulk import import_rows
+from db import DB_PATH
+from listing import WordListing, check_query_plans
+from migrations import migrate
+
+
+@pytest.fixture
+def seeded(tmp_path):
+    """一个词书里有数百个单词，笔记、释义和添加时间各不相同"""
+    conn = sqlite3.connect(str(tmp_path / "wordbook.db"))
+    conn.row_factory = sqlite3.Row
+    migrate(conn)
+    conn.execute("INSERT INTO notebooks (id, name) VALUES (1, 'plans')")
+    conn.commit()
+    rows = (
+        (
+            number,
+            {
+                "word": f"word{number:04d}",
+                "definition": f"释义 {number}" if number % 2 else "",
+                "note": f"笔记 {number}" if number % 3 == 0 else "",
+                "add_time": f"2024-{number % 12 + 1:02d}-{number % 28 + 1:02d}",
+            },
+        )
+        for number in range(2, 502)
+    )
+    assert import_rows(conn, 1, rows)["added"] == 500
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def test_every_listing_uses_its_index(seeded):
+    assert check_query_plans(seeded) == []
+    # 后台维护执行 ANALYZE 之后的统计信息也不能让计划退回全表扫描
+    seeded.execute("ANALYZE")
+    assert check_query_plans(seeded) == []
+
+
+def test_limit_zero_returns_no_words(client, notebook):
+    for word in ("alpha", "beta", "gamma"):
+        client.post(f"/api/notebooks/{notebook}/words", json={"word": word})
+
+    words = client.get(f"/api/notebooks/{notebook}/words", params={"limit": 0})
+    assert words.json()["words"] == []
+    assert words.json()["total"] == 3
+
+    everything = client.get(f"/api/notebooks/{notebook}/words")
+    assert len(everything.json()["words"]) == 3
+    page = client.get(
+        f"/api/notebooks/{notebook}/words", params={"limit": 1, "offset": 2}
+    )
+    assert len(page.json()["words"]) == 1
+
+
+def stream_words(client, notebook, **params):
+    response = client.get(
+        f"/api/notebooks/{notebook}/words", params={"stream": 1, **params}
+    )
+    return [json.loads(line)["word"] for line in response.text.splitlines()]
+
+
+def test_stream_pages_match_listing(client, notebook, monkeypatch):
+    monkeypatch.setattr(main, "STREAM_BATCH_SIZE", 2)
+    for word in ("delta", "Alpha", "echo", "bravo", "charlie", "fig", "ab"):
+        client.post(f"/api/notebooks/{notebook}/words", json={"word": word})
+
+    for params in (
+        {},
+        {"sort": "word"},
+        {"sort": "length", "order": "desc"},
+        {"sort": "word", "limit": 3, "offset": 1},
+        {"sort": "word", "limit": 4},
+        {"limit": 0},
+    ):
+        listed = client.get(f"/api/notebooks/{notebook}/words", params=params)
+        expected = [word["word"] for word in listed.json()["words"]]
+        assert stream_words(client, notebook, **params) == expected
+
+
+def test_stream_does_not_hold_read_lock_between_pages(client, notebook, monkeypatch):
+    monkeypatch.setattr(main, "STREAM_BATCH_SIZE", 2)
+    for word in ("one", "two", "three", "four", "five"):
+        client.post(f"/api/notebooks/{notebook}/words", json={"word": word})
+
+    conn = main.get_db_connection(check_same_thread=False)
+    pages = main.iter_ndjson(conn, WordListing(notebook, "word"), None, None)
+    first = next(pages)
+
+    # 客户端还没读完时，其他连接可以立即写入
+    writer = sqlite3.connect(DB_PATH, timeout=0)
+    try:
+        writer.execute("UPDATE notebooks SET name = name WHERE id = ?", (notebook,))
+        writer.commit()
+    finally:
+        writer.close()
+
+    lines = first + "".join(pages)
+    assert [json.loads(line)["word"] for line in lines.splitlines()] == [
+        "five",
+        "four",
+        "one",
+        "three",
+        "two",
+    ]
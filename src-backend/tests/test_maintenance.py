@@ -0,0 +1,35 @@
+"""多用户模式下各用户数据库的后台维护"""
+
+import time
+
+from db import get_db_connection
+from maintenance import TASKS, maintenance
+from tenants import use_tenant
+
+
+def tenant_rows(tenant_id, sql):
+    with use_tenant(tenant_id):
+        conn = get_db_connection()
+        try:
+            return [tuple(row) for row in conn.execute(sql)]
+        finally:
+            conn.close()
+
+
+def test_due_tasks_run_in_recently_active_tenant_databases(client):
+    # 在上一轮检查之前打开、之后没有请求的用户不会被维护
+    tenant_rows("maint-idle", "SELECT 1")
+    since = time.monotonic()
+
+    with use_tenant("maint-active"):
+        conn = get_db_connection()
+        conn.execute("INSERT INTO words (word) VALUES ('orphaned')")
+        conn.commit()
+        conn.close()
+
+    maintenance.run_due_tenants(since)
+
+    logged = tenant_rows("maint-active", "SELECT task, error FROM maintenance_log")
+    assert sorted(logged) == sorted((task, None) for task in TASKS)
+    assert tenant_rows("maint-active", "SELECT word FROM words") == []
+    assert tenant_rows("maint-idle", "SELECT task FROM maintenance_log") == []
@@ -0,0 +1,63 @@
+"""数据库语句耗时包括读取结果行的时间"""
+
+import sqlite3
+import time
+
+import pytest
+
+import metrics
+from metrics import DB_STATEMENTS, InstrumentedConnection
+
+ROW_SECONDS = 0.01
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:", factory=InstrumentedConnection)
+    conn.execute("CREATE TABLE numbers (n INTEGER)")
+    conn.executemany("INSERT INTO numbers VALUES (?)", [(i,) for i in range(10)])
+    # 每读一行耗时 ROW_SECONDS，execute() 只读到第一行
+    conn.create_function("slow", 1, lambda n: time.sleep(ROW_SECONDS) or n)
+    yield conn
+    conn.close()
+
+
+def select_observations():
+    series = DB_STATEMENTS._values.get(("select",), [0, 0])
+    return series[-1], series[-2]
+
+
+@pytest.mark.parametrize(
+    "read",
+    [
+        lambda cursor: cursor.fetchall(),
+        lambda cursor: list(cursor),
+        lambda cursor: [cursor.fetchmany(3) for _ in range(4)],
+        lambda cursor: [cursor.fetchone() for _ in range(11)],
+    ],
+    ids=["fetchall", "iterate", "fetchmany", "fetchone"],
+)
+def test_select_time_includes_reading_rows(conn, read):
+    count, total = select_observations()
+    read(conn.execute("SELECT slow(n) FROM numbers"))
+    new_count, new_total = select_observations()
+    assert new_count == count + 1
+    assert new_total - total >= 10 * ROW_SECONDS
+
+
+def test_unfinished_select_is_recorded_when_released(conn):
+    count, total = select_observations()
+    assert conn.execute("SELECT slow(n) FROM numbers").fetchone() == (0,)
+    assert select_observations()[0] == count + 1
+
+
+def test_slow_scan_is_logged_after_it_finishes(conn, monkeypatch):
+    logged = []
+    monkeypatch.setattr(metrics, "SLOW_QUERY_SECONDS", 5 * ROW_SECONDS)
+    monkeypatch.setattr(
+        metrics, "log_slow_query", lambda conn, sql, params, elapsed: logged.append(sql)
+    )
+    cursor = conn.execute("SELECT slow(n) FROM numbers")
+    assert logged == []
+    cursor.fetchall()
+    assert logged == ["SELECT slow(n) FROM numbers"]
@@ -0,0 +1,51 @@
+"""性能分析：同一时间只分析一个请求"""
+
+import asyncio
+import threading
+
+import profiling
+from profiling import _profile_requested, profiled
+
+
+def test_overlapping_requests_are_not_profiled_twice(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path)
+    entered, release = threading.Event(), threading.Event()
+
+    @profiled("slow")
+    def slow():
+        entered.set()
+        release.wait(5)
+        return "slow"
+
+    @profiled("quick")
+    def quick():
+        return "quick"
+
+    @profiled("async")
+    async def quick_async():
+        return "async"
+
+    def request():
+        _profile_requested.set(True)
+        results.append(slow())
+
+    results = []
+    worker = threading.Thread(target=request)
+    worker.start()
+    assert entered.wait(5)
+
+    token = _profile_requested.set(True)
+    try:
+        # 分析进行中时其他请求照常执行，不再启动第二个分析器
+        assert quick() == "quick"
+        assert asyncio.run(quick_async()) == "async"
+        release.set()
+        worker.join(5)
+        assert results == ["slow"]
+        assert [path.name.split("_")[1] for path in tmp_path.glob("*.prof")] == ["slow"]
+
+        assert quick() == "quick"
+        assert len(list(tmp_path.glob("*_quick_*.prof"))) == 1
+    finally:
+        _profile_requested.reset(token)
+        release.set()
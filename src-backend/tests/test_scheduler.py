@@ -0,0 +1,95 @@
+"""上游请求调度器：限速、优先级、重试和排队耗时"""
+
+import os
+import threading
+import time
+
+import pytest
+
+import scheduler
+from metrics import UPSTREAM_LATENCY
+from scheduler import BACKGROUND, INTERACTIVE, OutboundScheduler
+
+URL = os.environ["WORDBOOK_YOUDAO_URL"]
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(scheduler, "RETRY_BASE_DELAY", 0.01)
+
+
+def observations(provider, phase):
+    series = UPSTREAM_LATENCY._values.get((provider, phase), [0, 0])
+    return series[-1], series[-2]
+
+
+def test_token_bucket_caps_request_rate(stub):
+    outbound = OutboundScheduler(rate=20, burst=2, max_retries=0)
+    start = time.monotonic()
+    for _ in range(8):
+        assert outbound.get("rate", URL).status_code == 200
+    # 前 2 个请求用掉桶中的令牌，之后每秒 20 个
+    assert time.monotonic() - start >= (8 - 2) / 20 * 0.9
+    assert stub.hits == 8
+    assert outbound.stats()["rate"]["requests"] == 8
+
+
+def test_interactive_requests_run_before_background(stub):
+    outbound = OutboundScheduler(rate=5, burst=1, max_retries=0)
+    outbound.get("priority", URL)  # 用掉唯一的令牌，之后的请求都要排队
+    order = []
+
+    def fetch(label, priority):
+        outbound.get("priority", URL, priority=priority)
+        order.append(label)
+
+    threads = [
+        threading.Thread(target=fetch, args=(f"background{i}", BACKGROUND))
+        for i in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for _ in range(100):
+        if outbound.stats()["priority"]["queue_depth"] == 3:
+            break
+        time.sleep(0.01)
+    assert outbound.stats()["priority"]["queue_depth"] == 3
+
+    threads.append(threading.Thread(target=fetch, args=("interactive", INTERACTIVE)))
+    threads[-1].start()
+    for thread in threads:
+        thread.join(5)
+    assert order[0] == "interactive"
+    assert sorted(order[1:]) == ["background0", "background1", "background2"]
+
+
+@pytest.mark.parametrize("max_retries", [0, 2])
+def test_retries_stop_at_limit(stub, max_retries):
+    stub.status = 503
+    outbound = OutboundScheduler(rate=1000, burst=1000, max_retries=max_retries)
+    response = outbound.get("retry", URL)
+
+    assert response.status_code == 503
+    assert stub.hits == max_retries + 1
+    stats = outbound.stats()["retry"]
+    assert (stats["requests"], stats["retries"], stats["failures"]) == (
+        max_retries + 1,
+        max_retries,
+        1,
+    )
+
+
+def test_queue_wait_is_recorded_apart_from_fetch(stub):
+    outbound = OutboundScheduler(rate=4, burst=1, max_retries=0)
+    queued, queued_seconds = observations("phases", "queue")
+    fetched, fetched_seconds = observations("phases", "fetch")
+
+    outbound.get("phases", URL)
+    outbound.get("phases", URL)  # 等待约 0.25 秒才有令牌
+
+    count, seconds = observations("phases", "queue")
+    assert count - queued == 2
+    assert seconds - queued_seconds >= 0.2
+    count, seconds = observations("phases", "fetch")
+    assert count - fetched == 2
+    assert seconds - fetched_seconds < 0.2
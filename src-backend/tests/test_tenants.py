@@ -0,0 +1,84 @@
+"""替换用户数据文件期间的并发请求"""
+
+import os
+import sqlite3
+import threading
+
+import tenants
+from tenants import tenant_cache
+
+
+def marker(tenant):
+    conn = tenant.connect()
+    try:
+        return conn.execute("SELECT value FROM marker").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_requests_wait_for_database_swap(client, tmp_path):
+    tenant = tenant_cache.get("swap")
+    conn = tenant.connect()
+    conn.execute("CREATE TABLE marker (value TEXT)")
+    conn.execute("INSERT INTO marker VALUES ('old')")
+    conn.commit()
+    conn.close()
+
+    replacement = tmp_path / "wordbook.db"
+    new = sqlite3.connect(replacement)
+    new.execute("CREATE TABLE marker (value TEXT)")
+    new.execute("INSERT INTO marker VALUES ('new')")
+    new.commit()
+    new.close()
+
+    seen = []
+    reader = threading.Thread(
+        target=lambda: seen.append(marker(tenant_cache.get("swap")))
+    )
+    with tenant_cache.replacing("swap", timeout=1) as released:
+        assert released
+        # 替换完成前取得该用户的请求等待，不会重新打开旧文件
+        reader.start()
+        reader.join(0.3)
+        assert reader.is_alive()
+        os.replace(replacement, tenant.db_path)
+    reader.join(5)
+
+    assert seen == ["new"]
+    assert tenant_cache.get("swap") is not tenant
+
+
+def test_replacing_without_tenant_is_a_no_op(client):
+    with tenant_cache.replacing(None) as released:
+        assert released
+
+
+def test_error_responses_return_their_connections(client, monkeypatch):
+    monkeypatch.setattr(tenants, "TENANT_MODE", True)
+    headers = {"X-Wordbook-User": "leaky"}
+    for _ in range(3):
+        response = client.post(
+            "/api/notebooks/999/words", json={"word": "apple"}, headers=headers
+        )
+        assert response.status_code == 404
+
+    # 打开用户时补齐反查索引的后台线程也会短暂使用连接
+    assert tenant_cache.get("leaky").wait_released(5)
+
+
+def test_closing_twice_releases_once(client):
+    tenant = tenant_cache.get("twice")
+    assert tenant.wait_released(5)
+    first = tenant.connect()
+    stale = first.lease
+    first.close()
+    first.close()
+    assert tenant.in_use == 0
+
+    # 连接归还后被再次取出，旧的 lease 不能把它归还
+    second = tenant.connect()
+    assert second is first
+    tenant.release(second, stale)
+    assert tenant.in_use == 1
+    second.close()
+    assert tenant.in_use == 0
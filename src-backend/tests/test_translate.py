@@ -0,0 +1,63 @@
+"""/api/translate 合并并发的相同请求"""
+
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from db import DB_PATH
+
+CONCURRENCY = 8
+
+
+def translate_concurrently(client, word):
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        return list(
+            pool.map(
+                lambda _: client.get("/api/translate", params={"word": word}),
+                range(CONCURRENCY),
+            )
+        )
+
+
+def cached_translations(word):
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        return conn.execute(
+            "SELECT COUNT(*) FROM translations WHERE word = ?", (word,)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_concurrent_lookups_hit_upstream_once(client, stub):
+    # 上游延迟使所有请求在第一个请求返回前到达
+    stub.latency = 0.5
+    responses = translate_concurrently(client, "coalesce")
+
+    assert [r.status_code for r in responses] == [200] * CONCURRENCY
+    assert {r.json()["translation"] for r in responses} == {
+        responses[0].json()["translation"]
+    }
+    assert stub.hits == 1
+
+    # 之后的请求命中缓存
+    assert client.get("/api/translate", params={"word": "coalesce"}).status_code == 200
+    assert stub.hits == 1
+
+
+def test_upstream_error_reaches_every_waiter_and_is_not_cached(client, stub):
+    stub.latency = 0.5
+    stub.status = 404
+    responses = translate_concurrently(client, "outage")
+
+    assert [r.status_code for r in responses] == [500] * CONCURRENCY
+    assert {r.json()["detail"]["code"] for r in responses} == {"SEARCH_ERROR"}
+    assert stub.hits == 1
+    assert cached_translations("outage") == 0
+
+    # 上游恢复后重新请求上游，而不是返回缓存的错误
+    stub.latency = 0.0
+    stub.status = 200
+    response = client.get("/api/translate", params={"word": "outage"})
+    assert response.status_code == 200
+    assert stub.hits == 2
+    assert cached_translations("outage") == 1
@@ -0,0 +1,77 @@
+"""预热队列与翻译缓存使用相同的键"""
+
+import sqlite3
+import threading
+import time
+
+from db import DB_PATH
+from warmup import MAX_ATTEMPTS, enqueue_words, runner
+
+
+def drain_warm_jobs(timeout=5.0):
+    """等待后台预热线程（enqueue_words 会唤醒它）执行完队列"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            if not conn.execute("SELECT COUNT(*) FROM warm_jobs").fetchone()[0]:
+                return
+        finally:
+            conn.close()
+        time.sleep(0.05)
+    raise AssertionError("预热队列未清空")
+
+
+def test_enqueue_folds_words_for_every_platform(client, stub):
+    assert enqueue_words(["Apple", "APPLE", "apple"], ["youdao", "audio-us"]) == 2
+
+    drain_warm_jobs()
+    assert stub.hits == 2
+
+    # 查询时的缓存键是折叠后的词头，预热过的单词不再请求上游
+    for word in ("Apple", "apple"):
+        assert client.get("/api/translate", params={"word": word}).status_code == 200
+    assert client.get("/api/audio/APPLE").status_code == 200
+    assert stub.hits == 2
+
+
+def wait_for_jobs(timeout=5.0):
+    """等待后台预热线程执行完所有待执行的任务，返回剩下的（失败的）任务"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            rows = conn.execute("SELECT word, status FROM warm_jobs").fetchall()
+        finally:
+            conn.close()
+        if all(status == "failed" for _, status in rows):
+            return rows
+        time.sleep(0.05)
+    raise AssertionError("预热队列未执行完")
+
+
+def test_concurrent_runners_claim_each_job_once(client, stub):
+    words = [f"claim{i}" for i in range(30)]
+    assert enqueue_words(words, ["youdao"]) == len(words)
+
+    # 与后台线程同时领取，模拟服务运行时执行 python warmup.py --run
+    workers = [threading.Thread(target=runner.run_until_empty) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    drain_warm_jobs()
+    assert stub.hits == len(words)
+
+
+def test_failed_jobs_are_queued_again(client, stub):
+    stub.status = 404
+    assert enqueue_words(["ghostly"], ["youdao"]) == 1
+    assert wait_for_jobs() == [("ghostly", "failed")]
+    assert stub.hits == MAX_ATTEMPTS
+
+    # 失败的任务不会永远占着 (word, platform)，再次加入时重新执行
+    stub.status = 200
+    assert enqueue_words(["ghostly"], ["youdao"]) == 1
+    assert wait_for_jobs() == []
+    assert stub.hits == MAX_ATTEMPTS + 1
@@ -0,0 +1,377 @@
+"""翻译缓存与后台预热
+
+翻译结果缓存在 translations 表中，/api/translate 优先命中本地缓存。
+添加单词或导入词表时，单词会进入持久化的 warm_jobs 队列，由后台线程
+以低优先级抓取释义和音标写入缓存，服务重启后未完成的任务会继续执行。
+平台为 audio-uk / audio-us 的任务抓取发音音频（见 audio.py）。
+
+命令行用法::
+
+    python warmup.py cet6.txt            # 将词表加入预热队列
+    python warmup.py cet6.txt --run      # 加入队列并在前台执行直到队列清空
+    python warmup.py cet6.txt --platform audio-uk --platform audio-us   # 预取发音
+"""
+
+import argparse
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+from audio import AUDIO_PLATFORMS, fetch_audio
+from db import get_db_connection, init_db
+from fuzzy import current_fuzzy_index
+from lemma import fold, lemma_candidates, resolve_headword
+from scheduler import BACKGROUND, INTERACTIVE
+from search import search_word
+from tenants import current_tenant_id, tenant_cache, use_tenant
+
+# 添加单词时预热的平台
+WARM_PLATFORMS = [
+    p.strip()
+    for p in os.environ.get("WORDBOOK_WARM_PLATFORMS", "youdao").split(",")
+    if p.strip()
+]
+MAX_ATTEMPTS = 3
+
+
+def init_warmup_tables(conn):
+    """创建翻译缓存表和预热任务表"""
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS translations (
+            word TEXT NOT NULL,
+            platform TEXT NOT NULL,
+            headword TEXT,
+            uk_pronoun TEXT,
+            us_pronoun TEXT,
+            mean_zh TEXT,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (word, platform)
+        );
+
+        CREATE TABLE IF NOT EXISTS warm_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            word TEXT NOT NULL,
+            platform TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(word, platform)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_warm_jobs_status ON warm_jobs(status, id);
+        """
+    )
+    conn.commit()
+
+
+def get_cached_translation(conn, word: str, platform: str) -> Optional[Dict]:
+    """从缓存中读取翻译结果，格式与 search_word 的返回值一致"""
+    row = conn.execute(
+        """
+        SELECT headword, uk_pronoun, us_pronoun, mean_zh
+        FROM translations
+        WHERE word = ? AND platform = ?
+        """,
+        (word, platform),
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "word": row["headword"],
+        "uk_pronoun": row["uk_pronoun"],
+        "us_pronoun": row["us_pronoun"],
+        "mean_zh": row["mean_zh"],
+    }
+
+
+def save_translation(conn, word: str, platform: str, result: Dict):
+    """写入翻译缓存"""
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO translations
+            (word, platform, headword, uk_pronoun, us_pronoun, mean_zh)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (
+            word,
+            platform,
+            result["word"],
+            result["uk_pronoun"],
+            result["us_pronoun"],
+            result["mean_zh"],
+        ),
+    )
+    conn.commit()
+    current_fuzzy_index().add(word)
+
+
+def resolve_translation_key(conn, word: str, platform: str) -> str:
+    """翻译缓存键：大小写折叠后的词头
+
+    大小写或复数等变体已有缓存时直接使用该缓存，否则使用 resolve_headword
+    解析出的词头，“Running”和“running”、已缓存“run”时的“runs”都不再抓取。-ing/-ed 形式
+    只按 resolve_headword 的规则（本地词典确认）还原，using 不会命中 us 的缓存。
+    """
+    key = fold(word)
+    for candidate in [key] + lemma_candidates(key, verb_forms=False):
+        if get_cached_translation(conn, candidate, platform) is not None:
+            return candidate
+    return fold(resolve_headword(conn, word, current_fuzzy_index().in_dictionary))
+
+
+def lookup_translation(word: str, platform: str, priority: int = INTERACTIVE) -> Dict:
+    """查询翻译，优先使用本地缓存，未命中时抓取上游并写入缓存"""
+    conn = get_db_connection()
+    try:
+        word = resolve_translation_key(conn, word, platform)
+        cached = get_cached_translation(conn, word, platform)
+        if cached is not None:
+            return cached
+
+        result = search_word(word, platform, priority)
+        save_translation(conn, word, platform, result)
+        return result
+    finally:
+        conn.close()
+
+
+def enqueue_words(words: Iterable[str], platforms: Optional[List[str]] = None) -> int:
+    """将单词加入预热队列，已缓存或已在队列中的单词会被跳过
+
+    之前失败（status 为 failed）的任务重新放回队列，重新计算重试次数。
+
+    翻译和发音都按大小写折叠后的单词缓存（与 lookup_translation、fetch_audio
+    的缓存键一致），单词在入队前折叠，“Apple”预热的就是查询“apple”时读取的缓存。
+
+    Returns:
+        新加入队列的任务数
+    """
+    platforms = platforms or WARM_PLATFORMS
+    words = [fold(word) for word in words]
+    conn = get_db_connection()
+    try:
+        before = conn.total_changes
+        for platform in platforms:
+            if platform in AUDIO_PLATFORMS:
+                cached = "SELECT 1 FROM audio_clips WHERE word = ? AND accent = ?"
+                params = (
+                    (word, platform, word, AUDIO_PLATFORMS[platform]) for word in words
+                )
+            else:
+                cached = "SELECT 1 FROM translations WHERE word = ? AND platform = ?"
+                params = ((word, platform, word, platform) for word in words)
+            conn.executemany(
+                f"""
+                INSERT INTO warm_jobs (word, platform)
+                SELECT ?, ?
+                WHERE NOT EXISTS ({cached})
+                ON CONFLICT (word, platform) DO UPDATE
+                SET status = 'pending', attempts = 0, last_error = NULL
+                WHERE warm_jobs.status = 'failed'
+                """,
+                params,
+            )
+        conn.commit()
+        added = conn.total_changes - before
+    finally:
+        conn.close()
+
+    if added:
+        runner.wake()
+    return added
+
+
+def read_wordlist(path: str) -> List[str]:
+    """读取词表文件：每行一个单词，取每行第一个字段，忽略空行和 # 注释"""
+    words = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                words.append(line.split()[0])
+    return words
+
+
+class WarmupRunner:
+    """后台预热线程，逐个领取 warm_jobs 中的任务并写入翻译缓存
+
+    多用户模式下每个用户的队列在各自的数据库中，wake() 记录有新任务的用户，
+    后台线程依次以这些用户的身份执行队列。
+    """
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pending_tenants: Set[str] = set()
+        self._pending_lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._recover()
+        self._thread = threading.Thread(
+            target=self._loop, name="warmup-runner", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def wake(self):
+        tenant_id = current_tenant_id()
+        if tenant_id is not None:
+            with self._pending_lock:
+                self._pending_tenants.add(tenant_id)
+        self._wakeup.set()
+
+    def _recover(self) -> int:
+        """上次退出时执行到一半的任务重新放回队列
+
+        Returns:
+            待执行的任务数
+        """
+        conn = get_db_connection()
+        conn.execute("UPDATE warm_jobs SET status = 'pending' WHERE status = 'running'")
+        conn.commit()
+        pending = conn.execute(
+            "SELECT COUNT(*) FROM warm_jobs WHERE status = 'pending'"
+        ).fetchone()[0]
+        conn.close()
+        return pending
+
+    def _claim(self, conn):
+        """领取最早的待执行任务
+
+        服务内的后台线程和 python warmup.py --run 可能同时领取，只有把状态从
+        pending 改为 running 的一方领到任务，另一方接着领取下一个。
+        """
+        while True:
+            row = conn.execute(
+                """
+                SELECT id, word, platform, attempts FROM warm_jobs
+                WHERE status = 'pending'
+                ORDER BY id
+                LIMIT 1
+                """
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = conn.execute(
+                """
+                UPDATE warm_jobs SET status = 'running', attempts = attempts + 1
+                WHERE id = ? AND status = 'pending'
+                """,
+                (row["id"],),
+            ).rowcount
+            conn.commit()
+            if claimed:
+                return row
+
+    def run_once(self) -> bool:
+        """执行一个预热任务
+
+        Returns:
+            是否领取到了任务
+        """
+        conn = get_db_connection()
+        try:
+            job = self._claim(conn)
+            if job is None:
+                return False
+
+            try:
+                if job["platform"] in AUDIO_PLATFORMS:
+                    fetch_audio(
+                        job["word"], AUDIO_PLATFORMS[job["platform"]], BACKGROUND
+                    )
+                elif get_cached_translation(conn, job["word"], job["platform"]) is None:
+                    result = search_word(job["word"], job["platform"], BACKGROUND)
+                    save_translation(conn, job["word"], job["platform"], result)
+                conn.execute("DELETE FROM warm_jobs WHERE id = ?", (job["id"],))
+            except Exception as e:
+                # 查不到的单词或多次失败的任务标记为 failed，不再重试
+                status = "pending" if job["attempts"] + 1 < MAX_ATTEMPTS else "failed"
+                conn.execute(
+                    "UPDATE warm_jobs SET status = ?, last_error = ? WHERE id = ?",
+                    (status, str(e), job["id"]),
+                )
+                print(f"预热单词失败: {job['word']} ({job['platform']}): {e}")
+            conn.commit()
+            return True
+        finally:
+            conn.close()
+
+    def run_until_empty(self):
+        while not self._stopped.is_set() and self.run_once():
+            pass
+
+    def run_pending_tenants(self):
+        """依次执行有新任务的用户的队列"""
+        with self._pending_lock:
+            tenant_ids, self._pending_tenants = self._pending_tenants, set()
+        for tenant_id in tenant_ids:
+            with use_tenant(tenant_id):
+                self.run_until_empty()
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            try:
+                self.run_until_empty()
+                self.run_pending_tenants()
+            except Exception as e:
+                print(f"预热任务执行出错: {e}")
+            self._wakeup.wait(timeout=60)
+            self._wakeup.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        conn = get_db_connection()
+        rows = conn.execute(
+            "SELECT status, COUNT(*) AS total FROM warm_jobs GROUP BY status"
+        ).fetchall()
+        conn.close()
+        return {row["status"]: row["total"] for row in rows}
+
+
+runner = WarmupRunner()
+
+
+def resume_tenant_jobs():
+    """多用户模式下用户打开时，继续执行其上次未完成的预热任务"""
+    if runner._recover():
+        runner.wake()
+
+
+tenant_cache.on_open(resume_tenant_jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从词表文件预热翻译缓存")
+    parser.add_argument("wordlist", help="词表文件，每行一个单词")
+    parser.add_argument(
+        "--platform",
+        action="append",
+        choices=["youdao", "bing", *AUDIO_PLATFORMS],
+        help="预热的平台，可重复指定，默认为 WORDBOOK_WARM_PLATFORMS",
+    )
+    parser.add_argument("--run", action="store_true", help="在前台执行队列直到清空")
+    args = parser.parse_args()
+
+    init_db()
+
+    words = read_wordlist(args.wordlist)
+    added = enqueue_words(words, args.platform)
+    print(f"读取 {len(words)} 个单词，新加入预热队列 {added} 个任务")
+
+    if args.run:
+        runner.run_until_empty()
+        print(f"预热完成，队列状态: {runner.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+"""离线管理命令
+
+不启动 HTTP 服务，直接读写 wordbook.db，用于批量导入导出和维护::
+
+    python -m wordbook import words.csv --notebook 1        # 导入到已有词书
+    python -m wordbook import cet6.xlsx --name 六级词汇      # 新建词书并导入
+    python -m wordbook export 1 words.ndjson               # 按扩展名选择格式
+    python -m wordbook copy 1 --name 备份
+    python -m wordbook merge 2 1 --delete-source           # 把词书 2 并入词书 1
+    python -m wordbook combine difference 1 2 --name 生词   # 在词书 1 不在词书 2 的单词
+    python -m wordbook reindex
+    python -m wordbook vacuum
+    python -m wordbook check
+    python -m wordbook plans                               # 检查单词列表的查询计划
+
+支持 CSV、XLSX 和 NDJSON，列与导出的 Excel 相同（单词、释义、笔记、添加时间）。
+导入按批提交事务（--batch-size），进度输出到标准错误。
+check 和 plans 只读取数据库，不执行迁移，结构版本不是最新时报告错误。
+默认操作 ~/.wordbook/wordbook.db，可用 --db 指定文件，或用 --tenant 指定
+多用户模式下的用户。服务运行时也可以执行，写入期间服务的写请求会等待锁。
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+import db
+import tenants
+from bulk import (
+    BATCH_SIZE,
+    SET_OPERATIONS,
+    WRITERS,
+    check_database,
+    combine_notebooks,
+    copy_notebook,
+    detect_format,
+    import_rows,
+    merge_notebooks,
+    missing_notebooks,
+    notebook_rows,
+    read_rows,
+    rebuild_indexes,
+)
+from listing import check_query_plans
+from migrations import LATEST_VERSION, migrate, schema_version
+
+# 进度刷新间隔（秒）
+PROGRESS_INTERVAL = 0.2
+# 输出不是终端时每隔多少秒打印一行进度
+PROGRESS_LOG_INTERVAL = 5
+# 等待服务释放写锁的时间（毫秒）
+BUSY_TIMEOUT_MS = 30000
+# 只读的检查命令不执行迁移：check 报告结构版本，plans 检查现有的索引
+READ_ONLY_COMMANDS = ("check", "plans")
+
+
+class Progress:
+    """在标准错误上显示进度，终端中原地刷新，重定向时定期输出一行"""
+
+    def __init__(self, label: str, total: Optional[int] = None):
+        self.label = label
+        self.total = total
+        self.count = 0
+        self.started = time.monotonic()
+        self._tty = sys.stderr.isatty()
+        self._shown = 0.0
+
+    def update(self, count: int, force: bool = False):
+        self.count = count
+        now = time.monotonic()
+        interval = PROGRESS_INTERVAL if self._tty else PROGRESS_LOG_INTERVAL
+        if not force and now - self._shown < interval:
+            return
+        self._shown = now
+        elapsed = now - self.started
+        rate = count / elapsed if elapsed > 0 else 0
+        text = f"{self.label}: {count}"
+        if self.total:
+            text += f"/{self.total} ({count * 100 // self.total}%)"
+        text += f"，{rate:.0f} 行/秒"
+        if self._tty:
+            sys.stderr.write(f"\r{text}\033[K")
+        else:
+            sys.stderr.write(text + "\n")
+        sys.stderr.flush()
+
+    def advance(self):
+        self.update(self.count + 1)
+
+    def finish(self):
+        self.update(self.count, force=True)
+        if self._tty:
+            sys.stderr.write("\n")
+        return time.monotonic() - self.started
+
+
+def resolve_db_path(args) -> Path:
+    if args.tenant:
+        if not tenants.TENANT_ID.match(args.tenant):
+            raise SystemExit(f"无效的用户标识: {args.tenant}")
+        return tenants.TENANTS_DIR / args.tenant / "wordbook.db"
+    return Path(args.db or db.DB_PATH)
+
+
+def connect(path: Optional[Path], upgrade: bool = True) -> sqlite3.Connection:
+    """打开数据库
+
+    Args:
+        path: 数据库文件，为 None 时打开内存数据库
+        upgrade: 是否执行未完成的迁移
+    """
+    if path is None:
+        conn = sqlite3.connect(":memory:")
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(path))
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    if upgrade:
+        migrate(conn)
+    return conn
+
+
+def _file_bytes(path: Path) -> int:
+    return sum(
+        p.stat().st_size
+        for p in (path, path.with_name(path.name + "-wal"))
+        if p.exists()
+    )
+
+
+def _load_dictionary():
+    """配置了本地词典（WORDBOOK_DICTIONARY）时用于判断屈折形式的原形"""
+    from fuzzy import DICTIONARY_PATH
+    from lemma import fold
+    from warmup import read_wordlist
+
+    if not DICTIONARY_PATH or not os.path.exists(DICTIONARY_PATH):
+        return None
+    known = {fold(word) for word in read_wordlist(DICTIONARY_PATH)}
+    return lambda word: fold(word) in known
+
+
+def cmd_import(conn, args, path: Path) -> int:
+    fmt = args.format or detect_format(args.file)
+    if fmt is None:
+        raise SystemExit("无法从扩展名判断格式，请用 --format 指定")
+
+    if args.name:
+        notebook_id = conn.execute(
+            "INSERT INTO notebooks (name) VALUES (?)", (args.name,)
+        ).lastrowid
+        conn.commit()
+        print(f"新建词书 {args.name}（ID {notebook_id}）")
+    else:
+        notebook_id = args.notebook
+        if not conn.execute(
+            "SELECT 1 FROM notebooks WHERE id = ?", (notebook_id,)
+        ).fetchone():
+            raise SystemExit(f"词书 {notebook_id} 不存在")
+
+    enqueue = None
+    if args.warm:
+        # warmup 通过 db.get_db_connection 写入队列，指向同一个数据库文件
+        from lemma import fold
+        from warmup import enqueue_words
+
+        db.DB_PATH = str(path)
+        enqueue = enqueue_words
+    queued = 0
+    progress = Progress("导入")
+
+    def on_batch(report, words):
+        nonlocal queued
+        if enqueue and words:
+            queued += enqueue(sorted({fold(word) for word in words}))
+        progress.update(report["rows"])
+
+    report = import_rows(
+        conn,
+        notebook_id,
+        read_rows(args.file, fmt),
+        batch_size=args.batch_size,
+        is_known=_load_dictionary(),
+        on_batch=on_batch,
+    )
+    elapsed = progress.finish()
+    if report["aborted"] is not None and not report["rows"]:
+        raise SystemExit(f"导入失败: {report['aborted']}")
+
+    print(
+        f"共 {report['rows']} 行，用时 {elapsed:.1f} 秒：新增 {report['added']}，"
+        f"已在词书中 {report['existing']}，文件内重复 {report['duplicates']}，"
+        f"出错 {report['error_count']}"
+    )
+    for error in report["errors"]:
+        print(f"  第 {error['row']} 行: {error['message']}")
+    if report["error_count"] > len(report["errors"]):
+        print(f"  ……另有 {report['error_count'] - len(report['errors'])} 行出错")
+    if report["aborted"] is not None:
+        print(f"导入中止: {report['aborted']}，之前的 {report['rows']} 行已导入")
+    if args.warm:
+        print(f"加入翻译预热队列 {queued} 个任务，服务启动后在后台执行")
+    return 1 if report["error_count"] or report["aborted"] is not None else 0
+
+
+def cmd_export(conn, args, path: Path) -> int:
+    fmt = args.format or detect_format(args.output)
+    if fmt is None:
+        raise SystemExit("无法从扩展名判断格式，请用 --format 指定")
+    if not conn.execute(
+        "SELECT 1 FROM notebooks WHERE id = ?", (args.notebook,)
+    ).fetchone():
+        raise SystemExit(f"词书 {args.notebook} 不存在")
+
+    total = conn.execute(
+        "SELECT COUNT(*) FROM word_entries WHERE notebook_id = ?", (args.notebook,)
+    ).fetchone()[0]
+    progress = Progress("导出", total)
+    output = Path(args.output)
+    partial = output.with_name(f".{output.name}.part")
+    try:
+        count = WRITERS[fmt](
+            notebook_rows(conn, args.notebook), partial, progress.advance
+        )
+        os.replace(partial, output)
+    finally:
+        if partial.exists():
+            partial.unlink()
+    elapsed = progress.finish()
+    print(f"导出 {count} 个单词到 {output}，用时 {elapsed:.1f} 秒")
+    return 0
+
+
+def cmd_copy(conn, args, path: Path) -> int:
+    try:
+        new_id = copy_notebook(conn, args.notebook, args.name)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    count = conn.execute(
+        "SELECT COUNT(*) FROM word_entries WHERE notebook_id = ?", (new_id,)
+    ).fetchone()[0]
+    print(f"已复制为词书 {new_id}，共 {count} 个单词")
+    return 0
+
+
+def cmd_merge(conn, args, path: Path) -> int:
+    try:
+        result = merge_notebooks(conn, args.source, args.target, args.delete_source)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(
+        f"词书 {args.source} 并入 {args.target}：新增 {result['added']} 个单词，"
+        f"已存在 {result['skipped']} 个"
+        + ("，已删除源词书" if args.delete_source else "")
+    )
+    return 0
+
+
+def cmd_combine(conn, args, path: Path) -> int:
+    missing = missing_notebooks(
+        conn, args.sources + ([args.target] if args.target is not None else [])
+    )
+    if missing:
+        raise SystemExit(f"词书不存在: {', '.join(map(str, missing))}")
+    started = time.monotonic()
+    try:
+        result = combine_notebooks(
+            conn,
+            args.operation,
+            args.sources,
+            target_id=args.target,
+            name=args.name,
+            preview=args.preview,
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    elapsed = time.monotonic() - started
+    if args.preview:
+        print(
+            f"结果共 {result['count']} 个单词，将新加入 {result['added']} 个"
+            f"（用时 {elapsed:.2f} 秒）"
+        )
+    else:
+        print(
+            f"写入词书 {result['name']}（ID {result['notebook_id']}），"
+            f"新加入 {result['added']} 个单词，用时 {elapsed:.2f} 秒"
+        )
+    return 0
+
+
+def cmd_reindex(conn, args, path: Path) -> int:
+    started = time.monotonic()
+    result = rebuild_indexes(conn)
+    print(
+        f"重建索引完成，中文反查索引 {result['reverse_indexed']} 个单词，"
+        f"用时 {time.monotonic() - started:.1f} 秒"
+    )
+    return 0
+
+
+def cmd_vacuum(conn, args, path: Path) -> int:
+    before = _file_bytes(path)
+    started = time.monotonic()
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA optimize")
+    if conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    after = _file_bytes(path)
+    print(
+        f"VACUUM 完成：{before / 1048576:.1f} MiB -> {after / 1048576:.1f} MiB，"
+        f"用时 {time.monotonic() - started:.1f} 秒"
+    )
+    return 0
+
+
+def cmd_check(conn, args, path: Path) -> int:
+    result = check_database(conn)
+    for message in result["errors"]:
+        print(f"错误: {message}")
+    for message in result["warnings"]:
+        print(f"提示: {message}")
+    if not result["errors"]:
+        print("检查通过")
+    return 1 if result["errors"] else 0
+
+
+def cmd_plans(conn, args, path: Path) -> int:
+    version = schema_version(conn)
+    if version != LATEST_VERSION:
+        print(f"错误: 结构版本为 {version}，最新为 {LATEST_VERSION}，需要先迁移")
+        return 1
+    failures = check_query_plans(conn)
+    for failure in failures:
+        print(f"错误: {failure}")
+    if failures:
+        print(f"{len(failures)} 个组合没有完全使用索引")
+        return 1
+    print("单词列表的所有排序和筛选组合都按索引读取")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m wordbook", description="单词本离线管理命令"
+    )
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--db", help=f"数据库文件，默认为 {db.DB_PATH}")
+    target.add_argument("--tenant", help="多用户模式下的用户标识")
+    commands = parser.add_subparsers(dest="command", required=True)
+    formats = sorted(WRITERS)
+
+    p = commands.add_parser("import", help="从 CSV/XLSX/NDJSON 导入单词")
+    p.add_argument("file")
+    into = p.add_mutually_exclusive_group(required=True)
+    into.add_argument("--notebook", type=int, help="导入到已有词书")
+    into.add_argument("--name", help="新建词书并导入")
+    p.add_argument("--format", choices=formats, help="默认按扩展名判断")
+    p.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="每个事务的行数")
+    p.add_argument("--warm", action="store_true", help="把导入的单词加入翻译预热队列")
+    p.set_defaults(handler=cmd_import)
+
+    p = commands.add_parser("export", help="导出词书为 CSV/XLSX/NDJSON")
+    p.add_argument("notebook", type=int)
+    p.add_argument("output")
+    p.add_argument("--format", choices=formats, help="默认按扩展名判断")
+    p.set_defaults(handler=cmd_export)
+
+    p = commands.add_parser("copy", help="复制词书")
+    p.add_argument("notebook", type=int)
+    p.add_argument("--name", help="新词书名称，默认为“原名称 (副本)”")
+    p.set_defaults(handler=cmd_copy)
+
+    p = commands.add_parser("merge", help="把一本词书的单词合并到另一本")
+    p.add_argument("source", type=int)
+    p.add_argument("target", type=int)
+    p.add_argument(
+        "--delete-source",
+        action="store_true",
+        help="移动条目（保留复习进度）并删除源词书",
+    )
+    p.set_defaults(handler=cmd_merge)
+
+    p = commands.add_parser("combine", help="词书的并集、交集、差集")
+    p.add_argument("operation", choices=list(SET_OPERATIONS))
+    p.add_argument(
+        "sources", type=int, nargs="+", help="源词书ID，差集为第一本减去其余各本"
+    )
+    into = p.add_mutually_exclusive_group()
+    into.add_argument("--name", help="新词书名称，默认由源词书名称组成")
+    into.add_argument("--target", type=int, help="写入已有词书")
+    p.add_argument("--preview", action="store_true", help="只统计单词数，不写入")
+    p.set_defaults(handler=cmd_combine)
+
+    p = commands.add_parser("reindex", help="重建索引和中文反查索引")
+    p.set_defaults(handler=cmd_reindex)
+
+    p = commands.add_parser("vacuum", help="整体 VACUUM 并更新统计信息")
+    p.set_defaults(handler=cmd_vacuum)
+
+    p = commands.add_parser("check", help="检查数据库完整性，有问题时退出码为 1")
+    p.set_defaults(handler=cmd_check)
+
+    p = commands.add_parser(
+        "plans",
+        help="检查单词列表各排序、筛选组合的查询计划，"
+        "有全表扫描或临时 B 树排序时退出码为 1",
+    )
+    p.set_defaults(handler=cmd_plans)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    path = resolve_db_path(args)
+    if args.command == "plans" and not path.exists():
+        # 没有数据库时在内存中按最新结构建表，检查查询计划，不创建文件
+        conn = connect(None)
+    elif args.command != "import" and not path.exists():
+        raise SystemExit(f"数据库不存在: {path}")
+    else:
+        conn = connect(path, upgrade=args.command not in READ_ONLY_COMMANDS)
+    try:
+        return args.handler(conn, args, path)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,9 @@ import "./index.css";
 import axios from "./api/axios";
 import NotebookDetail from "./components/NotebookDetail";
 
+// 轮询导出任务进度的间隔（毫秒）
+const EXPORT_POLL_INTERVAL = 1000;
+
 interface Notebook {
   id: number;
   name: string;
@@ -515,39 +518,39 @@ const Main = () => {
     }
   };
 
-  const handleExportDatabase = async () => {
-    try {
-      const response = await axios.get('/api/export-db', {
-        responseType: 'blob'
-      });
+  // 提交导出任务并轮询进度，完成后由浏览器直接下载生成的文件
+  // （不经过 axios 的超时限制，下载中断时可以续传）
+  const runExport = async (submitUrl: string) => {
+    let { data: job } = await axios.post(submitUrl);
+    while (job.status === 'queued' || job.status === 'running') {
+      await new Promise((resolve) => setTimeout(resolve, EXPORT_POLL_INTERVAL));
+      ({ data: job } = await axios.get(`/api/exports/${job.id}`));
+    }
+    if (job.status !== 'done') {
+      throw new Error(job.error ? `导出失败: ${job.error}` : '导出失败，请重试');
+    }
 
-      // 从响应头中获取文件名
-      const contentDisposition = response.headers['content-disposition'];
-      let filename = 'wordbook_backup.zip';
-      if (contentDisposition) {
-        const filenameMatch = contentDisposition.match(/filename="(.+?)"/);
-        if (filenameMatch && filenameMatch[1]) {
-          filename = filenameMatch[1];
-        }
-      }
+    const link = document.createElement('a');
+    link.href = job.download_url;
+    link.setAttribute('download', job.filename);
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+  };
 
-      // 创建下载链接
-      const blob = new Blob([response.data], { type: 'application/zip' });
-      const url = window.URL.createObjectURL(blob);
-      const link = document.createElement('a');
-      link.href = url;
-      link.setAttribute('download', filename);
-      
-      // 触发下载
-      document.body.appendChild(link);
-      link.click();
-      
-      // 清理
-      document.body.removeChild(link);
-      window.URL.revokeObjectURL(url);
+  const alertExportError = (error: any) => {
+    console.error("导出失败：", error);
+    alert(
+      error.response?.data?.detail?.message ||
+        (error.response ? '导出失败，请重试' : error.message)
+    );
+  };
+
+  const handleExportDatabase = async () => {
+    try {
+      await runExport('/api/export-db');
     } catch (error: any) {
-      console.error("导出失败：", error);
-      alert(error.response?.data?.detail?.message || '导出失败，请重试');
+      alertExportError(error);
     }
   };
 
@@ -555,54 +558,9 @@ const Main = () => {
   const handleExportNotebook = async (notebookId: number, e: MouseEvent) => {
     e.stopPropagation();  // 阻止事件冒泡
     try {
-      // 发起导出请求
-      const response = await axios.get(`/api/notebooks/${notebookId}/export`, {
-        responseType: 'blob',  // 指定响应类型为blob
-      });
-
-      // 从响应头中获取文件名
-      const contentDisposition = response.headers['content-disposition'];
-      let filename = '单词本.xlsx';
-      if (contentDisposition) {
-        const filenameMatch = contentDisposition.match(/filename="(.+?)"/);
-        if (filenameMatch && filenameMatch[1]) {
-          filename = filenameMatch[1];
-        }
-      }
-
-      // 创建下载链接
-      const blob = new Blob([response.data], {
-        type: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-      });
-      const url = window.URL.createObjectURL(blob);
-      const link = document.createElement('a');
-      link.href = url;
-      link.setAttribute('download', filename);
-      
-      // 触发下载
-      document.body.appendChild(link);
-      link.click();
-      
-      // 清理
-      document.body.removeChild(link);
-      window.URL.revokeObjectURL(url);
+      await runExport(`/api/notebooks/${notebookId}/export`);
     } catch (error: any) {
-      console.error("导出失败：", error);
-      if (error.response?.data) {
-        // 尝试读取错误信息
-        const reader = new FileReader();
-        reader.onload = () => {
-          try {
-            const errorData = JSON.parse(reader.result as string);
-            alert(errorData.detail?.message || '导出失败，请重试');
-          } catch {
-            alert('导出失败，请重试');
-          }
-        };
-        reader.readAsText(error.response.data);
-      } else {
-        alert('导出失败，请重试');
-      }
+      alertExportError(error);
     }
   };
 